@@ -10,6 +10,7 @@ from services.args import get_args
 from services.logger import get_logger
 from services.thread_controller import ThreadController
 from services.config import Config
+from services.presets import PresetStore, compile_scene
 
 
 class GUIApplication(QApplication):
@@ -23,7 +24,14 @@ class GUIApplication(QApplication):
         )
 
         self.update_queue = Queue()
-        self.config = Config(self.logger.name)
+        self.config = Config(
+            self.logger.name,
+            PresetStore(logger_name=self.logger.name),
+            PresetStore(
+                logger_name=self.logger.name, import_file=None,
+                table="scenes", compiler=compile_scene
+            )
+        )
 
         thread_controller = ThreadController(
             self.update_queue, self.config,
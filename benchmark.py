@@ -0,0 +1,378 @@
+#!/home/dhoessl/venvs/midi2soundcraft/bin/python
+# external import
+from argparse import ArgumentParser, Namespace
+from sys import exit
+# private import
+from services.benchmarks import (
+    run_formatter_benchmark, run_sysex_benchmark, run_message_benchmark,
+    run_storm_benchmark, run_feedback_benchmark,
+    run_input_benchmark, run_control_benchmark, run_preset_benchmark,
+    run_recall_benchmark, run_scene_benchmark, run_tween_benchmark,
+    run_automation_benchmark, run_clock_benchmark, run_clock_output_benchmark,
+    run_curve_benchmark
+)
+
+
+def get_args() -> Namespace:
+    parser = ArgumentParser(description="Benchmarks and golden value checks")
+    subparsers = parser.add_subparsers(dest="suite", required=True)
+    formatter = subparsers.add_parser(
+        "formatter",
+        help="sweep OutputFormatter labels against the golden file"
+    )
+    formatter.add_argument(
+        "--update-golden",
+        action="store_true",
+        help="rewrite the golden file with the current labels"
+    )
+    subparsers.add_parser(
+        "sysex",
+        help="compare note messages and SysEx frames for APC redraws"
+    )
+    subparsers.add_parser(
+        "led-messages",
+        help="LED messages per second built per call and prebuilt"
+    )
+    subparsers.add_parser(
+        "sender-storm",
+        help="latency per priority class under a synthetic fader storm"
+    )
+    subparsers.add_parser(
+        "feedback",
+        help="time until a press is shown with and without local values"
+    )
+    subparsers.add_parser(
+        "midi-input",
+        help="knob twist dispatched directly and through the input stage"
+    )
+    subparsers.add_parser(
+        "controls",
+        help="MIDIMix event dispatch by branches and by mapping tables"
+    )
+    subparsers.add_parser(
+        "curves",
+        help="fader response curves worked out per event and compiled"
+    )
+    subparsers.add_parser(
+        "presets",
+        help="preset save latency on disk and in memory, crash recovery"
+    )
+    subparsers.add_parser(
+        "preset-recall",
+        help="preset recall sending every parameter and only changes"
+    )
+    subparsers.add_parser(
+        "scenes",
+        help="full console scene recall sending every value and only changes"
+    )
+    subparsers.add_parser(
+        "tween",
+        help="tick timing of fades, idle and with a busy thread"
+    )
+    subparsers.add_parser(
+        "automation",
+        help="automation file size and playback timing error"
+    )
+    subparsers.add_parser(
+        "clock",
+        help="tempo sends following a jittery synthetic MIDI clock"
+    )
+    subparsers.add_parser(
+        "clock-out",
+        help="jitter and drift of generated MIDI clock on a loopback"
+    )
+    return parser.parse_args()
+
+
+def formatter(args: Namespace) -> int:
+    result = run_formatter_benchmark(update_golden=args.update_golden)
+    print(
+        f"Formatter on {result['machine']} / Python {result['python']}"
+        f" - {result['steps']} steps"
+    )
+    for name, timing in result["timings"].items():
+        print(f"\t{name:<20} {timing / 1000:8.2f} us/call")
+    if args.update_golden:
+        print("Golden file updated")
+        return 0
+    for name, mismatch in result["mismatches"].items():
+        print(f"MISMATCH {name}: {mismatch}")
+    return 1 if result["mismatches"] else 0
+
+
+def sysex(args: Namespace) -> int:
+    for name, result in run_sysex_benchmark().items():
+        print(f"{name}: {result['pads']} pads")
+        print(
+            f"\tnotes: {result['note_bytes']:4} bytes"
+            f" {result['note_packets']:3} USB packets"
+            f" {result['note_time'] / 1000:8.2f} us"
+        )
+        print(
+            f"\tsysex: {result['sysex_bytes']:4} bytes"
+            f" {result['sysex_packets']:3} USB packets"
+            f" {result['sysex_time'] / 1000:8.2f} us"
+            f" ({result['sysex_blocks']} blocks)"
+        )
+    return 0
+
+
+def led_messages(args: Namespace) -> int:
+    result = run_message_benchmark()
+    print(f"{result['messages']} grid LED messages")
+    print(f"\tbuilt per call: {result['built_per_second']:12.0f} msg/s")
+    print(f"\tprebuilt table: {result['prebuilt_per_second']:12.0f} msg/s")
+    return 0
+
+
+def sender_storm(args: Namespace) -> int:
+    result = run_storm_benchmark()
+    print(
+        f"{result['enqueued']} commands enqueued"
+        f" ({result['enqueue_us']:.2f} us each),"
+        f" {result['sent']} sent, {result['coalesced']} coalesced,"
+        f" max queue depth {result['max_depth']}"
+    )
+    for priority, latency in sorted(result["latency"].items()):
+        print(
+            f"\tclass {priority}: {latency['count']:5} sent"
+            f" avg {latency['avg_ms']:8.2f} ms"
+            f" max {latency['max_ms']:8.2f} ms"
+        )
+    return 0
+
+
+def feedback(args: Namespace) -> int:
+    results = run_feedback_benchmark()
+    for name, result in results.items():
+        print(
+            f"{name:5}: {result['shown']}/{result['pressed']} presses shown"
+            f" avg {result['avg_ms']:8.2f} ms max {result['max_ms']:8.2f} ms,"
+            f" {result['rolled_back']} rolled back,"
+            f" {'consistent' if result['consistent'] else 'INCONSISTENT'}"
+        )
+    return 0 if all(result["consistent"] for result in results.values()) else 1
+
+
+def midi_input(args: Namespace) -> int:
+    results = run_input_benchmark()
+    for name, result in results.items():
+        print(
+            f"{name:9}: {result['events']} events,"
+            f" {result['dispatched']} dispatched"
+            f" (ratio {result['collapse_ratio']:.2f}),"
+            f" {result['time_ms']:8.2f} ms,"
+            f" {'in order' if result['in_order'] else 'OUT OF ORDER'}"
+        )
+    return 0 if all(result["in_order"] for result in results.values()) else 1
+
+
+def controls(args: Namespace) -> int:
+    result = run_control_benchmark()
+    print(f"{result['events']} MIDIMix knob and fader events")
+    print(f"\tscan:   {result['scan_ns']:8.0f} ns/event")
+    print(f"\tlookup: {result['lookup_ns']:8.0f} ns/event")
+    print(f"\tmapping file compiled in {result['compile_ms']:.2f} ms")
+    if not result["same_calls"]:
+        print("MISMATCH: lookup sends other commands than the scan")
+    return 0 if result["same_calls"] else 1
+
+
+def curves(args: Namespace) -> int:
+    result = run_curve_benchmark()
+    print(f"{result['events']} APC fader events on dB and custom curves")
+    print(f"\tper event: {result['fly_ns']:8.0f} ns/event")
+    print(f"\ttable:     {result['table_ns']:8.0f} ns/event")
+    print(f"\tlinear:    {result['linear_ns']:8.0f} ns/event (val / 127)")
+    print(f"\tmapping with curves compiled in {result['compile_ms']:.2f} ms")
+    for check, passed in result["checks"].items():
+        print(f"\t{check:8}: {'ok' if passed else 'FAILED'}")
+    return 0 if all(result["checks"].values()) else 1
+
+
+def presets(args: Namespace) -> int:
+    result = run_preset_benchmark()
+    print(f"{result['saves']} preset saves")
+    print(f"\tread-merge-write: {result['disk_us']:8.1f} us/save")
+    print(f"\tpreset store:     {result['store_us']:8.1f} us/save")
+    print(f"\twritten in {result['batches']} batches")
+    print("\tpresets   JSON file   open   bank switch   first recall")
+    for size in result["scaling"]:
+        print(
+            f"\t{size['presets']:7} {size['json_us']:9.0f} us"
+            f" {size['open_us']:6.0f} us {size['bank_us']:8.0f} us"
+            f" {size['recall_us']:10.0f} us"
+        )
+    for check, passed in result["checks"].items():
+        print(f"\t{check:15}: {'ok' if passed else 'FAILED'}")
+    return 0 if all(result["checks"].values()) else 1
+
+
+def preset_recall(args: Namespace) -> int:
+    results = run_recall_benchmark()
+    for name, result in results.items():
+        print(
+            f"{name:4}: {result['recalls']} recalls,"
+            f" {result['commands']} commands,"
+            f" avg {result['avg_ms']:7.2f} ms max {result['max_ms']:7.2f} ms,"
+            f" caller {result['caller_us']:6.1f} us,"
+            f" {'consistent' if result['consistent'] else 'INCONSISTENT'}"
+        )
+    return 0 if all(result["consistent"] for result in results.values()) else 1
+
+
+def scenes(args: Namespace) -> int:
+    results = run_scene_benchmark()
+    result = results["all"]
+    print(f"Scene of {result['values']} values in {result['bytes']} bytes")
+    for name, result in results.items():
+        print(
+            f"{name:4}: {result['recalls']} recalls,"
+            f" {result['commands']} commands,"
+            f" master and mutes {result['urgent_ms']:7.2f} ms,"
+            f" done avg {result['avg_ms']:7.2f} ms"
+            f" max {result['max_ms']:7.2f} ms"
+            f" (bound {result['bound_ms']:7.2f} ms),"
+            f" {'consistent' if result['consistent'] else 'INCONSISTENT'}"
+        )
+    return 0 if all(result["consistent"] for result in results.values()) else 1
+
+
+def tween(args: Namespace) -> int:
+    result = run_tween_benchmark()
+    print(f"sleep per tick: {result['sleep_drift_ms']:7.2f} ms behind")
+    for name in ["idle", "busy"]:
+        fade = result[name]
+        print(
+            f"{name:4}: {fade['moving']} faders, {fade['ticks']} ticks,"
+            f" {fade['skipped']} skipped, drift {fade['drift_ms']:6.3f} ms,"
+            f" late avg {fade['late_avg_ms']:6.3f} ms"
+            f" max {fade['late_max_ms']:6.3f} ms,"
+            f" jitter {fade['jitter_ms']:6.3f} ms,"
+            f" {'on time' if fade['on_time'] else 'LATE'},"
+            f" {'on target' if fade['on_target'] else 'OFF TARGET'}"
+        )
+    print(
+        "touch: "
+        f"{'stops the fade' if result['touch_stops'] else 'FADE GOES ON'}"
+    )
+    print(
+        "mutes: "
+        f"{'every channel switched' if result['mutes'] else 'MUTES LOST'}"
+    )
+    passed = result["touch_stops"] and result["mutes"] and all(
+        result[name]["on_target"] and result[name]["on_time"]
+        for name in ["idle", "busy"]
+    )
+    return 0 if passed else 1
+
+
+def automation(args: Namespace) -> int:
+    result = run_automation_benchmark()
+    print(
+        f"{result['events']} actions over {result['length']:.2f} s:"
+        f" {result['file_bytes']} bytes recorded,"
+        f" {result['json_bytes']} bytes as JSON lines,"
+        f" {'loaded exactly' if result['exact'] else 'LOADED CHANGED'},"
+        f" torn record {'dropped' if result['torn_dropped'] else 'KEPT'},"
+        f" {'cut off' if result['torn_appended'] else 'NOT CUT OFF'}"
+        f" before appending, unknown calls"
+        f" {'refused' if result['unknown_refused'] else 'LOADED'}"
+    )
+    for name, played in result["played"].items():
+        print(
+            f"{name:12}: {played['played']:4} entries in"
+            f" {played['seconds']:5.2f} s, late avg"
+            f" {played['late_avg_ms']:6.3f} ms max"
+            f" {played['late_max_ms']:6.3f} ms,"
+            f" {played['late_over_ms']:3} over 1 ms,"
+            f" {'complete' if played['complete'] else 'INCOMPLETE'}"
+            + {
+                True: ", avg within 1 ms", False: ", AVG NOT WITHIN 1 MS",
+                None: ""
+            }[played["within_ms"]]
+        )
+    wire = result["wire"]
+    print(
+        f"{'wire':12}: {wire['sent']:4} of {wire['played']} calls sent,"
+        f" late avg {wire['late_avg_ms']:6.3f} ms"
+        f" max {wire['late_max_ms']:6.3f} ms with coalescing and rate limits"
+    )
+    passed = result["exact"] and result["torn_dropped"] and result[
+        "torn_appended"
+    ] and result["unknown_refused"] and all(
+        played["complete"] and played["within_ms"] is not False
+        for played in result["played"].values()
+    )
+    return 0 if passed else 1
+
+
+def clock(args: Namespace) -> int:
+    result = run_clock_benchmark()
+    for name in ["last beat", "estimator"]:
+        follow = result[name]
+        print(
+            f"{name:9}: {follow['sends']:5} tempo sends,"
+            f" {follow['wrong']:4} away from a steady tempo,"
+            f" {follow['settled']} tempos reached, longest after"
+            f" {follow['settle_ms']:6.1f} ms,"
+            f" {follow['us_per_tick']:5.2f} us per tick"
+        )
+    print(
+        f"input    : following {result['input']['source']},"
+        f" sent {result['input']['tempos']}"
+        f" {'ok' if result['input']['ok'] else 'WRONG'}"
+    )
+    passed = result["input"]["ok"] and result["estimator"]["wrong"] == 0
+    return 0 if passed else 1
+
+
+def clock_out(args: Namespace) -> int:
+    result = run_clock_output_benchmark()
+    passed = True
+    for name, received in result.items():
+        for tempo in received["tempos"]:
+            print(
+                f"{name:5} {tempo['bpm']:3} BPM ({received['loopback']}):"
+                f" {tempo['ticks']:3} ticks, drift"
+                f" {tempo['drift_ms']:7.3f} ms, jitter"
+                f" {tempo['jitter_ms']:6.3f} ms, followed as"
+                f" {tempo['followed']}"
+            )
+            if name != "sleep":
+                passed = passed and tempo["followed"] == tempo["bpm"]
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    args = get_args()
+    if args.suite == "formatter":
+        exit(formatter(args))
+    elif args.suite == "sysex":
+        exit(sysex(args))
+    elif args.suite == "led-messages":
+        exit(led_messages(args))
+    elif args.suite == "sender-storm":
+        exit(sender_storm(args))
+    elif args.suite == "feedback":
+        exit(feedback(args))
+    elif args.suite == "midi-input":
+        exit(midi_input(args))
+    elif args.suite == "controls":
+        exit(controls(args))
+    elif args.suite == "curves":
+        exit(curves(args))
+    elif args.suite == "presets":
+        exit(presets(args))
+    elif args.suite == "preset-recall":
+        exit(preset_recall(args))
+    elif args.suite == "scenes":
+        exit(scenes(args))
+    elif args.suite == "tween":
+        exit(tween(args))
+    elif args.suite == "automation":
+        exit(automation(args))
+    elif args.suite == "clock":
+        exit(clock(args))
+    elif args.suite == "clock-out":
+        exit(clock_out(args))
@@ -1,4 +1,8 @@
 from argparse import ArgumentParser, Namespace
+from .config import (
+    JITTER_DEAD_BAND, JITTER_SETTLE_TIME, MAPPING_FILE, TWEEN_CURVE
+)
+from .tween import TWEEN_CURVES
 
 
 def get_args() -> Namespace:
@@ -24,6 +28,91 @@ def get_args() -> Namespace:
         action="store_true",
         help="Output Log with colors to stdout"
     )
+    parser.add_argument(
+        "--no-sysex",
+        action="store_true",
+        help="send APC pad colours as single note messages only"
+    )
+    parser.add_argument(
+        "--led-fps",
+        default=60,
+        type=int,
+        help="maximum LED frames per second sent to the APC"
+    )
+    parser.add_argument(
+        "--no-optimistic",
+        action="store_true",
+        help="show control changes only after the mixer confirmed them"
+    )
+    parser.add_argument(
+        "--jitter-dead-band",
+        default=JITTER_DEAD_BAND,
+        type=int,
+        help="steps a resting or reversing fader or knob has to move"
+        " before it is sent, 0 only drops repeated values"
+    )
+    parser.add_argument(
+        "--jitter-settle",
+        default=JITTER_SETTLE_TIME,
+        type=float,
+        help="seconds after which a fader or knob counts as resting"
+    )
+    parser.add_argument(
+        "--mapping-file",
+        default=MAPPING_FILE,
+        help="control mapping of APC and MIDIMix, reloaded when changed"
+    )
+    parser.add_argument(
+        "--morph-time",
+        default=0,
+        type=float,
+        help="seconds a preset or scene recall morphs from the current"
+        " values, 0 sends them at once"
+    )
+    parser.add_argument(
+        "--morph-curve",
+        default=TWEEN_CURVE,
+        choices=list(TWEEN_CURVES),
+        help="curve of preset and scene morphs"
+    )
+    parser.add_argument(
+        "--record",
+        default=None,
+        type=str,
+        help="append every control action sent to the mixer to this"
+        " automation file"
+    )
+    parser.add_argument(
+        "--play",
+        default=None,
+        type=str,
+        help="play this automation file once all controllers are running"
+    )
+    parser.add_argument(
+        "--play-speed",
+        default=1,
+        type=float,
+        help="speed of the played automation, 2 plays twice as fast"
+    )
+    parser.add_argument(
+        "--play-loop",
+        action="store_true",
+        help="start the played automation over when it ends"
+    )
+    parser.add_argument(
+        "--clock-in",
+        default=None,
+        nargs="?",
+        const=".*",
+        help="follow the tempo of MIDI clock on input ports matching this"
+        " pattern, any port without a pattern"
+    )
+    parser.add_argument(
+        "--clock-out",
+        default=None,
+        help="send MIDI clock of the mixer tempo to the first output port"
+        " matching this pattern"
+    )
     parser.add_argument(
         "--test",
         action="store_true",
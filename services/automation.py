@@ -0,0 +1,311 @@
+from threading import Thread, Event, Condition
+from logging import getLogger
+from time import monotonic
+from struct import Struct
+from sys import getswitchinterval, setswitchinterval
+from os import path, truncate
+from .config import (
+    AUTOMATION_WRITE_DELAY, AUTOMATION_SPIN_TIME, AUTOMATION_SWITCH_INTERVAL,
+    AUTOMATION_SWITCH_LEAD
+)
+from .latency import Latency
+from .sender import SendScheduler
+from .write_behind import WriteBehind
+
+AUTOMATION_MAGIC = b"M2SA\x01"
+# Microseconds since the session started, call, three small arguments
+# (channel or fx, kind or par, fx) and the value
+AUTOMATION_RECORD = Struct("<QBBBBd")
+AUTOMATION_CALLS = ["mix", "master", "mute", "fx", "fx_setting", "tempo"]
+# Calls marking where a session starts and ends
+AUTOMATION_START = 255
+AUTOMATION_END = 254
+
+
+def pack_event(offset: float, call: str, args: tuple) -> bytes:
+    """ One MixerSender call offset seconds into a session => record """
+    code = AUTOMATION_CALLS.index(call)
+    small = [0, 0, 0]
+    if call == "master" or call == "tempo":
+        value = args[0]
+    elif call == "fx_setting":
+        small[:2] = args[:2]
+        value = args[2]
+    else:
+        # mix, mute and fx: channel, value, kind (and fx)
+        small[0] = args[0]
+        small[1] = ord(args[2]) if len(args) > 2 else ord("i")
+        small[2] = args[3] if len(args) > 3 else 0
+        value = args[1]
+    return AUTOMATION_RECORD.pack(
+        round(offset * 1000000), code, *small, float(value)
+    )
+
+
+def unpack_event(code: int, a: int, b: int, c: int, value: float) -> tuple:
+    """ Fields of a record => (MixerSender call, args) """
+    if code >= len(AUTOMATION_CALLS):
+        raise ValueError(f"{code} => no automation call")
+    call = AUTOMATION_CALLS[code]
+    if call == "master":
+        return call, (value,)
+    if call == "tempo":
+        return call, (int(value) if value.is_integer() else value,)
+    if call == "fx_setting":
+        return call, (a, b, value)
+    if call == "mute":
+        return call, (a, int(value), chr(b))
+    if call == "fx":
+        return call, (a, value, chr(b), c)
+    return call, (a, value, chr(b))
+
+
+def load_automation(automation_file: str) -> tuple:
+    """ Automation file => ([(seconds, [(call, args)])], length).
+        Calls recorded at the same time are one entry. Sessions follow
+        each other, a session without end (crash) ends with its last
+        call and a torn last record is dropped. Raises ValueError when
+        the file is no automation file or holds an unknown call.
+    """
+    with open(automation_file, "rb") as fp:
+        data = fp.read()
+    if not data.startswith(AUTOMATION_MAGIC):
+        raise ValueError(f"{automation_file} => no automation file")
+    events = []
+    start = 0
+    last = 0
+    size = AUTOMATION_RECORD.size
+    end = len(data) - (len(data) - len(AUTOMATION_MAGIC)) % size
+    for record in AUTOMATION_RECORD.iter_unpack(
+        data[len(AUTOMATION_MAGIC):end]
+    ):
+        time = start + record[0] / 1000000
+        if record[1] == AUTOMATION_START:
+            start = last
+            continue
+        last = max(last, time)
+        if record[1] == AUTOMATION_END:
+            continue
+        call = unpack_event(*record[1:])
+        if events and events[-1][0] == time:
+            events[-1][1].append(call)
+        else:
+            events.append((time, [call]))
+    return events, last
+
+
+class AutomationRecorder(WriteBehind):
+    """ Appends every control action a person sends to the mixer to an
+        automation file, one AUTOMATION_RECORD each. Set record() as record
+        of the SendScheduler. Raises ValueError on a file which is no
+        automation file.
+    """
+    def __init__(
+        self,
+        automation_file: str,
+        delay: float = AUTOMATION_WRITE_DELAY,
+        logger_name: str = "AutomationRecorder"
+    ) -> None:
+        super().__init__(delay)
+        self.logger = getLogger(logger_name)
+        self.automation_file = automation_file
+        self.started = monotonic()
+        self.buffer = bytearray()
+        self.records = 0
+        self.written = 0
+        self._append_header()
+
+    def record(self, commands: list, now: float) -> None:
+        """ (key, args) pairs the SendScheduler got at monotonic now """
+        records = b"".join(
+            pack_event(now - self.started, key[0], args)
+            for key, args in commands
+        )
+        with self.condition:
+            self.buffer += records
+            self.records += len(commands)
+            self.condition.notify()
+
+    def stats(self) -> dict:
+        return {
+            "records": self.records,
+            "bytes": self.written,
+            "unsaved": len(self.buffer) // AUTOMATION_RECORD.size
+        }
+
+    def _append_header(self) -> None:
+        size = 0
+        magic = b""
+        if path.exists(self.automation_file):
+            size = path.getsize(self.automation_file)
+            with open(self.automation_file, "rb") as fp:
+                magic = fp.read(len(AUTOMATION_MAGIC))
+        if not AUTOMATION_MAGIC.startswith(magic):
+            raise ValueError(f"{self.automation_file} => no automation file")
+        header = b""
+        keep = size - (size - len(AUTOMATION_MAGIC)) % AUTOMATION_RECORD.size
+        if size < len(AUTOMATION_MAGIC):
+            # New file or torn while writing the magic
+            header = AUTOMATION_MAGIC
+            keep = 0
+        if keep < size:
+            self.logger.warning(
+                f"{self.automation_file} => torn {size - keep} bytes cut off"
+            )
+            truncate(self.automation_file, keep)
+        self.buffer += header + AUTOMATION_RECORD.pack(
+            0, AUTOMATION_START, 0, 0, 0, 0
+        )
+
+    def _pending(self) -> bool:
+        return bool(self.buffer)
+
+    def _write(self) -> None:
+        with self.condition:
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        if not data:
+            return None
+        try:
+            with open(self.automation_file, "ab") as fp:
+                fp.write(data)
+        except OSError as error:
+            self.logger.error(
+                f"{self.automation_file} => not written => {error}"
+            )
+            return None
+        self.written += len(data)
+
+    def terminate(self) -> None:
+        with self.condition:
+            self.buffer += AUTOMATION_RECORD.pack(
+                round((monotonic() - self.started) * 1000000),
+                AUTOMATION_END, 0, 0, 0, 0
+            )
+        super().terminate()
+        self.logger.info(f"Recorder => {self.stats()}")
+
+
+class AutomationPlayer:
+    """ Plays an automation file through the SendScheduler as automated
+        calls. Every entry is due at the start plus its time / speed on the
+        monotonic clock and handed on under 1 ms late on average, single
+        entries may be late by a few ms when the OS runs other threads.
+        With loop the recording starts over after its length.
+    """
+    def __init__(
+        self,
+        sender: SendScheduler,
+        automation_file: str,
+        speed: float = 1,
+        loop: bool = False,
+        spin_time: float = AUTOMATION_SPIN_TIME,
+        switch_interval: float = AUTOMATION_SWITCH_INTERVAL,
+        switch_lead: float = AUTOMATION_SWITCH_LEAD,
+        logger_name: str = "AutomationPlayer"
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.sender = sender
+        self.events, self.length = load_automation(automation_file)
+        self.speed = speed
+        self.loop = loop
+        if loop and self.length <= 0:
+            self.logger.warning(
+                f"{automation_file} => no length => playing once"
+            )
+            self.loop = False
+        self.spin_time = spin_time
+        self.switch_interval = switch_interval
+        self.switch_lead = switch_lead
+        self.default_interval = None
+        self.short_interval = False
+        self.base = None
+        self.played = 0
+        self.loops = 0
+        self.late = Latency()
+        self.late_over_ms = 0
+        self.condition = Condition()
+        self.exit_flag = Event()
+        self.thread = Thread(target=self._thread, args=())
+
+    def set_speed(self, speed: float) -> None:
+        """ Change the speed without jumping in the recording """
+        with self.condition:
+            if self.base is not None:
+                now = monotonic()
+                self.base = now - (now - self.base) * self.speed / speed
+            self.speed = speed
+            self.condition.notify()
+
+    def stats(self) -> dict:
+        late = self.late.stats(3)
+        return {
+            "played": self.played,
+            "loops": self.loops,
+            "late_avg_ms": late["avg_ms"],
+            "late_max_ms": late["max_ms"],
+            "late_over_ms": self.late_over_ms
+        }
+
+    def _due(self, offset: float) -> float:
+        with self.condition:
+            return self.base + offset / self.speed
+
+    def _switch(self, short: bool) -> None:
+        """ Short switch interval only around an entry """
+        if short == self.short_interval:
+            return None
+        self.short_interval = short
+        setswitchinterval(
+            self.switch_interval if short else self.default_interval
+        )
+
+    def _thread(self) -> None:
+        self.default_interval = getswitchinterval()
+        index = 0
+        with self.condition:
+            self.base = monotonic()
+        while self.events and not self.exit_flag.is_set():
+            if index == len(self.events):
+                if not self.loop:
+                    break
+                index = 0
+                self.loops += 1
+                with self.condition:
+                    self.base += self.length / self.speed
+            offset, calls = self.events[index]
+            due = self._due(offset)
+            now = monotonic()
+            wait = due - now - self.spin_time
+            self._switch(wait <= self.switch_lead)
+            if wait > 0:
+                if wait > self.switch_lead:
+                    wait -= self.switch_lead
+                with self.condition:
+                    # set_speed() wakes up to work out the new due time
+                    self.condition.wait(wait)
+                continue
+            while now < due:
+                now = monotonic()
+            late = now - due
+            self.played += 1
+            self.late.add(late)
+            if late > .001:
+                self.late_over_ms += 1
+            self.sender.send_all(calls, automated=True)
+            index += 1
+        self._switch(False)
+        self.logger.info(f"Playback => {self.stats()}")
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def terminate(self) -> None:
+        self.exit_flag.set()
+        with self.condition:
+            self.condition.notify()
+        self.join()
@@ -0,0 +1,14 @@
+# flake8: noqa: F401
+from .formatter import (
+    formatter_cases, run_formatter_benchmark, FORMATTER_GOLDEN_FILE
+)
+from .led import run_sysex_benchmark, run_message_benchmark
+from .midi_input import run_input_benchmark
+from .controls import run_control_benchmark
+from .curves import run_curve_benchmark
+from .presets import run_preset_benchmark, run_recall_benchmark
+from .scenes import run_scene_benchmark
+from .tween import run_tween_benchmark
+from .automation import run_automation_benchmark
+from .clock import run_clock_benchmark, run_clock_output_benchmark
+from .sender import run_storm_benchmark, run_feedback_benchmark
@@ -0,0 +1,245 @@
+from time import sleep, monotonic
+from threading import Thread, Event
+from tempfile import TemporaryDirectory
+from random import Random
+from json import dumps
+from os import path
+from shutil import copyfile
+from services.automation import (
+    AUTOMATION_MAGIC, AUTOMATION_RECORD, AutomationRecorder,
+    AutomationPlayer, load_automation
+)
+from services.sender import SendScheduler, command_key
+from services.benchmarks.load import keep_busy
+
+AUTOMATION_EVENTS = 400
+# Seconds between two recorded control actions
+AUTOMATION_GAP = (.001, .01)
+# Playbacks which have to hand entries on less than 1 ms late on average,
+# the default switch interval is only compared
+AUTOMATION_WITHIN_MS = ["idle", "busy", "speed 2", "loop"]
+
+
+class _Recorder:
+    """ Stands in for the SendScheduler and remembers every call """
+    def __init__(self) -> None:
+        self.calls = []
+
+    def send_all(self, calls: list, automated: bool = False) -> None:
+        self.calls.extend(calls)
+
+
+def _arrived(name: str):
+    def send(self, *args) -> None:
+        self.received.append((monotonic(), name, args))
+    return send
+
+
+class _WireSender:
+    """ Stands in for MixerSender and remembers when every value arrived """
+    def __init__(self) -> None:
+        self.received = []
+
+    mix = _arrived("mix")
+    master = _arrived("master")
+    mute = _arrived("mute")
+    fx = _arrived("fx")
+    fx_setting = _arrived("fx_setting")
+    tempo = _arrived("tempo")
+
+
+def _wire(automation_file: str) -> dict:
+    """ Play the file through a SendScheduler, lateness on the wire """
+    sender = _WireSender()
+    scheduler = SendScheduler(sender)
+    scheduler.logger.disabled = True
+    player = AutomationPlayer(scheduler, automation_file)
+    player.logger.disabled = True
+    scheduler.start()
+    player.start()
+    player.join()
+    scheduler.terminate()
+    dues = {}
+    for offset, calls in player.events:
+        for call, args in calls:
+            dues.setdefault((call, args), []).append(player.base + offset)
+    late = [
+        time - max(due for due in dues[(name, args)] if due <= time)
+        for time, name, args in sender.received
+    ]
+    return {
+        "played": sum(len(calls) for _, calls in player.events),
+        "sent": len(late),
+        "late_avg_ms": 1000 * sum(late) / len(late),
+        "late_max_ms": 1000 * max(late)
+    }
+
+
+def _session(count: int) -> list:
+    """ count actions of a person as (seconds, call, args) """
+    random = Random(47)
+    calls = [
+        lambda: ("mix", (random.randrange(16), random.random(), "i")),
+        lambda: ("mix", (random.randrange(4), random.random(), "f")),
+        lambda: ("master", (random.random(),)),
+        lambda: ("mute", (random.randrange(16), random.randrange(2), "i")),
+        lambda: (
+            "fx",
+            (random.randrange(16), random.random(), "i", random.randrange(4))
+        ),
+        lambda: (
+            "fx_setting",
+            (random.randrange(4), random.randrange(1, 7), random.random())
+        ),
+        lambda: ("tempo", (random.randrange(60, 188),))
+    ]
+    time = 0
+    session = []
+    for _ in range(count):
+        time += random.uniform(*AUTOMATION_GAP)
+        session.append((time,) + random.choice(calls)())
+    return session
+
+
+def _append_torn(automation_file: str, count: int) -> bool:
+    """ A new session after a torn record loads as well """
+    torn_file = automation_file + ".torn"
+    copyfile(automation_file, torn_file)
+    recorder = AutomationRecorder(torn_file, delay=.01)
+    recorder.logger.disabled = True
+    recorder.record([(("master",), (.5,))], recorder.started + .1)
+    recorder.terminate()
+    events, _ = load_automation(torn_file)
+    return len(events) == count + 1 and events[-1][1] == [("master", (.5,))]
+
+
+def _unknown_refused(directory: str) -> bool:
+    """ Unknown calls and foreign files raise ValueError """
+    refused = []
+    unknown = path.join(directory, "unknown.m2sa")
+    with open(unknown, "wb") as fp:
+        fp.write(AUTOMATION_MAGIC + AUTOMATION_RECORD.pack(0, 9, 0, 0, 0, 0))
+    foreign = path.join(directory, "foreign.m2sa")
+    with open(foreign, "wb") as fp:
+        fp.write(b"{}")
+    for action in [
+        lambda: load_automation(unknown),
+        lambda: AutomationRecorder(foreign)
+    ]:
+        try:
+            action()
+            refused.append(False)
+        except ValueError:
+            refused.append(True)
+    return all(refused)
+
+
+def _play(
+    automation_file: str, speed: float, loop: bool, load: bool,
+    switch_interval: float = None
+) -> dict:
+    """ Play the file and return the player stats and the played calls """
+    recorder = _Recorder()
+    options = {} if switch_interval is None else {
+        "switch_interval": switch_interval
+    }
+    player = AutomationPlayer(
+        recorder, automation_file, speed, loop, **options
+    )
+    player.logger.disabled = True
+    stop = Event()
+    busy = Thread(target=keep_busy, args=(stop,))
+    if load:
+        busy.start()
+    started = monotonic()
+    player.start()
+    if loop:
+        while player.played < 2 * len(player.events):
+            sleep(.01)
+    else:
+        player.join()
+    player.terminate()
+    stop.set()
+    if load:
+        busy.join()
+    result = player.stats()
+    result["seconds"] = monotonic() - started
+    result["calls"] = recorder.calls
+    return result
+
+
+def run_automation_benchmark(count: int = AUTOMATION_EVENTS) -> dict:
+    """ Record count actions of a person, compare the file with the same
+        actions as JSON lines and check that they load unchanged, also
+        after a torn last record and with a session appended to it, and
+        that unknown calls are refused. Play them idle, while another Python
+        thread is busy (with and without the shorter switch interval),
+        twice as fast and looped, and once through a SendScheduler.
+        Returns sizes, the checks and the timing of every playback.
+        Except with the default switch interval, entries have to be handed
+        on less than 1 ms late on average. On the wire the SendScheduler
+        adds its coalescing and rate limits.
+    """
+    session = _session(count)
+    with TemporaryDirectory() as directory:
+        automation_file = path.join(directory, "automation.m2sa")
+        recorder = AutomationRecorder(automation_file, delay=.01)
+        recorder.logger.disabled = True
+        recorder.start()
+        for time, call, args in session:
+            recorder.record(
+                [(command_key(call, args), args)], recorder.started + time
+            )
+        recorder.terminate()
+        json_bytes = sum(
+            len(dumps({"t": time, "call": call, "args": args})) + 1
+            for time, call, args in session
+        )
+        events, length = load_automation(automation_file)
+        loaded = [
+            (time, call, args)
+            for time, calls in events for call, args in calls
+        ]
+        exact = len(loaded) == count and all(
+            abs(time - wanted[0]) < .000001 and (call, args) == wanted[1:]
+            for (time, call, args), wanted in zip(loaded, session)
+        )
+        with open(automation_file, "ab") as fp:
+            fp.write(b"\x00" * 7)
+        torn = len(load_automation(automation_file)[0]) == len(events)
+        file_bytes = path.getsize(automation_file) - 7
+        appended = _append_torn(automation_file, len(events))
+        refused = _unknown_refused(directory)
+        played = {
+            "idle": _play(automation_file, 1, False, False),
+            "busy default": _play(
+                automation_file, 1, False, True, switch_interval=.005
+            ),
+            "busy": _play(automation_file, 1, False, True),
+            "speed 2": _play(automation_file, 2, False, False),
+            "loop": _play(automation_file, 1, True, False)
+        }
+        wire = _wire(automation_file)
+    wanted = [(call, args) for _, call, args in session]
+    for name, result in played.items():
+        calls = result.pop("calls")
+        if name == "loop":
+            result["complete"] = calls[:2 * count] == wanted * 2
+        else:
+            result["complete"] = calls == wanted
+        result["within_ms"] = (
+            result["late_avg_ms"] < 1 if name in AUTOMATION_WITHIN_MS
+            else None
+        )
+    return {
+        "events": count,
+        "length": length,
+        "file_bytes": file_bytes,
+        "json_bytes": json_bytes,
+        "exact": exact,
+        "torn_dropped": torn,
+        "torn_appended": appended,
+        "unknown_refused": refused,
+        "played": played,
+        "wire": wire
+    }
@@ -0,0 +1,244 @@
+from time import sleep, perf_counter, monotonic
+from threading import Thread, Event
+from random import Random
+from collections import deque
+from mido import open_input, open_output, Message
+from services.clock import ClockEstimator, MidiClockInput, MidiClockOutput
+from services.config import Config, CLOCK_PPQN, CLOCK_HYSTERESIS
+from services.benchmarks.load import keep_busy
+
+# (BPM, beats) played by the synthetic clock, the last tempo sits right
+# between two rounded values
+CLOCK_SEGMENTS = [(120, 32), (128, 32), (95.3, 32), (100.48, 64)]
+# Standard deviation of the tick jitter, share of ticks delayed by a
+# scheduling hiccup of the sending device and how long
+CLOCK_JITTER = .001
+CLOCK_HICCUPS = .02
+CLOCK_HICCUP_TIME = .004
+# Mixer tempos the clock generator follows, seconds each
+CLOCK_OUT_TEMPOS = [120, 150]
+CLOCK_OUT_TIME = 1.5
+CLOCK_LOOPBACK = "midi2soundcraft clock loopback"
+
+
+def _matches(tempo: int, bpm: float) -> bool:
+    """ A tempo next to the middle between two BPM values may be either """
+    return abs(tempo - bpm) <= .5 + CLOCK_HYSTERESIS
+
+
+class _TempoSender:
+    """ Stands in for the SendScheduler and remembers every tempo """
+    def __init__(self) -> None:
+        self.tempos = []
+
+    def send_all(self, calls: list, automated: bool = False) -> None:
+        self.tempos.extend(args[0] for _, args in calls)
+
+
+class _LastBeat:
+    """ Tempo of the last beat, rounded and sent whenever it differs """
+    def __init__(self) -> None:
+        self.ticks = deque(maxlen=CLOCK_PPQN + 1)
+        self.tempo = None
+
+    def tick(self, now: float) -> int:
+        self.ticks.append(now)
+        if len(self.ticks) <= CLOCK_PPQN:
+            return None
+        tempo = round(60 / (self.ticks[-1] - self.ticks[0]))
+        if tempo == self.tempo:
+            return None
+        self.tempo = tempo
+        return tempo
+
+
+class _Loopback:
+    """ Stands in for a MIDI port pair without a MIDI backend, the
+        receive time of a tick is the time it was sent
+    """
+    def __init__(self) -> None:
+        self.times = []
+
+    def send(self, message: Message) -> None:
+        self.times.append(monotonic())
+
+    def close(self) -> None:
+        pass
+
+
+def _sleep_clock(config: Config, port) -> None:
+    """ Ticks by sleeping one period after every tick """
+    end = monotonic() + CLOCK_OUT_TIME * len(CLOCK_OUT_TEMPOS)
+    message = Message("clock")
+    while monotonic() < end:
+        port.send(message)
+        sleep(60 / (float(config.get_bpm()) * CLOCK_PPQN))
+
+
+def _generator_clock(config: Config, port) -> None:
+    clock = MidiClockOutput(config, "loopback", port=port)
+    clock.logger.disabled = True
+    clock.start()
+    sleep(CLOCK_OUT_TIME * len(CLOCK_OUT_TEMPOS))
+    clock.terminate()
+
+
+def _received(generate, load: bool) -> dict:
+    """ Tick intervals per tempo at the receiving end of a loopback """
+    config = Config("ClockBenchmark")
+    config.logger.disabled = True
+    config.update_bpm(str(CLOCK_OUT_TEMPOS[0]))
+    try:
+        receiver = open_input(CLOCK_LOOPBACK, virtual=True)
+        port = open_output(CLOCK_LOOPBACK)
+        times = []
+        receiver.callback = lambda message: times.append(monotonic())
+        loopback = "virtual port"
+    except (ImportError, OSError):
+        receiver = None
+        port = _Loopback()
+        times = port.times
+        loopback = "in process"
+    stop = Event()
+    busy = Thread(target=keep_busy, args=(stop,))
+    if load:
+        busy.start()
+    changes = []
+    generator = Thread(target=generate, args=(config, port))
+    generator.start()
+    for bpm in CLOCK_OUT_TEMPOS[1:]:
+        sleep(CLOCK_OUT_TIME)
+        changes.append(monotonic())
+        config.update_bpm(str(bpm))
+    generator.join()
+    stop.set()
+    if load:
+        busy.join()
+    port.close()
+    if receiver:
+        receiver.close()
+    result = {"loopback": loopback, "tempos": []}
+    for index, bpm in enumerate(CLOCK_OUT_TEMPOS):
+        # Ticks of one tempo, without the one around the change
+        start = changes[index - 1] + .1 if index else 0
+        end = changes[index] if index < len(changes) else float("inf")
+        ticks = [time for time in times if start <= time < end]
+        period = 60 / (bpm * CLOCK_PPQN)
+        intervals = [
+            second - first for first, second in zip(ticks, ticks[1:])
+        ]
+        estimator = ClockEstimator()
+        for time in ticks:
+            estimator.tick(time)
+        result["tempos"].append({
+            "bpm": bpm,
+            "ticks": len(ticks),
+            "drift_ms": 1000 * (
+                ticks[-1] - ticks[0] - (len(ticks) - 1) * period
+            ),
+            "jitter_ms": 1000 * max(
+                abs(interval - period) for interval in intervals
+            ),
+            "followed": estimator.tempo
+        })
+    return result
+
+
+def _clock(seed: int) -> list:
+    """ (tick time, BPM played) of the synthetic clock """
+    random = Random(seed)
+    ticks = []
+    time = 0
+    for bpm, beats in CLOCK_SEGMENTS:
+        for _ in range(beats * CLOCK_PPQN):
+            time += 60 / (bpm * CLOCK_PPQN)
+            jitter = random.gauss(0, CLOCK_JITTER)
+            if random.random() < CLOCK_HICCUPS:
+                jitter += CLOCK_HICCUP_TIME
+            ticks.append((time + jitter, bpm))
+    return ticks
+
+
+def _follow(estimator, ticks: list) -> dict:
+    """ Feed ticks and count sends, wrong tempos and settle times """
+    sends = 0
+    wrong = 0
+    settle = []
+    current = None
+    changed = 0
+    settled = False
+    started = perf_counter()
+    for time, bpm in ticks:
+        if bpm != current:
+            current = bpm
+            changed = time
+            settled = False
+        tempo = estimator.tick(time)
+        if tempo is None:
+            continue
+        sends += 1
+        if _matches(tempo, bpm):
+            if not settled:
+                settle.append(time - changed)
+            settled = True
+        elif settled:
+            # Moved away from a tempo which did not change
+            wrong += 1
+    return {
+        "sends": sends,
+        "wrong": wrong,
+        "settle_ms": 1000 * max(settle) if settle else None,
+        "settled": len(settle),
+        "us_per_tick": 1000000 * (perf_counter() - started) / len(ticks)
+    }
+
+
+def run_clock_benchmark(seed: int = 48) -> dict:
+    """ Follow a synthetic MIDI clock with jitter and hiccups through
+        tempo changes with the tempo of the last beat and with
+        ClockEstimator. The last tempo of CLOCK_SEGMENTS lies between two
+        rounded BPM values.
+        Returns tempo sends, sends away from a steady tempo, the longest
+        time until a new tempo was sent, how many tempos were reached and
+        the time per tick. "input" feeds the same clock through
+        MidiClockInput together with a second clock which has to be
+        ignored and checks that every tempo was sent exactly once.
+    """
+    ticks = _clock(seed)
+    results = {
+        "last beat": _follow(_LastBeat(), ticks),
+        "estimator": _follow(ClockEstimator(), ticks)
+    }
+    sender = _TempoSender()
+    clock = MidiClockInput(sender)
+    clock.logger.disabled = True
+    for time, bpm in ticks:
+        clock.tick("Clock", time)
+        clock.tick("Other", time + .003)
+    results["input"] = {
+        "source": clock.source,
+        "tempos": sender.tempos,
+        "ok": clock.source == "Clock"
+        and len(sender.tempos) == len(CLOCK_SEGMENTS)
+        and all(
+            _matches(tempo, bpm)
+            for tempo, (bpm, _) in zip(sender.tempos, CLOCK_SEGMENTS)
+        )
+    }
+    return results
+
+
+def run_clock_output_benchmark() -> dict:
+    """ Generate MIDI clock of a mixer tempo which changes after
+        CLOCK_OUT_TIME seconds and receive it on a virtual loopback port
+        (in process without a MIDI backend). Compares sleeping one period
+        per tick with MidiClockOutput, idle and with a busy thread.
+        Returns per tempo the received ticks, the drift of the last tick,
+        the largest deviation of an interval from the period and the tempo
+        ClockEstimator follows from the received ticks.
+    """
+    return {
+        "sleep": _received(_sleep_clock, False),
+        "idle": _received(_generator_clock, False),
+        "busy": _received(_generator_clock, True)
+    }
@@ -0,0 +1,116 @@
+from time import perf_counter_ns
+from os import path
+from tempfile import TemporaryDirectory
+from services.formatter import ConfigVars
+from services.control_map import (
+    ControlMapping, bind_controls, dispatch_control
+)
+
+CONTROL_ROUNDS = 200
+# Knob mapping of the MIDIMix before the mapping file
+MIDIMIX_KNOBS = [
+    [(0, 2), (1, 2), (2, 2), (3, 2)],
+    [(4, 2), (5, 2), (6, 2), (7, 2)],
+    [(0, 1), (1, 1), (2, 1), (3, 1)],
+    [(4, 1), (5, 1), (6, 1), (7, 1)],
+    [(0, 0), (1, 0), (2, 0), (3, 0)],
+    [(4, 0), (5, 0), (6, 0), (7, 0)]
+]
+
+
+class _Recorder:
+    """ Stands in for the sender and remembers every call """
+    def __init__(self) -> None:
+        self.calls = []
+
+    def fx(self, *args) -> None:
+        self.calls.append(("fx",) + args)
+
+    def fx_setting(self, *args) -> None:
+        self.calls.append(("fx_setting",) + args)
+
+    def tempo(self, *args) -> None:
+        self.calls.append(("tempo",) + args)
+
+
+def _scan_knob(sender, vars: ConfigVars, x: int, y: int, value: int, bank):
+    """ Knob dispatch before the control tables """
+    current_knob = (x, y)
+    for check_set in MIDIMIX_KNOBS:
+        if current_knob in check_set:
+            channel = MIDIMIX_KNOBS.index(check_set)
+            break
+    channel_send = channel + bank * 6
+    sender.fx(
+        channel_send,
+        vars.midi_to_soundcraft(value),
+        "i", MIDIMIX_KNOBS[channel].index((x, y))
+    )
+
+
+def _scan_fader(sender, vars: ConfigVars, fader_id: int, value: int):
+    """ Fader dispatch before the control tables """
+    if fader_id in list(range(3)):
+        sender.fx_setting(2, fader_id + 1, vars.midi_to_soundcraft(value))
+    elif fader_id in list(range(3, 8)):
+        sender.fx_setting(
+            3, (fader_id + 1) - 3, vars.midi_to_soundcraft(value)
+        )
+    elif fader_id == 8:
+        sender.tempo(60 + value)
+
+
+def _events() -> list:
+    """ Every MIDIMix knob and fader in both banks """
+    events = []
+    for bank in range(2):
+        for knobs in MIDIMIX_KNOBS:
+            for x, y in knobs:
+                events.append(("knob", x, y, bank))
+        for fader_id in range(9):
+            events.append(("fader", fader_id, bank))
+    return events
+
+
+def run_control_benchmark(rounds: int = CONTROL_ROUNDS) -> dict:
+    """ Dispatch every MIDIMix control rounds times with the branches and
+        knob scan used before the mapping file and by one lookup in the
+        tables compiled from a freshly written default mapping file.
+        Returns ns per event of both, the compile time and whether both
+        sent the same.
+    """
+    vars = ConfigVars()
+    with TemporaryDirectory() as directory:
+        mapping = ControlMapping(path.join(directory, "mapping.json"))
+        mapping.mtime = None
+        start = perf_counter_ns()
+        mapping.reload()
+        compile_time = perf_counter_ns() - start
+    events = _events()
+    scanned = _Recorder()
+    start = perf_counter_ns()
+    for value in range(rounds):
+        value %= 128
+        for event in events:
+            if event[0] == "knob":
+                _scan_knob(scanned, vars, event[1], event[2], value, event[3])
+            else:
+                _scan_fader(scanned, vars, event[1], value)
+    scan_time = perf_counter_ns() - start
+    looked_up = _Recorder()
+    controls = bind_controls(
+        mapping.compiled["midimix"]["controls"], looked_up, vars
+    )
+    start = perf_counter_ns()
+    for value in range(rounds):
+        value %= 128
+        for event in events:
+            dispatch_control(controls, event, value)
+    lookup_time = perf_counter_ns() - start
+    return {
+        "events": len(events) * rounds,
+        "scan_ns": scan_time / len(events) / rounds,
+        "lookup_ns": lookup_time / len(events) / rounds,
+        "compile_ms": compile_time / 1e6,
+        "same_calls": scanned.calls == looked_up.calls
+    }
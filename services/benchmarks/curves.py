@@ -0,0 +1,128 @@
+from time import perf_counter_ns
+from copy import deepcopy
+from scipy.interpolate import interp1d
+from services.formatter import ConfigVars
+from services.control_map import (
+    DEFAULT_MAPPING, compile_mapping, bind_controls, dispatch_control
+)
+
+CURVE_ROUNDS = 20
+# Breakpoints of a custom master fader curve, fine around unity
+CURVE_BREAKPOINTS = [[0, 0], [.25, .4], [.75, .8], [1, 1]]
+BREAKPOINTS = interp1d(
+    [point[0] for point in CURVE_BREAKPOINTS],
+    [point[1] for point in CURVE_BREAKPOINTS]
+)
+
+
+class _Recorder:
+    """ Stands in for the sender and remembers every value """
+    def __init__(self) -> None:
+        self.values = []
+
+    def mix(self, channel, value, kind) -> None:
+        self.values.append(value)
+
+    def master(self, value) -> None:
+        self.values.append(value)
+
+    def fx_setting(self, fx, par, value) -> None:
+        self.values.append(value)
+
+
+def _mapping() -> dict:
+    """ Default mapping with the APC faders on mix and master """
+    mapping = deepcopy(DEFAULT_MAPPING)
+    mapping["apc"]["faders"] = [
+        {"faders": list(range(8)), "send": "mix", "curve": "db"},
+        {"faders": [8], "send": "master", "curve": CURVE_BREAKPOINTS}
+    ]
+    mapping["apc"]["grid"][0]["curve"] = "db"
+    return mapping
+
+
+def _on_the_fly(vars: ConfigVars, sender, fader_id: int, value: int):
+    """ Curves worked out on every event instead of looked up """
+    position = value / 127
+    if fader_id == 8:
+        sender.master(float(BREAKPOINTS(position)))
+        return None
+    low, high = vars.db_range
+    sender.mix(
+        fader_id,
+        float(vars.db_to_mix(low + position * (high - low)))
+        if position else 0.0,
+        "i"
+    )
+
+
+def _invalid(curve) -> bool:
+    mapping = _mapping()
+    mapping["apc"]["faders"][1]["curve"] = curve
+    try:
+        compile_mapping(mapping)
+    except ValueError:
+        return True
+    return False
+
+
+def run_curve_benchmark(rounds: int = CURVE_ROUNDS) -> dict:
+    """ Sweep the 9 APC faders through all 128 values rounds times: mix
+        faders on a dB-linear curve and master on breakpoints, once worked
+        out per event and once by the tables compiled from the mapping,
+        next to the linear val / 127 of fx_setting faders.
+        Returns ns per event of all three and checks that the tables match
+        the curves, linear stays val / 127, the grid table has 8 values
+        and invalid curves are refused.
+    """
+    vars = ConfigVars()
+    start = perf_counter_ns()
+    compiled = compile_mapping(_mapping())
+    compile_time = perf_counter_ns() - start
+    events = [
+        (fader_id, value) for value in range(128) for fader_id in range(9)
+    ]
+    worked_out = _Recorder()
+    start = perf_counter_ns()
+    for _ in range(rounds):
+        for fader_id, value in events:
+            _on_the_fly(vars, worked_out, fader_id, value)
+    fly_time = perf_counter_ns() - start
+    looked_up = _Recorder()
+    controls = bind_controls(compiled["apc"]["controls"], looked_up, vars)
+    start = perf_counter_ns()
+    for _ in range(rounds):
+        for fader_id, value in events:
+            dispatch_control(controls, ("fader", fader_id), value)
+    table_time = perf_counter_ns() - start
+    linear = _Recorder()
+    controls = bind_controls(
+        compile_mapping(DEFAULT_MAPPING)["apc"]["controls"], linear, vars
+    )
+    start = perf_counter_ns()
+    for _ in range(rounds):
+        for fader_id, value in events:
+            dispatch_control(controls, ("fader", fader_id), value)
+    linear_time = perf_counter_ns() - start
+    grid = compiled["apc"]["controls"][("grid", 0, 0, 0, 0)][3]
+    checks = {
+        "tables": worked_out.values == looked_up.values,
+        "linear": linear.values == [
+            vars.midi_to_soundcraft(value)
+            for _ in range(rounds) for _, value in events
+        ],
+        "grid": len(grid) == 8 and grid == sorted(grid) and grid[-1] == 1,
+        "invalid": all(_invalid(curve) for curve in [
+            "log", [[0, 0]], [[0, 0], [.5, .2], [.5, .4], [1, 1]],
+            [[0, 0], [1, 2]], [[.1, 0], [1, 1]]
+        ])
+    }
+    count = len(events) * rounds
+    return {
+        "events": count,
+        "fly_ns": fly_time / count,
+        "table_ns": table_time / count,
+        "linear_ns": linear_time / count,
+        "compile_ms": compile_time / 1e6,
+        "checks": checks
+    }
@@ -0,0 +1,108 @@
+from time import perf_counter_ns
+from platform import machine, python_version
+from os import path
+from json import dumps, loads
+from services.formatter import OutputFormatter
+
+FORMATTER_GOLDEN_FILE = path.join(
+    path.dirname(__file__), "golden", "formatter.json"
+)
+# Sweep resolution. 1000 steps hits every MIDI step (x / 127) closely
+# and every decade boundary of the lookup tables exactly
+FORMATTER_STEPS = 1000
+
+
+def formatter_cases() -> list:
+    """ Every fx/par combination OutputFormatter.fx_parval can label.
+        Returns a list of (case name, fx, par, fx1par1) tuples
+    """
+    formatter = OutputFormatter()
+    cases = []
+    for fx in formatter.vars.map_fxname:
+        # Reverb (0) and Room (3) share the parnames
+        parnames = formatter.vars.map_parname[0 if fx == 3 else fx]
+        for par in parnames:
+            if fx == 1 and par == 2:
+                # Delay division depends on the delay mode set by fx1par1
+                cases.append((f"fx{fx}.par{par}.time", fx, f"par{par}", 1))
+                cases.append((f"fx{fx}.par{par}.subdiv", fx, f"par{par}", 0))
+                continue
+            cases.append((f"fx{fx}.par{par}", fx, f"par{par}", 1))
+        cases.append((f"fx{fx}.mix", fx, "mix", 1))
+        cases.append((f"fx{fx}.mute", fx, "mute", 1))
+    return cases
+
+
+def _sweep(steps: int) -> list:
+    return [x / steps for x in range(steps + 1)]
+
+
+def run_formatter_benchmark(
+    steps: int = FORMATTER_STEPS,
+    golden_file: str = FORMATTER_GOLDEN_FILE,
+    update_golden: bool = False
+) -> dict:
+    """ Sweep every formatter case, time each call and compare the labels
+        against the golden file.
+        With update_golden the golden file will be rewritten instead.
+    """
+    formatter = OutputFormatter()
+    values = _sweep(steps)
+    labels = {}
+    timings = {}
+    for name, fx, par, fx1par1 in formatter_cases():
+        labels[name] = []
+        start = perf_counter_ns()
+        for value in values:
+            labels[name].append(formatter.fx_parval(fx, par, value, fx1par1))
+        timings[name] = (perf_counter_ns() - start) / len(values)
+    # BPM is sent as a plain number by the mixer
+    labels["bpm"] = []
+    start = perf_counter_ns()
+    for bpm in range(60, 188):
+        labels["bpm"].append(formatter.fx_parval(1, "bpm", bpm))
+    timings["bpm"] = (perf_counter_ns() - start) / 128
+    # Mix curve used for channels, fx returns and master
+    labels["mix"] = []
+    start = perf_counter_ns()
+    for value in values:
+        labels["mix"].append(formatter.mix(value))
+    timings["mix"] = (perf_counter_ns() - start) / len(values)
+
+    result = {
+        "machine": machine(),
+        "python": python_version(),
+        "steps": steps,
+        "timings": timings,
+        "mismatches": {}
+    }
+    if update_golden:
+        # One line per case keeps diffs of the golden file readable
+        lines = [
+            f"  {dumps(name)}: {dumps(labels[name])}" for name in labels
+        ]
+        with open(golden_file, "w") as fp:
+            fp.write(
+                f'{{"steps": {steps}, "labels": {{\n'
+                + ",\n".join(lines)
+                + "\n}}\n"
+            )
+        return result
+    with open(golden_file, "r") as fp:
+        golden = loads(fp.read())
+    if golden["steps"] != steps:
+        raise ValueError(
+            f"Golden file was created with {golden['steps']} steps"
+        )
+    for name in labels:
+        if name not in golden["labels"]:
+            result["mismatches"][name] = "missing in golden file"
+            continue
+        for index, label in enumerate(labels[name]):
+            if label != golden["labels"][name][index]:
+                result["mismatches"][name] = (
+                    f"value {values[index] if name != 'bpm' else index + 60}"
+                    f" => {label} != {golden['labels'][name][index]}"
+                )
+                break
+    return result
@@ -0,0 +1,129 @@
+from time import perf_counter_ns
+from math import ceil
+from mido import Message
+from mido.ports import BaseOutput
+from services.formatter import ConfigVars
+from services.led import (
+    LedFrame, LedOutput, NOTE_SIZE, APC_MESSAGES,
+    APC_COLOURS_VELOCITY, APC_BRIGHTNESS_CHANNEL,
+    pad_note, sysex_runs, sysex_size, sysex_message
+)
+
+LED_REPEAT = 1000
+LED_MESSAGES = 200000
+
+
+class _NullRtMidi:
+    def send_message(self, data) -> None:
+        pass
+
+
+class _NullOutput(BaseOutput):
+    """ mido output behaving like the rtmidi backend without a device """
+    def _open(self, **kwargs) -> None:
+        self._rt = _NullRtMidi()
+
+    def _send(self, message: Message) -> None:
+        self._rt.send_message(message.bytes())
+
+
+def _views() -> dict:
+    """ Frames of typical full view redraws """
+    vars = ConfigVars()
+    views = {}
+    mix = LedFrame()
+    for channel, value in enumerate(
+        [.76, .76, .64, .5, .76, .3, 0, .9]
+    ):
+        mix.draw_channel(
+            channel, vars.soundcraft_to_midi(value), value,
+            "orange", 0, set_lower_as_zero=True
+        )
+    views["mix"] = mix
+    master = LedFrame()
+    for fx, value in enumerate([.5, .4, .3, .6]):
+        master.draw_channel(
+            fx, vars.soundcraft_to_midi(value), value,
+            vars.map_color[fx], 0
+        )
+    master.draw_channel(
+        7, vars.soundcraft_to_midi(.8), .8, "red", 0, set_lower_as_zero=True
+    )
+    views["master_fxreturn"] = master
+    full = LedFrame()
+    for channel in range(8):
+        full.draw_channel(channel, 8, 1, "orange", 0)
+    views["full"] = full
+    return views
+
+
+def _usb_packets_sysex(size: int) -> int:
+    # USB-MIDI carries 3 SysEx bytes per 4 byte packet
+    return ceil(size / 3)
+
+
+def run_sysex_benchmark(repeat: int = LED_REPEAT) -> dict:
+    """ Compare note messages and a single SysEx frame for full redraws
+        starting from a dark grid.
+    """
+    results = {}
+    for name, frame in _views().items():
+        changed = set(
+            key[1:] for key, state in frame.leds.items()
+            if key[0] == "grid" and state != ("off", 0)
+        )
+        start = perf_counter_ns()
+        for _ in range(repeat):
+            for x, y in changed:
+                colour, brightness = frame.leds[("grid", x, y)]
+                Message(
+                    "note_on",
+                    channel=APC_BRIGHTNESS_CHANNEL[brightness],
+                    note=pad_note(x, y),
+                    velocity=APC_COLOURS_VELOCITY[colour]
+                ).bytes()
+        note_time = (perf_counter_ns() - start) / repeat
+        start = perf_counter_ns()
+        for _ in range(repeat):
+            runs = sysex_runs(frame, changed)
+            sysex_message(runs).bytes()
+        sysex_time = (perf_counter_ns() - start) / repeat
+        results[name] = {
+            "pads": len(changed),
+            "note_bytes": NOTE_SIZE * len(changed),
+            "note_packets": len(changed),
+            "note_time": note_time,
+            "sysex_bytes": sysex_size(runs),
+            "sysex_packets": _usb_packets_sysex(sysex_size(runs)),
+            "sysex_time": sysex_time,
+            "sysex_blocks": len(runs)
+        }
+    return results
+
+
+def run_message_benchmark(count: int = LED_MESSAGES) -> dict:
+    """ Messages per second for grid LED updates built per call (as
+        akai_pro_py does) and taken from the prebuilt message table
+    """
+    keys = [key for key in APC_MESSAGES if key[0][0] == "grid"]
+    updates = [keys[i % len(keys)] for i in range(count)]
+    port = _NullOutput()
+    start = perf_counter_ns()
+    for (_, x, y), (colour, brightness) in updates:
+        port.send(Message(
+            "note_on",
+            channel=APC_BRIGHTNESS_CHANNEL[brightness],
+            note=pad_note(x, y),
+            velocity=APC_COLOURS_VELOCITY[colour]
+        ))
+    built = (perf_counter_ns() - start) / 1e9
+    output = LedOutput(port)
+    start = perf_counter_ns()
+    for update in updates:
+        output.send(APC_MESSAGES[update])
+    prebuilt = (perf_counter_ns() - start) / 1e9
+    return {
+        "messages": count,
+        "built_per_second": count / built,
+        "prebuilt_per_second": count / prebuilt
+    }
@@ -0,0 +1,7 @@
+from threading import Event
+
+
+def keep_busy(stop: Event) -> None:
+    """ Python work on another thread, competing for the interpreter """
+    while not stop.is_set():
+        sum(range(10000))
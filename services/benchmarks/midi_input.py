@@ -0,0 +1,97 @@
+from time import sleep, monotonic
+from services.threads.midi_input import MidiInputThread
+
+# Time a controller needs to handle one event (mapping, sender, GUI)
+DISPATCH_TIME = .002
+# Time between two MIDI messages of a fast knob twist
+EVENT_INTERVAL = .0005
+
+
+class _Knob:
+    def __init__(self, knob: int, value: int) -> None:
+        self.knob = knob
+        self.value = value
+
+
+class _Button:
+    def __init__(self, button_id: int, state: bool) -> None:
+        self.button_id = button_id
+        self.state = state
+
+
+def _control_key(event) -> tuple:
+    if isinstance(event, _Knob):
+        return ("knob", event.knob)
+    return None
+
+
+def _twist() -> list:
+    """ Three MIDIMix knobs turned from 0 to 127 at once with a bank
+        button press and release after every 32 steps
+    """
+    events = []
+    for value in range(128):
+        for knob in range(3):
+            events.append(_Knob(knob, value))
+        if value % 32 == 31:
+            events.append(_Button(value // 32, True))
+            events.append(_Button(value // 32, False))
+    return events
+
+
+def run_input_benchmark(
+    dispatch_time: float = DISPATCH_TIME,
+    interval: float = EVENT_INTERVAL
+) -> dict:
+    """ Feed a knob twist through the input stage and directly.
+        Returns the collapse ratio, the time until the last event is
+        handled and whether buttons kept their order and every run ended
+        with the newest knob values.
+    """
+    events = _twist()
+    results = {}
+    for name in ["direct", "collapsed"]:
+        handled = []
+
+        def dispatch(event) -> None:
+            sleep(dispatch_time)
+            handled.append(event)
+
+        input_thread = MidiInputThread(dispatch, _control_key)
+        put = dispatch if name == "direct" else input_thread.put
+        input_thread.start()
+        start = monotonic()
+        for event in events:
+            put(event)
+            sleep(interval)
+        # The twist ends with a button release which is never collapsed
+        while not handled or handled[-1] is not events[-1]:
+            sleep(.001)
+        elapsed = monotonic() - start
+        input_thread.terminate()
+        buttons = [event for event in events if isinstance(event, _Button)]
+        # Newest value of every knob before each button
+        expected = {}
+        newest = {}
+        in_order = [
+            event for event in handled if isinstance(event, _Button)
+        ] == buttons
+        for event in events:
+            if isinstance(event, _Knob):
+                newest[event.knob] = event.value
+            else:
+                expected[id(event)] = dict(newest)
+        seen = {}
+        for event in handled:
+            if isinstance(event, _Knob):
+                seen[event.knob] = event.value
+            elif seen != expected[id(event)]:
+                in_order = False
+        results[name] = {
+            "events": len(events),
+            "dispatched": len(handled),
+            "collapse_ratio": len(events) / len(handled),
+            "time_ms": 1000 * elapsed,
+            "in_order": in_order and seen == newest
+        }
+    return results
@@ -0,0 +1,376 @@
+from time import perf_counter_ns, sleep, monotonic
+from os import path
+from json import dumps, loads
+from tempfile import TemporaryDirectory
+from threading import Thread
+from services.config import Config, PRESET_BANK_SIZE, PRESET_BANKS
+from services.presets import PresetStore, compile_preset, compile_scene
+from services.sender import SendScheduler
+
+PRESET_SAVES = 200
+PRESET_SLOTS = 16
+PRESET_LIBRARY_SIZES = [16, 128, 512]
+# Parameters of every fx of the Ui16
+FX_PARS = {0: 5, 1: 4, 2: 3, 3: 5}
+# Parameters a preset changes against the one before
+RECALL_CHANGES = 4
+RECALL_ROUNDS = 3
+# Batches presets and scenes save into the same database file at once
+SHARED_ROUNDS = 50
+# Time a single command takes on a congested Wi-Fi link
+RECALL_SEND_TIME = .005
+
+
+def _preset(value: int) -> dict:
+    """ Preset shaped like Config.create_preset() with all 4 fx """
+    return {
+        "fx": {
+            str(fx): {
+                f"par{par}": (value + par) / 100
+                for par in range(1, pars + 1)
+            }
+            for fx, pars in FX_PARS.items()
+        }
+    }
+
+
+def _save_on_disk(preset_file: str, button: str, preset: dict) -> dict:
+    """ Save and reload the way the MIDIMix did before the preset store """
+    config = {}
+    if path.exists(preset_file):
+        with open(preset_file, "r") as fp:
+            config = loads(fp.read())
+    config[button] = preset
+    with open(preset_file, "w") as fp:
+        fp.write(dumps(config))
+    with open(preset_file, "r") as fp:
+        return loads(fp.read())
+
+
+def _crash(store: PresetStore) -> None:
+    """ Stop the writer without the final write of terminate() """
+    store.exit_flag.set()
+    with store.condition:
+        store.condition.notify()
+    store.join()
+
+
+def _wait_written(store: PresetStore) -> None:
+    while store.unsaved:
+        sleep(.001)
+
+
+def _open(directory: str, name: str, **kwargs) -> PresetStore:
+    """ Store which never imports the preset file of this machine """
+    kwargs.setdefault("import_file", path.join(directory, "missing.json"))
+    return PresetStore(path.join(directory, name), **kwargs)
+
+
+def _library(store: PresetStore) -> dict:
+    return {
+        slot: store.get(str(slot))
+        for slot in store.bank(0, PRESET_BANKS * PRESET_BANK_SIZE)
+    }
+
+
+def _recovery(directory: str) -> dict:
+    """ Reopen the store after a crash and import a JSON preset file """
+    store = _open(directory, "recovery.sqlite", delay=0)
+    store.start()
+    for button in range(PRESET_SLOTS):
+        store.save(str(button), _preset(button))
+    store.remove("0")
+    checks = {}
+    checks["bank_unsaved"] = (
+        store.bank(0, PRESET_BANK_SIZE) == list(range(1, PRESET_SLOTS))
+    )
+    _wait_written(store)
+    _crash(store)
+    expected = _library(store)
+    checks["committed"] = _library(
+        _open(directory, "recovery.sqlite")
+    ) == expected
+    # Preset file of the JSON store
+    import_file = path.join(directory, "presets.json")
+    with open(import_file, "w") as fp:
+        fp.write(dumps({"1": _preset(1), "2": _preset(2)}))
+    imported = _open(directory, "import.sqlite", import_file=import_file)
+    checks["imported"] = _library(imported) == {
+        1: _preset(1), 2: _preset(2)
+    }
+    imported.start()
+    imported.remove("1")
+    imported.remove("2")
+    imported.terminate()
+    # Emptied library is not imported again
+    checks["imported_once"] = not _library(
+        _open(directory, "import.sqlite", import_file=import_file)
+    )
+    # Every write fails, the change is dropped after the retries
+    failing = _open(directory, "failing.sqlite", delay=0)
+    failing.logger.disabled = True
+    failing.db.execute(
+        "CREATE TRIGGER full BEFORE INSERT ON presets"
+        " BEGIN SELECT RAISE(ABORT, 'disk full'); END"
+    )
+    failing.db.commit()
+    failing.start()
+    failing.save("0", _preset(0))
+    _wait_written(failing)
+    failing.terminate()
+    checks["write_dropped"] = failing.stats()["dropped"] == 1
+    checks["shared_file"] = _shared_file(directory)
+    return checks
+
+
+def _shared_file(directory: str) -> bool:
+    """ Presets and scenes in one file written at the same time, a
+        locked database drops the changes at the first failure
+    """
+    stores = [
+        _open(directory, "shared.sqlite", delay=0, retries=1),
+        _open(
+            directory, "shared.sqlite", delay=0, retries=1,
+            table="scenes", compiler=compile_scene
+        )
+    ]
+    for store in stores:
+        store.start()
+
+    def save(store: PresetStore, value: dict) -> None:
+        for batch in range(SHARED_ROUNDS):
+            for slot in range(PRESET_SLOTS):
+                store.save(str(slot), value(batch + slot))
+            _wait_written(store)
+
+    savers = [
+        Thread(target=save, args=(stores[0], _preset)),
+        Thread(target=save, args=(stores[1], lambda value: {
+            "m.mix": value / 100
+        }))
+    ]
+    for saver in savers:
+        saver.start()
+    for saver in savers:
+        saver.join()
+    for store in stores:
+        store.terminate()
+    last = SHARED_ROUNDS - 1
+    return all(store.stats()["dropped"] == 0 for store in stores) and [
+        store.get(str(slot)) for store in [
+            _open(directory, "shared.sqlite"),
+            _open(directory, "shared.sqlite", table="scenes")
+        ] for slot in range(PRESET_SLOTS)
+    ] == [_preset(last + slot) for slot in range(PRESET_SLOTS)] + [
+        {"m.mix": (last + slot) / 100} for slot in range(PRESET_SLOTS)
+    ]
+
+
+def _scaling(directory: str, size: int) -> dict:
+    """ Open, bank switch and first recall with size presets stored,
+        against loading the whole JSON preset file
+    """
+    presets = {str(slot): _preset(slot) for slot in range(size)}
+    preset_file = path.join(directory, f"scale{size}.json")
+    with open(preset_file, "w") as fp:
+        fp.write(dumps(presets))
+    store = _open(directory, f"scale{size}.sqlite", import_file=preset_file)
+    store.terminate()
+    last = str(size - 1)
+    start = perf_counter_ns()
+    with open(preset_file, "r") as fp:
+        loaded = loads(fp.read())
+    compiled = {slot: compile_preset(loaded[slot]) for slot in loaded}
+    json_time = perf_counter_ns() - start
+    start = perf_counter_ns()
+    store = _open(directory, f"scale{size}.sqlite")
+    open_time = perf_counter_ns() - start
+    start = perf_counter_ns()
+    # Bank of the last preset, which is recalled from it
+    store.bank(size - 1 - (size - 1) % PRESET_BANK_SIZE, PRESET_BANK_SIZE)
+    bank_time = perf_counter_ns() - start
+    start = perf_counter_ns()
+    commands = store.commands(last)
+    recall_time = perf_counter_ns() - start
+    reads = store.reads
+    store.terminate()
+    return {
+        "presets": size,
+        "json_us": json_time / 1000,
+        "open_us": open_time / 1000,
+        "bank_us": bank_time / 1000,
+        "recall_us": recall_time / 1000,
+        "same_commands": commands == compiled[last],
+        "recall_cached": reads == 0
+    }
+
+
+def run_preset_benchmark(saves: int = PRESET_SAVES) -> dict:
+    """ Time the caller of saves preset saves with the read-merge-write
+        and reload of the preset file and with the store, check that the
+        store comes back complete after a crash and time opening, a bank
+        switch and a first recall from that bank for growing libraries,
+        that failing writes are given up and that presets and scenes
+        can be written to the same file at the same time.
+        Returns us per save of both, the writer batches, the checks and
+        the times per library size.
+    """
+    with TemporaryDirectory() as directory:
+        preset_file = path.join(directory, "disk.json")
+        start = perf_counter_ns()
+        for save in range(saves):
+            on_disk = _save_on_disk(
+                preset_file, str(save % PRESET_SLOTS), _preset(save)
+            )
+        disk_time = perf_counter_ns() - start
+        store = _open(directory, "store.sqlite")
+        store.start()
+        start = perf_counter_ns()
+        for save in range(saves):
+            store.save(str(save % PRESET_SLOTS), _preset(save))
+        store_time = perf_counter_ns() - start
+        store.terminate()
+        stats = store.stats()
+        stored = _library(_open(directory, "store.sqlite"))
+        checks = _recovery(directory)
+        scaling = [
+            _scaling(directory, size) for size in PRESET_LIBRARY_SIZES
+        ]
+    checks["same_presets"] = stored == {
+        int(slot): preset for slot, preset in on_disk.items()
+    }
+    checks["same_commands"] = all(
+        result["same_commands"] for result in scaling
+    )
+    checks["bank_cached"] = all(
+        result["recall_cached"] for result in scaling
+    )
+    return {
+        "saves": saves,
+        "disk_us": disk_time / saves / 1000,
+        "store_us": store_time / saves / 1000,
+        "batches": stats["batches"],
+        "checks": checks,
+        "scaling": scaling
+    }
+
+
+class _RecallMixer:
+    """ Stands in for MixerSender. Every command takes send_time and is
+        echoed into config at once
+    """
+    def __init__(self, config: Config, send_time: float) -> None:
+        self.config = config
+        self.send_time = send_time
+        self.commands = 0
+
+    def fx_setting(self, fx, par, value) -> None:
+        sleep(self.send_time)
+        self.config.update_fx(str(fx), f"par{par}", str(value))
+        self.commands += 1
+
+
+def _recall_presets() -> dict:
+    """ Presets which each change RECALL_CHANGES parameters of the one
+        before, like variations of a scene
+    """
+    values = _preset(0)
+    options = [
+        (fx, option) for fx in values["fx"] for option in values["fx"][fx]
+    ]
+    presets = {}
+    for preset in range(PRESET_SLOTS):
+        for change in range(RECALL_CHANGES):
+            fx, option = options[
+                (preset * RECALL_CHANGES + change) % len(options)
+            ]
+            values["fx"][fx][option] = round(
+                values["fx"][fx][option] + .25, 2
+            ) % 1
+        presets[str(preset)] = loads(dumps(values))
+    return presets
+
+
+def _recall_all(scheduler: SendScheduler, preset: dict) -> int:
+    """ Recall the way the MIDIMix did before compiled presets """
+    effects = preset["fx"]
+    sent = 0
+    for fx in effects:
+        for option in effects[fx]:
+            if "par" not in option:
+                continue
+            scheduler.fx_setting(
+                int(fx), int(option[-1:]), float(effects[fx][option])
+            )
+            sent += 1
+    return sent
+
+
+def _recall_diff(
+    scheduler: SendScheduler, config: Config, store: PresetStore, preset: str
+) -> int:
+    """ Recall the way Midimix.recall_preset does """
+    changed = config.preset_diff(store.commands(preset))
+    scheduler.fx_settings(changed)
+    return len(changed)
+
+
+def run_recall_benchmark(
+    rounds: int = RECALL_ROUNDS,
+    send_time: float = RECALL_SEND_TIME
+) -> dict:
+    """ Recall every preset rounds times against a mixer which takes
+        send_time per command.
+        "all" parses the preset on every press and sends every parameter
+        one by one. "diff" sends the compiled commands which differ from
+        Config.
+        Returns commands sent, press to last command on the mixer, the
+        time of the caller and whether the mixer ended up with every
+        recalled preset.
+    """
+    presets = _recall_presets()
+    results = {}
+    with TemporaryDirectory() as directory:
+        store = _open(directory, "recall.sqlite")
+        for preset_id, preset in presets.items():
+            store.save(preset_id, preset)
+        for name in ["all", "diff"]:
+            config = Config()
+            for fx, options in _preset(0)["fx"].items():
+                for option, value in options.items():
+                    config.update_fx(fx, option, str(value))
+            mixer = _RecallMixer(config, send_time)
+            scheduler = SendScheduler(mixer)
+            scheduler.start()
+            latency = []
+            caller = 0
+            consistent = True
+            for _ in range(rounds):
+                for preset_id, preset in presets.items():
+                    received = mixer.commands
+                    pressed = monotonic()
+                    start = perf_counter_ns()
+                    if name == "all":
+                        sent = _recall_all(scheduler, preset)
+                    else:
+                        sent = _recall_diff(
+                            scheduler, config, store, preset_id
+                        )
+                    caller += perf_counter_ns() - start
+                    while mixer.commands < received + sent:
+                        sleep(.0005)
+                    latency.append(monotonic() - pressed)
+                    consistent = consistent and not config.preset_diff(
+                        store.commands(preset_id)
+                    )
+            scheduler.terminate()
+            results[name] = {
+                "recalls": len(latency),
+                "commands": mixer.commands,
+                "avg_ms": 1000 * sum(latency) / len(latency),
+                "max_ms": 1000 * max(latency),
+                "caller_us": caller / len(latency) / 1000,
+                "consistent": consistent
+            }
+        store.terminate()
+    return results
@@ -0,0 +1,159 @@
+from time import sleep, monotonic
+from json import dumps
+from services.config import Config, SEND_PRIORITY
+from services.presets import compile_scene
+from services.sender import SendScheduler
+
+SCENE_CHANNELS = 16
+SCENE_ROUNDS = 5
+# Every n-th value of the second scene differs from the first
+SCENE_CHANGE_EVERY = 5
+# Time a single command takes on a congested Wi-Fi link
+SCENE_SEND_TIME = .005
+
+
+class _SceneMixer:
+    """ Stands in for MixerSender. Every command takes send_time and is
+        echoed into config at once
+    """
+    def __init__(self, config: Config, send_time: float) -> None:
+        self.config = config
+        self.send_time = send_time
+        self.commands = 0
+        self.urgent = 0
+
+    def _sent(self, call: str) -> None:
+        sleep(self.send_time)
+        self.commands += 1
+        if SEND_PRIORITY[call] == 0:
+            self.urgent += 1
+
+    def mix(self, channel, value, kind) -> None:
+        self._sent("mix")
+        if kind == "f":
+            self.config.update_fx(str(channel), "mix", str(value))
+        else:
+            self.config.update_channel(str(channel), "mix", str(value))
+
+    def mute(self, channel, value, kind) -> None:
+        self._sent("mute")
+        if kind == "f":
+            self.config.update_fx(str(channel), "mute", str(value))
+        else:
+            self.config.update_channel(str(channel), "mute", str(value))
+
+    def fx(self, channel, value, kind, fx) -> None:
+        self._sent("fx")
+        self.config.update_channel_fx(
+            str(channel), str(fx), "value", str(value)
+        )
+
+    def fx_setting(self, fx, par, value) -> None:
+        self._sent("fx_setting")
+        self.config.update_fx(str(fx), f"par{par}", str(value))
+
+    def master(self, value) -> None:
+        self._sent("master")
+        self.config.update_master(str(value))
+
+    def tempo(self, bpm) -> None:
+        self._sent("tempo")
+        self.config.update_bpm(str(bpm))
+
+
+def _console(config: Config, variant: int) -> None:
+    """ Fill config like a full mixer state dump. Every
+        SCENE_CHANGE_EVERY-th value depends on variant
+    """
+    count = 0
+
+    def value(base: float) -> str:
+        nonlocal count
+        count += 1
+        if count % SCENE_CHANGE_EVERY == 0:
+            base = (base + .3 * variant) % 1
+        return str(round(base, 4))
+
+    config.update_master(value(.8))
+    config.update_bpm(str(120 + 8 * variant))
+    for fx, pars in {0: 5, 1: 4, 2: 3, 3: 5}.items():
+        config.update_fx(str(fx), "mix", value(.5))
+        config.update_fx(str(fx), "mute", str(variant % 2 * fx % 2))
+        for par in range(1, pars + 1):
+            config.update_fx(str(fx), f"par{par}", value(par / 10))
+    for channel in range(SCENE_CHANNELS):
+        channel_id = str(channel)
+        config.update_channel(channel_id, "mix", value(channel / 20))
+        config.update_channel(channel_id, "gain", value(.4))
+        config.update_channel(
+            channel_id, "mute", str(int(channel % 7 == variant))
+        )
+        config.update_channel(channel_id, "solo", "0")
+        for fx in range(4):
+            config.update_channel_fx(
+                channel_id, str(fx), "value", value(fx / 8)
+            )
+
+
+def run_scene_benchmark(
+    rounds: int = SCENE_ROUNDS,
+    send_time: float = SCENE_SEND_TIME
+) -> dict:
+    """ Switch between two full console scenes rounds times against a
+        mixer which takes send_time per command.
+        "all" sends every value of the scene, "diff" only the values
+        which differ from Config. Both go through the SendScheduler, so
+        master and mutes are sent first.
+        Returns scene size, commands sent, press to master and mutes on
+        the mixer, press to the last command, the bound of commands times
+        send_time and whether Config ended up with every recalled scene.
+    """
+    config = Config("SceneBenchmark")
+    config.logger.disabled = True
+    scenes = []
+    for variant in range(2):
+        _console(config, variant)
+        scenes.append(config.create_scene(str(variant)))
+    compiled = [compile_scene(scene) for scene in scenes]
+    results = {}
+    for name in ["all", "diff"]:
+        mixer = _SceneMixer(config, send_time)
+        scheduler = SendScheduler(mixer)
+        scheduler.start()
+        urgent = []
+        done = []
+        bound = []
+        consistent = True
+        for step in range(2 * rounds):
+            commands = compiled[step % 2]
+            if name == "all":
+                calls = [(call, args) for _, _, call, args in commands]
+            else:
+                calls = config.scene_diff(commands)
+            wanted = mixer.commands + len(calls)
+            wanted_urgent = mixer.urgent + sum(
+                SEND_PRIORITY[call] == 0 for call, _ in calls
+            )
+            pressed = monotonic()
+            scheduler.send_all(calls)
+            while mixer.urgent < wanted_urgent:
+                sleep(.0005)
+            urgent.append(monotonic() - pressed)
+            while mixer.commands < wanted:
+                sleep(.0005)
+            done.append(monotonic() - pressed)
+            bound.append(len(calls) * send_time)
+            consistent = consistent and not config.scene_diff(commands)
+        scheduler.terminate()
+        results[name] = {
+            "values": len(scenes[0]),
+            "bytes": len(dumps(scenes[0], separators=(",", ":"))),
+            "recalls": len(done),
+            "commands": mixer.commands,
+            "urgent_ms": 1000 * max(urgent),
+            "avg_ms": 1000 * sum(done) / len(done),
+            "max_ms": 1000 * max(done),
+            "bound_ms": 1000 * max(bound),
+            "consistent": consistent
+        }
+    return results
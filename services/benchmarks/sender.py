@@ -0,0 +1,160 @@
+from time import sleep, monotonic, perf_counter_ns
+from threading import Timer
+from queue import Queue
+from services.config import Config, ECHO_TTL
+from services.sender import SendScheduler
+from services.echo import EchoFilter, sent_message
+from services.threads.update_config import UpdateConfigThread
+
+STORM_DURATION = 2
+# Time a single command takes on a congested Wi-Fi link
+STORM_SEND_TIME = .005
+# Round trip of a command to the mixer and back on a congested stage network
+FEEDBACK_DELAY = .12
+
+
+class _SlowSender:
+    """ Stands in for MixerSender. Every command blocks for send_time """
+    def __init__(self, send_time: float) -> None:
+        self.send_time = send_time
+        self.commands = 0
+
+    def _send(self, *args) -> None:
+        sleep(self.send_time)
+        self.commands += 1
+
+    mix = master = mute = fx = fx_setting = tempo = _send
+
+
+def run_storm_benchmark(
+    duration: float = STORM_DURATION,
+    send_time: float = STORM_SEND_TIME
+) -> dict:
+    """ All APC and MIDIMix fx faders and two mix faders move every
+        millisecond while master and a mute are pressed ten times per second.
+        Returns the scheduler stats with latency per priority class and
+        the average time a MIDI callback spends enqueueing.
+    """
+    sender = _SlowSender(send_time)
+    scheduler = SendScheduler(sender)
+    scheduler.start()
+    enqueued = 0
+    enqueue_time = 0
+    tick = 0
+    end = monotonic() + duration
+    while monotonic() < end:
+        value = (tick % 128) / 127
+        start = perf_counter_ns()
+        for par in range(1, 6):
+            scheduler.fx_setting(0, par, value)
+            scheduler.fx_setting(3, par, value)
+        for par in range(1, 5):
+            scheduler.fx_setting(1, par, value)
+        for par in range(1, 4):
+            scheduler.fx_setting(2, par, value)
+        scheduler.mix(0, value, "i")
+        scheduler.mix(1, value, "i")
+        enqueued += 19
+        if tick % 100 == 0:
+            scheduler.master(value)
+            scheduler.mute(0, tick // 100 % 2, "i")
+            enqueued += 2
+        enqueue_time += perf_counter_ns() - start
+        tick += 1
+        sleep(.001)
+    scheduler.terminate()
+    result = scheduler.stats()
+    result["enqueued"] = enqueued
+    result["enqueue_us"] = enqueue_time / enqueued / 1000
+    return result
+
+
+class _EchoMixer:
+    """ Stands in for MixerSender and MixerListener. Every command is
+        echoed into the update queue after delay seconds, except every
+        lose_every-th one which never reaches the mixer
+    """
+    def __init__(self, update_queue: Queue, delay: float, lose_every: int):
+        self.update_queue = update_queue
+        self.delay = delay
+        self.lose_every = lose_every
+        self.commands = 0
+        self.state = {}
+
+    def mix(self, *args) -> None:
+        self.commands += 1
+        if self.commands % self.lose_every == 0:
+            return None
+        msg = sent_message("mix", args)
+        self.state[msg["channel"]] = msg["value"]
+        Timer(self.delay, self.update_queue.put, [msg]).start()
+
+
+class _Recorder:
+    """ Stands in for the ThreadController and remembers when every
+        channel 0 value was shown first
+    """
+    def __init__(self, config: Config) -> None:
+        self.config = config
+        self.shown = {}
+
+    def notify_update(self, key: str, data: dict = {}) -> None:
+        if key == "channel":
+            value = float(self.config.get_channel_value("0", "mix"))
+            self.shown.setdefault(value, monotonic())
+
+
+def run_feedback_benchmark(
+    changes: int = 40,
+    interval: float = .05,
+    delay: float = FEEDBACK_DELAY,
+    lose_every: int = 10
+) -> dict:
+    """ Press the APC grid for channel 0 every interval seconds with a
+        mixer that answers after delay seconds and loses some commands.
+        Compares the time until a press is shown when every echo is
+        rendered and with local values and checks that Config ends with
+        the mixer's value.
+    """
+    results = {}
+    for name, optimistic in [("echo", False), ("local", True)]:
+        update_queue = Queue()
+        config = Config()
+        recorder = _Recorder(config)
+        echo_filter = EchoFilter() if optimistic else None
+        mixer = _EchoMixer(update_queue, delay, lose_every)
+        scheduler = SendScheduler(
+            mixer, echo_filter=echo_filter,
+            update_queue=update_queue if optimistic else None
+        )
+        update_thread = UpdateConfigThread(
+            update_queue, config, parent=recorder, echo_filter=echo_filter
+        )
+        # State dump of the mixer on connect
+        update_queue.put(sent_message("mix", (0, 0, "i")))
+        update_thread.start()
+        scheduler.start()
+        sleep(.3)
+        pressed = {}
+        for step in range(1, changes + 1):
+            pressed[step / 100] = monotonic()
+            scheduler.mix(0, step / 100, "i")
+            sleep(interval)
+        sleep(delay + ECHO_TTL + .3)
+        scheduler.terminate()
+        update_thread.terminate()
+        latency = [
+            recorder.shown[value] - pressed[value]
+            for value in pressed if value in recorder.shown
+        ]
+        results[name] = {
+            "pressed": len(pressed),
+            "shown": len(latency),
+            "avg_ms": 1000 * sum(latency) / len(latency) if latency else 0,
+            "max_ms": 1000 * max(latency) if latency else 0,
+            "rolled_back": update_thread.rolled_back,
+            "consistent": (
+                config.get_channel_value("0", "mix") == mixer.state["0"]
+            )
+        }
+    return results
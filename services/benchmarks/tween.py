@@ -0,0 +1,167 @@
+from time import sleep, monotonic
+from threading import Thread, Event
+from services.config import Config, TWEEN_RATE
+from services.presets import compile_scene
+from services.sender import SendScheduler, command_key
+from services.tween import TweenThread
+from services.benchmarks.load import keep_busy
+
+TWEEN_CHANNELS = 16
+TWEEN_DURATION = 2
+# Ticks have to be less than a quarter period late on average and less than
+# half a period late or off the period each, idle and busy
+TWEEN_LATE_AVG = .25
+TWEEN_LATE_MAX = .5
+
+
+class _Recorder:
+    """ Stands in for the SendScheduler and remembers every tick """
+    def __init__(self) -> None:
+        self.ticks = []
+        self.values = {}
+
+    def send_all(self, calls: list, automated: bool = False) -> None:
+        self.ticks.append(monotonic())
+        for call, args in calls:
+            # Only master, mix and mutes move in this benchmark
+            self.values[command_key(call, args)] = (
+                args[0] if call == "master" else args[1]
+            )
+
+
+class _MasterSender:
+    """ Stands in for MixerSender, remembers every master value """
+    def __init__(self) -> None:
+        self.values = []
+
+    def master(self, value) -> None:
+        self.values.append(value)
+
+
+def _sleep_ticks(duration: float, rate: int) -> float:
+    """ Ticks by sleeping one period after the work of every tick.
+        Returns how far the last tick is behind its time
+    """
+    period = 1 / rate
+    start = monotonic()
+    ticks = round(duration * rate)
+    for _ in range(ticks):
+        sum(range(2000))
+        sleep(period)
+    return monotonic() - start - ticks * period
+
+
+def _fade(load: bool, duration: float, rate: int) -> dict:
+    """ Fade every channel and master down on one thread """
+    config = Config("TweenBenchmark")
+    config.logger.disabled = True
+    scene = {"m.mix": 0.0}
+    for channel in range(TWEEN_CHANNELS):
+        config.update_channel(str(channel), "mix", "0.8")
+        scene[f"i.{channel}.mix"] = 0.0
+    config.update_master("0.8")
+    recorder = _Recorder()
+    tweens = TweenThread(recorder, config, rate)
+    stop = Event()
+    busy = Thread(target=keep_busy, args=(stop,))
+    if load:
+        busy.start()
+    tweens.start()
+    moving = tweens.morph(compile_scene(scene), duration, "linear")
+    while tweens.tweens:
+        sleep(.01)
+    stop.set()
+    if load:
+        busy.join()
+    tweens.terminate()
+    period = 1 / rate
+    intervals = [
+        second - first
+        for first, second in zip(recorder.ticks, recorder.ticks[1:])
+    ]
+    jitter = max(abs(interval - period) for interval in intervals)
+    result = tweens.stats()
+    result.update({
+        "moving": moving,
+        "drift_ms": 1000 * (
+            recorder.ticks[-1] - recorder.ticks[0]
+            - (len(recorder.ticks) - 1 + tweens.skipped) * period
+        ),
+        "jitter_ms": 1000 * jitter,
+        "min_interval_ms": 1000 * min(intervals),
+        "on_time": (
+            result["late_avg_ms"] < 1000 * TWEEN_LATE_AVG * period
+            and result["late_max_ms"] < 1000 * TWEEN_LATE_MAX * period
+            and jitter < TWEEN_LATE_MAX * period
+        ),
+        "on_target": (
+            len(recorder.values) == moving
+            and all(end == 0 for end in recorder.values.values())
+        )
+    })
+    return result
+
+
+def _mutes(rate: int) -> bool:
+    """ Scene switching four mutes on and two off. Touching the mute of
+        channel 0 stops only its own switch
+    """
+    config = Config("TweenBenchmark")
+    config.logger.disabled = True
+    scene = {}
+    for channel in range(6):
+        config.update_channel(str(channel), "mute", str(int(channel > 3)))
+        scene[f"i.{channel}.mute"] = float(channel <= 3)
+    recorder = _Recorder()
+    tweens = TweenThread(recorder, config, rate)
+    tweens.start()
+    moving = tweens.morph(compile_scene(scene), .5)
+    tweens.cancel([command_key("mute", (0, 1, "i"))])
+    while tweens.tweens:
+        sleep(.01)
+    tweens.terminate()
+    return moving == 6 and tweens.cancelled == 1 and recorder.values == {
+        ("mute", 1, "i"): 1, ("mute", 2, "i"): 1, ("mute", 3, "i"): 1,
+        ("mute", 4, "i"): 0, ("mute", 5, "i"): 0
+    }
+
+
+def _touch(rate: int) -> bool:
+    """ Master fade which is stopped by moving master by hand """
+    config = Config("TweenBenchmark")
+    config.logger.disabled = True
+    config.update_master("1")
+    sender = _MasterSender()
+    scheduler = SendScheduler(sender)
+    tweens = TweenThread(scheduler, config, rate)
+    scheduler.touch = tweens.cancel
+    scheduler.start()
+    tweens.start()
+    tweens.morph(compile_scene({"m.mix": 0.0}), 1)
+    sleep(.3)
+    scheduler.master(.9)
+    sleep(1)
+    tweens.terminate()
+    scheduler.terminate()
+    return tweens.cancelled == 1 and sender.values[-1] == .9
+
+
+def run_tween_benchmark(
+    duration: float = TWEEN_DURATION, rate: int = TWEEN_RATE
+) -> dict:
+    """ Fade 16 channels and master on one tween thread for duration
+        seconds, idle and while another Python thread is busy. Compares
+        the drift with a loop sleeping one period per tick and checks
+        that moving master by hand stops its fade and that a scene
+        switches the mutes of every channel.
+        Returns the tick statistics of both fades with whether their ticks
+        are on time, the drift of the sleep loop, the touch and the mute
+        check.
+    """
+    return {
+        "sleep_drift_ms": 1000 * _sleep_ticks(duration, rate),
+        "idle": _fade(False, duration, rate),
+        "busy": _fade(True, duration, rate),
+        "touch_stops": _touch(rate),
+        "mutes": _mutes(rate)
+    }
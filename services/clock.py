@@ -0,0 +1,353 @@
+from threading import Thread, Event, Lock
+from logging import getLogger
+from time import monotonic
+from collections import deque
+from functools import partial
+from re import match
+from mido import (
+    get_input_names, get_output_names, open_input, open_output, Message
+)
+from .config import (
+    MIDI_CONTROLLER, CLOCK_PPQN, CLOCK_WINDOW, CLOCK_ESTIMATE_EVERY,
+    CLOCK_TIMEOUT, CLOCK_HYSTERESIS, CLOCK_MAX_SPREAD, CLOCK_BPM_RANGE,
+    CLOCK_SCAN_INTERVAL, CLOCK_SPIN_TIME, Config
+)
+from .latency import Latency
+from .sender import SendScheduler
+
+
+def is_clock_port(pattern: str, name: str) -> bool:
+    """ Port name matches pattern and is no APC or MIDIMix """
+    if not match(pattern, name):
+        return False
+    return not any(
+        match(controller["discovery"], name)
+        for controller in MIDI_CONTROLLER.values()
+    )
+
+
+def estimate_bpm(ticks: deque, ppqn: int = CLOCK_PPQN) -> tuple:
+    """ Tempo of clock tick times and how much it is changing: the median
+        and relative interquartile range of the spans over half the window
+    """
+    half = len(ticks) // 2
+    spans = sorted(ticks[index + half] - ticks[index] for index in range(
+        len(ticks) - half
+    ))
+    median = spans[len(spans) // 2]
+    spread = (spans[3 * len(spans) // 4] - spans[len(spans) // 4]) / median
+    return 60 * half / (ppqn * median), spread
+
+
+class ClockEstimator:
+    """ Tempo of one MIDI clock. tick() returns the rounded BPM when it
+        changed by more than hysteresis and the clock is not changing its
+        tempo (spread above max_spread).
+    """
+    def __init__(
+        self,
+        window: int = CLOCK_WINDOW,
+        ppqn: int = CLOCK_PPQN,
+        every: int = CLOCK_ESTIMATE_EVERY,
+        timeout: float = CLOCK_TIMEOUT,
+        hysteresis: float = CLOCK_HYSTERESIS,
+        max_spread: float = CLOCK_MAX_SPREAD
+    ) -> None:
+        self.ppqn = ppqn
+        self.max_spread = max_spread
+        self.every = every
+        self.timeout = timeout
+        self.hysteresis = hysteresis
+        self.ticks = deque(maxlen=window + 1)
+        self.count = 0
+        self.bpm = None
+        self.tempo = None
+
+    def reset(self) -> None:
+        """ Clock stopped, the tempo stays until the clock ticks again """
+        self.ticks.clear()
+
+    def tick(self, now: float) -> int:
+        if self.ticks and now - self.ticks[-1] > self.timeout:
+            self.reset()
+        self.ticks.append(now)
+        self.count += 1
+        if len(self.ticks) <= self.ppqn or self.count % self.every:
+            return None
+        self.bpm, spread = estimate_bpm(self.ticks, self.ppqn)
+        if (
+            spread > self.max_spread
+            or not CLOCK_BPM_RANGE[0] <= self.bpm <= CLOCK_BPM_RANGE[1]
+        ):
+            return None
+        if (
+            self.tempo is not None
+            and abs(self.bpm - self.tempo) <= .5 + self.hysteresis
+        ):
+            return None
+        tempo = round(self.bpm)
+        if tempo == self.tempo:
+            return None
+        self.tempo = tempo
+        return tempo
+
+
+class MidiClockInput:
+    """ Follows the tempo of MIDI clock (24 ticks per quarter note) on
+        every input port matching pattern, except the APC and MIDIMix.
+        The first port ticking is followed until it stops, ports are
+        scanned every scan_interval seconds.
+    """
+    def __init__(
+        self,
+        sender: SendScheduler,
+        pattern: str = ".*",
+        scan_interval: float = CLOCK_SCAN_INTERVAL,
+        logger_name: str = "MidiClockInput"
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.sender = sender
+        self.pattern = pattern
+        self.scan_interval = scan_interval
+        self.ports = {}
+        self.estimators = {}
+        self.source = None
+        self.last_tick = None
+        self.received = 0
+        self.sent = 0
+        self.lock = Lock()
+        self.exit_flag = Event()
+        self.thread = Thread(target=self._thread, args=())
+
+    def tick(self, name: str, now: float) -> None:
+        """ Clock tick of port name at monotonic now """
+        with self.lock:
+            self.received += 1
+            if self.source != name:
+                if (
+                    self.last_tick is not None
+                    and now - self.last_tick <= CLOCK_TIMEOUT
+                ):
+                    # Another clock is followed
+                    return None
+                self.logger.warning(f"MIDI clock => following {name}")
+                self.source = name
+            self.last_tick = now
+            if name not in self.estimators:
+                self.estimators[name] = ClockEstimator()
+            tempo = self.estimators[name].tick(now)
+        if tempo is None:
+            return None
+        self.sent += 1
+        self.sender.send_all([("tempo", (tempo,))], automated=True)
+
+    def stats(self) -> dict:
+        return {
+            "source": self.source,
+            "ports": list(self.ports),
+            "ticks": self.received,
+            "tempo_sent": self.sent,
+            "bpm": (
+                round(self.estimators[self.source].bpm, 2)
+                if self.source in self.estimators
+                and self.estimators[self.source].bpm else None
+            )
+        }
+
+    def _message(self, name: str, message: Message) -> None:
+        if message.type == "clock":
+            self.tick(name, monotonic())
+        elif message.type in ["start", "stop"] and name in self.estimators:
+            with self.lock:
+                self.estimators[name].reset()
+
+    def _scan(self) -> None:
+        names = get_input_names()
+        for name in list(self.ports):
+            if name not in names:
+                self.logger.warning(f"MIDI clock => {name} gone")
+                self.ports.pop(name).close()
+        for name in names:
+            if name in self.ports or not is_clock_port(self.pattern, name):
+                continue
+            try:
+                self.ports[name] = open_input(
+                    name, callback=partial(self._message, name)
+                )
+            except OSError as error:
+                self.logger.error(f"MIDI clock => {name} => {error}")
+                continue
+            self.logger.info(f"MIDI clock => listening on {name}")
+
+    def _thread(self) -> None:
+        while not self.exit_flag.is_set():
+            self._scan()
+            self.exit_flag.wait(self.scan_interval)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def terminate(self) -> None:
+        self.exit_flag.set()
+        self.join()
+        for port in self.ports.values():
+            port.close()
+        self.logger.info(f"MIDI clock => {self.stats()}")
+
+
+class MidiClockOutput:
+    """ Sends MIDI clock (24 ticks per quarter note) of the mixer tempo
+        (Config.get_bpm()) to the first output port matching pattern,
+        except the APC and MIDIMix. Ticks are due one period after the
+        last on the monotonic clock, missed ticks are sent late for up to
+        one beat. A port handed in is used as it is, e.g. a loopback.
+    """
+    def __init__(
+        self,
+        config: Config,
+        pattern: str,
+        port=None,
+        ppqn: int = CLOCK_PPQN,
+        spin_time: float = CLOCK_SPIN_TIME,
+        scan_interval: float = CLOCK_SCAN_INTERVAL,
+        logger_name: str = "MidiClockOutput"
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.config = config
+        self.pattern = pattern
+        self.ppqn = ppqn
+        self.spin_time = spin_time
+        self.scan_interval = scan_interval
+        self.port = None
+        self.port_name = None
+        self.rtmidi = None
+        self.message = Message("clock")
+        self.encoded = self.message.bytes()
+        self.bpm_text = None
+        self.period = None
+        self.last_check = 0
+        self.ticks = 0
+        self.caught_up = 0
+        self.skipped = 0
+        self.late = Latency()
+        self.exit_flag = Event()
+        self.thread = Thread(target=self._thread, args=())
+        self.handed_in = port is not None
+        if port:
+            self._use(port, pattern)
+
+    def stats(self) -> dict:
+        late = self.late.stats(3)
+        return {
+            "port": self.port_name,
+            "bpm": self.bpm_text,
+            "ticks": self.ticks,
+            "caught_up": self.caught_up,
+            "skipped": self.skipped,
+            "late_avg_ms": late["avg_ms"],
+            "late_max_ms": late["max_ms"]
+        }
+
+    def _use(self, port, name: str) -> None:
+        self.port = port
+        self.port_name = name
+        # mido keeps the rtmidi port private
+        self.rtmidi = getattr(port, "_rt", None)
+
+    def _open(self) -> None:
+        for name in get_output_names():
+            if not is_clock_port(self.pattern, name):
+                continue
+            try:
+                self._use(open_output(name), name)
+            except OSError as error:
+                self.logger.error(f"MIDI clock => {name} => {error}")
+                return None
+            self.logger.info(f"MIDI clock => sending to {name}")
+            return None
+
+    def _check(self, now: float) -> None:
+        """ Close the port once it is gone, right after a tick """
+        if self.handed_in or now - self.last_check < self.scan_interval:
+            return None
+        self.last_check = now
+        if self.port_name in get_output_names():
+            return None
+        self.logger.warning(f"MIDI clock => {self.port_name} gone")
+        self.port.close()
+        self.port = None
+
+    def _update_period(self) -> None:
+        """ Period of the Config tempo, parsed only when it changed """
+        bpm_text = self.config.get_bpm()
+        if bpm_text == self.bpm_text:
+            return None
+        self.bpm_text = bpm_text
+        try:
+            bpm = float(bpm_text)
+        except (TypeError, ValueError):
+            bpm = 0
+        self.period = 60 / (bpm * self.ppqn) if bpm > 0 else None
+
+    def _send(self) -> None:
+        if self.rtmidi:
+            self.rtmidi.send_message(self.encoded)
+        else:
+            self.port.send(self.message)
+
+    def _thread(self) -> None:
+        due = None
+        while not self.exit_flag.is_set():
+            if self.port is None:
+                # Ticks while there was no port are not sent
+                due = None
+                self._open()
+                if self.port is None:
+                    self.exit_flag.wait(self.scan_interval)
+                    continue
+            self._update_period()
+            if self.period is None:
+                due = None
+                self.exit_flag.wait(.1)
+                continue
+            now = monotonic()
+            if due is None:
+                due = now
+            elif due - now > self.spin_time:
+                self.exit_flag.wait(due - now - self.spin_time)
+                continue
+            while now < due:
+                now = monotonic()
+            self._send()
+            late = now - due
+            self.ticks += 1
+            self.late.add(late)
+            beat = self.ppqn * self.period
+            if late > beat:
+                # Held up for more than a beat, whole beats are left out
+                beats = int(late / beat)
+                self.skipped += beats * self.ppqn
+                due += beats * beat
+            if now - due > self.period:
+                # Sent after the next one was due, that one follows at once
+                self.caught_up += 1
+            due += self.period
+            self._check(now)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def terminate(self) -> None:
+        self.exit_flag.set()
+        self.join()
+        if self.port:
+            self.port.close()
+        self.logger.info(f"MIDI clock out => {self.stats()}")
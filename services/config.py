@@ -18,8 +18,79 @@ MIDI_CONTROLLER = {
     }
 }
 
+# Maximum sends per second of a single parameter to the mixer.
+# Moves in between are coalesced to the newest value
+SEND_RATES = {
+    "mix": 25,
+    "master": 25,
+    "fx": 25,
+    "fx_setting": 15,
+    "tempo": 10
+}
+
+# Send order of commands to the mixer, 0 goes first.
+# 0: master and mutes, 1: mix faders, 2: fx parameters, fx sends and tempo
+SEND_PRIORITY = {
+    "master": 0,
+    "mute": 0,
+    "mix": 1,
+    "fx": 2,
+    "fx_setting": 2,
+    "tempo": 2
+}
+
+# Seconds a sent value waits for its echo from the mixer and the
+# difference up to which an echoed value counts as the sent one
+ECHO_TTL = 1.0
+ECHO_TOLERANCE = 0.0005
+
+# Faders and knobs: steps a value has to leave the last sent one by when
+# it starts moving or turns around, seconds after which a control counts
+# as resting and every how many suppressed values a control is reported
+JITTER_DEAD_BAND = 1
+JITTER_SETTLE_TIME = .25
+JITTER_REPORT_EVERY = 100
+
 MASTER_LOCK = [(4, 0), (5, 0), (6, 0), (6, 7)]
 PRESET_FILE = path.expanduser("~/.config/midi2soundcraft_presets.json")
+MAPPING_FILE = path.expanduser("~/.config/midi2soundcraft_mapping.json")
+PRESET_DB_FILE = path.expanduser("~/.config/midi2soundcraft_presets.sqlite")
+# Seconds changes wait before written, tries of a failed write
+PRESET_WRITE_DELAY = .2
+PRESET_WRITE_RETRIES = 5
+# Seconds to wait for the database lock, which scenes share
+PRESET_DB_TIMEOUT = 2
+# Presets kept in memory
+PRESET_CACHE_SIZE = 64
+# Slots of a preset bank (8 mute and 8 rec arm buttons) and number of banks
+PRESET_BANK_SIZE = 16
+PRESET_BANKS = 32
+# Ticks per second of running fades and morphs, and their default curve
+TWEEN_RATE = 25
+TWEEN_CURVE = "ease"
+# Seconds recorded actions wait before appended, seconds before an event
+# the player waits actively
+AUTOMATION_WRITE_DELAY = .5
+AUTOMATION_SPIN_TIME = .002
+# Switch interval of Python from AUTOMATION_SWITCH_LEAD seconds before an
+# event until it is sent (default .005)
+AUTOMATION_SWITCH_INTERVAL = .0005
+AUTOMATION_SWITCH_LEAD = .02
+# MIDI clock: ticks per quarter note, ticks a tempo is estimated over,
+# ticks between estimates and seconds without a tick until it stops
+CLOCK_PPQN = 24
+CLOCK_WINDOW = 48
+CLOCK_ESTIMATE_EVERY = 6
+CLOCK_TIMEOUT = .5
+# BPM past the middle of two tempos before the tempo changes, tick spread
+# above which the clock counts as changing its tempo
+CLOCK_HYSTERESIS = .2
+CLOCK_MAX_SPREAD = .01
+# Tempos the Ui16 accepts and seconds between two scans for clock ports
+CLOCK_BPM_RANGE = (20, 300)
+CLOCK_SCAN_INTERVAL = 2
+# Seconds before a clock tick going out the generator waits actively
+CLOCK_SPIN_TIME = .002
 
 
 def load_presets() -> dict:
@@ -47,8 +118,16 @@ def remove_preset(preset_id) -> None:
 
 
 class Config:
-    def __init__(self, logger_name: str = "ConfigObject") -> None:
+    def __init__(
+        self,
+        logger_name: str = "ConfigObject",
+        # PresetStores, cant specify because it would be circular import
+        presets: None = None,
+        scenes: None = None
+    ) -> None:
         self.logger = getLogger(logger_name)
+        self.presets = presets
+        self.scenes = scenes
         self.master = None
         self.bpm = None
         self.channels = ChannelCollection()
@@ -117,7 +196,76 @@ class Config:
         self.save_preset(button, preset)
         return preset
 
+    def preset_diff(self, commands: list) -> list:
+        """ (fx, par, value) commands of a preset which differ from the
+            current fx values. Within ECHO_TOLERANCE a value is unchanged
+        """
+        changed = []
+        for fx, par, value in commands:
+            current = self.fx.get_value(str(fx), f"par{par}")
+            if (
+                current is None
+                or abs(float(current) - value) > ECHO_TOLERANCE
+            ):
+                changed.append((fx, par, value))
+        return changed
+
+    def create_scene(self, scene_id) -> dict:
+        """ Every value Config holds keyed by its Ui16 path, e.g. i.3.mix
+            or i.3.fx.1 for the fx 1 send of channel 3
+        """
+        values = [("m.mix", self.master), ("f.0.bpm", self.bpm)]
+        for fx in self.fx.fx:
+            for key, value in fx.functions.items():
+                values.append((f"f.{fx.id}.{key}", value))
+        for channel in self.channels.channels:
+            for key, value in channel.functions.items():
+                values.append((f"i.{channel.id}.{key}", value))
+            for fx in channel.fx.fx:
+                values.append(
+                    (f"i.{channel.id}.fx.{fx.id}", fx.get_value("value"))
+                )
+        scene = {}
+        for address, value in values:
+            try:
+                scene[address] = float(value)
+            except (TypeError, ValueError):
+                # Not received from the mixer yet
+                continue
+        if self.scenes:
+            self.scenes.save(scene_id, scene)
+        return scene
+
+    def scene_value(self, target: tuple) -> str:
+        """ Current value of a split scene address """
+        if target[0] == "m":
+            return self.master
+        if target[-1] == "bpm":
+            return self.bpm
+        if target[0] == "f":
+            return self.get_fx_value(target[1], target[2])
+        if len(target) == 4:
+            return self.get_channel_fx_value(target[1], target[3], "value")
+        return self.get_channel_value(target[1], target[2])
+
+    def scene_diff(self, commands: list) -> list:
+        """ (call, args) of the compiled scene commands which differ from
+            the current values. Within ECHO_TOLERANCE a value is unchanged
+        """
+        changed = []
+        for target, value, call, args in commands:
+            current = self.scene_value(target)
+            if (
+                current is None
+                or abs(float(current) - value) > ECHO_TOLERANCE
+            ):
+                changed.append((call, args))
+        return changed
+
     def save_preset(self, button, preset) -> None:
+        if self.presets:
+            self.presets.save(button, preset)
+            return None
         config = {}
         if path.exists(PRESET_FILE):
             # Read existing config
@@ -0,0 +1,361 @@
+from logging import getLogger
+from os import path
+from pathlib import Path
+from json import dumps, loads
+from .config import MAPPING_FILE, PRESET_BANK_SIZE
+from .formatter import ConfigVars
+
+# Pages of the APC mix view, the page is added to the grid column
+APC_PAGES = 5
+# Actions of the APC lower buttons while shift is held
+SHIFT_ACTIONS = ["fine_up", "fine_down", "page_down", "page_up"]
+# Response curves by name, a curve can also be a list of breakpoints
+CURVES = ["linear", "db"]
+# Compiles the curves of a mapping
+_VARS = ConfigVars()
+
+# Layout of the mapping file. It is written on first start and can be
+# edited while running, changes are picked up without reconnecting.
+# Faders sending fx_setting, mix or master and grid entries take an
+# optional "curve": "linear", "db" (dB-linear) or breakpoints
+# [[position 0 - 1, value 0 - 1], ...] from position 0 to 1.
+# A fader sending mix drives channel "first" + its index in "faders".
+DEFAULT_MAPPING = {
+    "midimix": {
+        # knobs[channel][fx] = [x, y], the bank button adds
+        # len(knobs) to the channel
+        "knobs": [
+            [[0, 2], [1, 2], [2, 2], [3, 2]],
+            [[4, 2], [5, 2], [6, 2], [7, 2]],
+            [[0, 1], [1, 1], [2, 1], [3, 1]],
+            [[4, 1], [5, 1], [6, 1], [7, 1]],
+            [[0, 0], [1, 0], [2, 0], [3, 0]],
+            [[4, 0], [5, 0], [6, 0], [7, 0]]
+        ],
+        "knob_banks": 2,
+        # fx_setting: the n-th fader drives parameter n + 1 of fx
+        "faders": [
+            {"faders": [0, 1, 2], "send": "fx_setting", "fx": 2},
+            {"faders": [3, 4, 5, 6, 7], "send": "fx_setting", "fx": 3},
+            {"faders": [8], "send": "tempo", "min": 60, "max": 187}
+        ],
+        # Slot of the first mute and rec arm button in a preset bank
+        "presets": {"mute": 0, "recarm": 8}
+    },
+    "apc": {
+        "faders": [
+            {"faders": [0, 1, 2, 3, 4], "send": "fx_setting", "fx": 0},
+            {"faders": [5, 6, 7, 8], "send": "fx_setting", "fx": 1}
+        ],
+        # Pads send the value of their row to the channel of their column.
+        # paged adds the current page to the channel
+        "grid": [
+            {
+                "view": 0, "columns": [0, 1, 2, 3, 4, 5, 6, 7],
+                "send": "mix", "kind": "i", "paged": True
+            },
+            {"view": 7, "columns": [0, 1, 2, 3], "send": "mix", "kind": "f"},
+            {"view": 7, "columns": [7], "send": "master"}
+        ],
+        # Lower buttons while shift is held
+        "shift": {
+            "4": "fine_up", "5": "fine_down", "6": "page_down", "7": "page_up"
+        },
+        "fine_step": 0.002
+    }
+}
+
+
+def _check(condition: bool, message: str) -> None:
+    if not condition:
+        raise ValueError(message)
+
+
+def _ids(ids, last: int, where: str) -> list:
+    _check(
+        isinstance(ids, list) and ids
+        and all(isinstance(i, int) and 0 <= i <= last for i in ids),
+        f"{where} must be a list of ids from 0 to {last}"
+    )
+    return ids
+
+
+def _range_values(minimum, maximum, where: str) -> list:
+    """ MIDI value => minimum to maximum, rounded for tempo """
+    _check(
+        isinstance(minimum, int) and isinstance(maximum, int)
+        and minimum < maximum,
+        f"{where} needs integer min < max"
+    )
+    return [
+        round(minimum + value * (maximum - minimum) / 127)
+        for value in range(128)
+    ]
+
+
+def _curve(entry: dict, default: str, where: str, grid: bool = False):
+    """ Curve of an entry compiled into a table of all 128 values (8 for
+        the grid), default converter without a curve
+    """
+    curve = entry.get("curve")
+    if curve is None:
+        return default
+    if curve not in CURVES:
+        _check(
+            isinstance(curve, list) and len(curve) >= 2
+            and all(
+                isinstance(point, list) and len(point) == 2
+                and all(
+                    isinstance(number, (int, float)) and 0 <= number <= 1
+                    for number in point
+                )
+                for point in curve
+            )
+            and curve[0][0] == 0 and curve[-1][0] == 1
+            and all(
+                first[0] < second[0]
+                for first, second in zip(curve, curve[1:])
+            ),
+            f"{where}.curve must be {' or '.join(CURVES)} or breakpoints"
+            " [[position, value], ...] with values from 0 to 1 and"
+            " positions rising from 0 to 1"
+        )
+    return _VARS.curve_table(curve, grid)
+
+
+def _faders(entries, last: int, where: str) -> dict:
+    """ ("fader", id) => (send, args before, args after, converter) """
+    controls = {}
+    _check(isinstance(entries, list), f"{where}.faders must be a list")
+    for number, entry in enumerate(entries):
+        at = f"{where}.faders[{number}]"
+        _check(isinstance(entry, dict), f"{at} must be an object")
+        send = entry.get("send")
+        for index, fader_id in enumerate(
+            _ids(entry.get("faders"), last, f"{at}.faders")
+        ):
+            _check(
+                ("fader", fader_id) not in controls,
+                f"{at}: fader {fader_id} is mapped twice"
+            )
+            if send == "fx_setting":
+                fx = entry.get("fx")
+                _check(fx in range(4), f"{at}.fx must be 0 to 3")
+                controls[("fader", fader_id)] = (
+                    "fx_setting", (fx, index + 1), (),
+                    _curve(entry, "midi_to_soundcraft", at)
+                )
+            elif send == "mix":
+                first = entry.get("first", 0)
+                kind = entry.get("kind", "i")
+                _check(
+                    isinstance(first, int) and first >= 0,
+                    f"{at}.first must be a channel"
+                )
+                _check(kind in ["i", "f"], f"{at}.kind must be i or f")
+                controls[("fader", fader_id)] = (
+                    "mix", (first + index,), (kind,),
+                    _curve(entry, "midi_to_soundcraft", at)
+                )
+            elif send == "master":
+                controls[("fader", fader_id)] = (
+                    "master", (), (), _curve(entry, "midi_to_soundcraft", at)
+                )
+            elif send == "tempo":
+                controls[("fader", fader_id)] = (
+                    "tempo", (), (),
+                    _range_values(entry.get("min"), entry.get("max"), at)
+                )
+            else:
+                raise ValueError(
+                    f"{at}.send must be fx_setting, mix, master or tempo"
+                )
+    return controls
+
+
+def _midimix(mapping: dict) -> dict:
+    knobs = mapping.get("knobs")
+    banks = mapping.get("knob_banks")
+    _check(
+        isinstance(knobs, list) and knobs,
+        "midimix.knobs must be a list of channels"
+    )
+    _check(
+        isinstance(banks, int) and banks > 0,
+        "midimix.knob_banks must be at least 1"
+    )
+    controls = {}
+    for channel, fxs in enumerate(knobs):
+        _check(
+            isinstance(fxs, list) and len(fxs) <= 4,
+            f"midimix.knobs[{channel}] must list up to 4 knobs"
+        )
+        for fx, knob in enumerate(fxs):
+            _check(
+                isinstance(knob, list) and len(knob) == 2
+                and knob[0] in range(8) and knob[1] in range(3),
+                f"midimix.knobs[{channel}][{fx}] must be [x 0-7, y 0-2]"
+            )
+            for bank in range(banks):
+                key = ("knob", knob[0], knob[1], bank)
+                _check(key not in controls, f"midimix knob {knob} twice")
+                controls[key] = (
+                    "fx", (channel + bank * len(knobs),), ("i", fx),
+                    "midi_to_soundcraft"
+                )
+    for (kind, fader_id), target in _faders(
+        mapping.get("faders"), 8, "midimix"
+    ).items():
+        for bank in range(banks):
+            controls[(kind, fader_id, bank)] = target
+    presets = mapping.get("presets")
+    _check(
+        isinstance(presets, dict)
+        and sorted(presets) == ["mute", "recarm"]
+        and all(
+            isinstance(first, int) and 0 <= first <= PRESET_BANK_SIZE - 8
+            for first in presets.values()
+        )
+        and abs(presets["mute"] - presets["recarm"]) >= 8,
+        "midimix.presets needs mute and recarm ids 8 apart"
+        f" from 0 to {PRESET_BANK_SIZE - 8}"
+    )
+    return {"controls": controls, "presets": dict(presets)}
+
+
+def _apc(mapping: dict) -> dict:
+    controls = _faders(mapping.get("faders"), 8, "apc")
+    grid = mapping.get("grid")
+    _check(isinstance(grid, list), "apc.grid must be a list")
+    for number, entry in enumerate(grid):
+        at = f"apc.grid[{number}]"
+        _check(isinstance(entry, dict), f"{at} must be an object")
+        view = entry.get("view")
+        send = entry.get("send")
+        _check(view in [0, 7], f"{at}.view must be 0 or 7")
+        _check(send in ["mix", "master"], f"{at}.send must be mix or master")
+        kind = entry.get("kind", "i")
+        _check(kind in ["i", "f"], f"{at}.kind must be i or f")
+        paged = bool(entry.get("paged"))
+        pages = APC_PAGES if view == 0 else 1
+        convert = _curve(entry, "midi_grid_to_soundcraft", at, grid=True)
+        for column in _ids(entry.get("columns"), 7, f"{at}.columns"):
+            for y in range(8):
+                for page in range(pages):
+                    key = ("grid", view, column, y, page)
+                    _check(
+                        key not in controls,
+                        f"{at}: column {column} is mapped twice"
+                    )
+                    controls[key] = (
+                        ("mix", (column + page * paged,), (kind,), convert)
+                        if send == "mix" else
+                        ("master", (), (), convert)
+                    )
+    shift = mapping.get("shift")
+    _check(
+        isinstance(shift, dict)
+        and all(
+            button.isdigit() and int(button) in range(8)
+            and action in SHIFT_ACTIONS
+            for button, action in shift.items()
+        ),
+        f"apc.shift maps lower buttons 0-7 to {', '.join(SHIFT_ACTIONS)}"
+    )
+    step = mapping.get("fine_step")
+    _check(
+        isinstance(step, (int, float)) and 0 < step <= 1,
+        "apc.fine_step must be above 0 and at most 1"
+    )
+    return {
+        "controls": controls,
+        "shift": {int(button): action for button, action in shift.items()},
+        "fine_step": step
+    }
+
+
+def compile_mapping(mapping: dict) -> dict:
+    """ Validate a mapping and compile it into dispatch tables.
+        Raises ValueError naming the first invalid entry
+    """
+    _check(
+        isinstance(mapping, dict)
+        and isinstance(mapping.get("midimix"), dict)
+        and isinstance(mapping.get("apc"), dict),
+        "mapping needs a midimix and an apc section"
+    )
+    return {
+        "midimix": _midimix(mapping["midimix"]),
+        "apc": _apc(mapping["apc"])
+    }
+
+
+def bind_controls(controls: dict, sender, vars: ConfigVars) -> dict:
+    """ Resolve sender methods and converters of a control table once.
+        A converter is a ConfigVars method or a table of every value
+    """
+    return {
+        key: (
+            getattr(sender, method), before, after,
+            getattr(vars, convert) if isinstance(convert, str)
+            else convert.__getitem__
+        )
+        for key, (method, before, after, convert) in controls.items()
+    }
+
+
+def dispatch_control(controls: dict, key: tuple, value: int) -> bool:
+    """ Send the value of a control. False if key is not mapped """
+    target = controls.get(key)
+    if target is None:
+        return False
+    method, before, after, convert = target
+    method(*before, convert(value), *after)
+    return True
+
+
+class ControlMapping:
+    """ Mapping file compiled into dispatch tables.
+        reload() compiles the file again once it changed. An invalid file
+        is logged and the last valid mapping stays active.
+    """
+    def __init__(
+        self,
+        mapping_file: str = MAPPING_FILE,
+        logger_name: str = "ControlMapping"
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.mapping_file = mapping_file
+        self.mtime = None
+        self.compiled = DEFAULT_TABLES
+        if not path.exists(mapping_file):
+            Path(mapping_file).touch()
+            with open(mapping_file, "w") as fp:
+                fp.write(dumps(DEFAULT_MAPPING, indent=4))
+        self.reload()
+
+    def reload(self) -> bool:
+        """ True if the file changed and was compiled """
+        try:
+            mtime = path.getmtime(self.mapping_file)
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        try:
+            with open(self.mapping_file, "r") as fp:
+                compiled = compile_mapping(loads(fp.read()))
+        except (OSError, ValueError) as error:
+            self.logger.error(
+                f"{self.mapping_file} => {error} => keeping last mapping"
+            )
+            return False
+        self.compiled = compiled
+        self.logger.warning(f"{self.mapping_file} => mapping loaded")
+        return True
+
+
+DEFAULT_TABLES = compile_mapping(DEFAULT_MAPPING)
+MIDIMIX_CONTROLS = DEFAULT_TABLES["midimix"]["controls"]
+APC_CONTROLS = DEFAULT_TABLES["apc"]["controls"]
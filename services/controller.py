@@ -2,6 +2,9 @@ from soundcraft_ui16 import MixerListener, MixerSender
 from .midi_controller import APC, Midimix, get_midi_string
 from .config import Config, MASTER_LOCK, load_presets, remove_preset
 from .formatter import ConfigVars, OutputFormatter
+from .control_map import (
+    APC_CONTROLS, MIDIMIX_CONTROLS, bind_controls, dispatch_control
+)
 from queue import Queue
 from threading import Thread, Event
 from time import sleep
@@ -12,15 +15,6 @@ from .wifi import wait_connect
 
 
 class Controller:
-    KNOB_MAPPING = [
-        [(0, 2), (1, 2), (2, 2), (3, 2)],
-        [(4, 2), (5, 2), (6, 2), (7, 2)],
-        [(0, 1), (1, 1), (2, 1), (3, 1)],
-        [(4, 1), (5, 1), (6, 1), (7, 1)],
-        [(0, 0), (1, 0), (2, 0), (3, 0)],
-        [(4, 0), (5, 0), (6, 0), (7, 0)]
-    ]
-
     def __init__(
             self,
             mixer_addr, args,
@@ -82,6 +76,10 @@ class Controller:
         self.config_presets = load_presets()
         self.vars = ConfigVars()
         self.formatter = OutputFormatter()
+        self.apc_controls = bind_controls(APC_CONTROLS, self.sender, self.vars)
+        self.midi_mix_controls = bind_controls(
+            MIDIMIX_CONTROLS, self.sender, self.vars
+        )
 
         # # APC vars
         # Some vars to display the correct
@@ -293,17 +291,9 @@ class Controller:
 
     def apc_fader_event(self, event) -> None:
         """ Event happening when Fader is moved """
-        if self.display_view == 0 and event.fader_id in list(range(5)):
-            self.sender.fx_setting(
-                0,
-                event.fader_id + 1,
-                self.vars.midi_to_soundcraft(event.value)
-            )
-        elif self.display_view == 0 and event.fader_id in list(range(5, 9)):
-            self.sender.fx_setting(
-                1,
-                (event.fader_id + 1) - 5,
-                self.vars.midi_to_soundcraft(event.value)
+        if self.display_view == 0:
+            dispatch_control(
+                self.apc_controls, ("fader", event.fader_id), event.value
             )
         elif self.display_view == 7:
             # NOTE: just enable mixers if code was correctly entered
@@ -327,36 +317,19 @@ class Controller:
         self.gui.set_shift_button(event.state)
 
     def midi_mix_knob_event(self, event) -> None:
-        current_knob = (event.x, event.y)
-        for check_set in self.KNOB_MAPPING:
-            if current_knob in check_set:
-                channel = self.KNOB_MAPPING.index(check_set)
-                break
-        channel += self.channelfxsend_index * 6
-        self.sender.fx(
-            channel,
-            self.vars.midi_to_soundcraft(event.value),
-            "i", self.KNOB_MAPPING[channel].index((event.x, event.y))
+        dispatch_control(
+            self.midi_mix_controls,
+            ("knob", event.x, event.y, self.channelfxsend_index),
+            event.value
         )
 
     def midi_mix_fader_event(self, event) -> None:
-        if event.fader_id in list(range(3)):
-            self.sender.fx_setting(
-                2,
-                event.fader_id + 1,
-                self.vars.midi_to_soundcraft(event.value)
-            )
-        elif event.fader_id in list(range(3, 8)):
-            self.sender.fx_setting(
-                3,
-                (event.fader_id + 1) - 3,
-                self.vars.midi_to_soundcraft(event.value)
-            )
-        elif event.fader_id == 8:
-            # Set the BPM - Values will be 60 to 60 + range(128)  = 187
-            self.sender.tempo(
-                60 + event.value
-            )
+        # Fader 8 sets the BPM - Values will be 60 to 187
+        dispatch_control(
+            self.midi_mix_controls,
+            ("fader", event.fader_id, self.channelfxsend_index),
+            event.value
+        )
 
     def midi_mix_mute_event(self, event) -> None:
         """ Create and load presets """
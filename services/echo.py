@@ -0,0 +1,137 @@
+from threading import Lock
+from collections import deque
+from time import monotonic
+from .config import ECHO_TTL, ECHO_TOLERANCE
+
+
+def sent_message(name: str, args: tuple) -> dict:
+    """ MixerListener message the mixer answers a MixerSender call with """
+    if name in ["mix", "mute"]:
+        return {
+            "kind": args[2] if len(args) > 2 else "i",
+            "channel": str(args[0]),
+            "function": name,
+            "value": str(args[1])
+        }
+    elif name == "master":
+        return {"kind": "m", "channel": "mix", "value": str(args[0])}
+    elif name == "fx":
+        return {
+            "kind": args[2],
+            "channel": str(args[0]),
+            "option": "fx",
+            "option_channel": str(args[3]),
+            "function": "value",
+            "value": str(args[1])
+        }
+    elif name == "fx_setting":
+        return {
+            "kind": "f",
+            "channel": str(args[0]),
+            "function": f"par{args[1]}",
+            "value": str(args[2])
+        }
+    elif name == "tempo":
+        return {
+            "kind": "f", "channel": "0", "function": "bpm",
+            "value": str(args[0])
+        }
+    return None
+
+
+def sent_key(name: str, args: tuple) -> tuple:
+    """ Parameter key and value of a MixerSender call.
+        Keys match the ones message_key() creates for MixerListener messages
+    """
+    msg = sent_message(name, args)
+    if not msg:
+        return None, None
+    return message_key(msg), msg["value"]
+
+
+def message_key(msg: dict) -> tuple:
+    """ Parameter key of a MixerListener message """
+    if msg["kind"] == "m":
+        return ("m", msg["channel"])
+    elif msg.get("function") == "bpm":
+        return ("f", "bpm")
+    elif msg.get("option") == "fx":
+        return (
+            msg["kind"], msg["channel"], "fx",
+            msg["option_channel"], msg["function"]
+        )
+    return (msg["kind"], msg.get("channel"), msg.get("function"))
+
+
+class EchoFilter:
+    """ Remembers values sent to the mixer for ttl seconds, so their echoes
+        coming back through the MixerListener can be recognised.
+    """
+    SUPERSEDED = "superseded"
+    LATEST = "latest"
+
+    def __init__(
+        self, ttl: float = ECHO_TTL, tolerance: float = ECHO_TOLERANCE
+    ) -> None:
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self.expected = {}
+        self.lock = Lock()
+        self.saved = 0
+
+    def expect(self, name: str, args: tuple) -> None:
+        """ Register a MixerSender call which was just sent """
+        key, value = sent_key(name, args)
+        if key is None:
+            return None
+        with self.lock:
+            if key not in self.expected:
+                self.expected[key] = deque()
+            self.expected[key].append((monotonic() + self.ttl, float(value)))
+
+    def match(self, msg: dict) -> str:
+        """ Check a MixerListener message against the sent values.
+            Returns SUPERSEDED for an echo of a value which was already
+            overwritten by a newer send, LATEST for the echo of the newest
+            value and None if the change did not come from us.
+        """
+        key = message_key(msg)
+        with self.lock:
+            if key not in self.expected:
+                return None
+            expected = self.expected[key]
+            now = monotonic()
+            while expected and expected[0][0] < now:
+                expected.popleft()
+            for index, (_, value) in enumerate(expected):
+                if abs(value - float(msg["value"])) <= self.tolerance:
+                    break
+            else:
+                if not expected:
+                    del self.expected[key]
+                return None
+            # Older values were echoed before or got lost on the way
+            for _ in range(index + 1):
+                expected.popleft()
+            if expected:
+                return self.SUPERSEDED
+            del self.expected[key]
+            return self.LATEST
+
+    def waiting(self, key: tuple) -> bool:
+        """ True while an echo for key is still expected """
+        with self.lock:
+            return key in self.expected
+
+    def expired(self) -> list:
+        """ Keys whose sent values all timed out without an echo """
+        now = monotonic()
+        keys = []
+        with self.lock:
+            for key, expected in list(self.expected.items()):
+                while expected and expected[0][0] < now:
+                    expected.popleft()
+                if not expected:
+                    del self.expected[key]
+                    keys.append(key)
+        return keys
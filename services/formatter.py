@@ -127,6 +127,44 @@ class ConfigVars:
             2: "magenta",
             3: "green"
         }
+        # dB => mix value along the pieces of self.mix above off
+        taper = sorted({
+            (float(value), float(db))
+            for piece in ["5", "18", "37", "50"]
+            for value, db in zip(self.mix[piece].x, self.mix[piece].y)
+        })
+        self.db_to_mix = interp1d(
+            [db for _, db in taper], [value for value, _ in taper]
+        )
+        # Range of a dB-linear fader, its lowest position is off
+        self.db_range = (-60, 10)
+
+    def curve_table(self, curve, grid: bool = False) -> list:
+        """ Compile a response curve into the soundcraft value of every
+            midi value (0 - 127) or grid row (0 - 7, the top one is 1).
+            Curves map the position (0 - 1) to the soundcraft value:
+            "linear": the position (midi_to_soundcraft and
+                      midi_grid_to_soundcraft)
+            "db":     position linear in dB over db_range
+            [[position, value], ...]: straight lines between breakpoints
+        """
+        if grid:
+            positions = [(row + 1) / 8 for row in range(8)]
+        else:
+            positions = [val / 127 for val in range(128)]
+        if curve == "linear":
+            return positions
+        if curve == "db":
+            low, high = self.db_range
+            return [
+                float(self.db_to_mix(low + position * (high - low)))
+                if position else 0.0
+                for position in positions
+            ]
+        points = interp1d(
+            [point[0] for point in curve], [point[1] for point in curve]
+        )
+        return [float(points(position)) for position in positions]
 
     def midi_to_soundcraft(self, val: float | int) -> float:
         """ Format a value given by midi to use it for soundcraft.
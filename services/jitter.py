@@ -0,0 +1,53 @@
+from logging import getLogger
+from time import monotonic
+from .config import JITTER_DEAD_BAND, JITTER_SETTLE_TIME, JITTER_REPORT_EVERY
+
+
+class JitterFilter:
+    """ Hysteresis for worn faders and knobs (MIDI values 0 to 127).
+        A control that keeps moving in one direction passes every value
+        right away. A resting control or one turning around has to leave
+        the last passed value by more than dead_band first, so flicker
+        between neighbouring values is suppressed. A control rests once it
+        passed nothing for settle_time seconds. 0 and 127 always pass.
+    """
+    def __init__(
+        self,
+        dead_band: int = JITTER_DEAD_BAND,
+        settle_time: float = JITTER_SETTLE_TIME,
+        logger_name: str = "JitterFilter"
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.dead_band = dead_band
+        self.settle_time = settle_time
+        # control => (value, direction, time) of the last passed value
+        self.last = {}
+        self.suppressed = {}
+
+    def accept(self, control, value: int) -> bool:
+        """ False if value is noise and must not be sent """
+        now = monotonic()
+        if control not in self.last or value in [0, 127]:
+            self.last[control] = (value, 0, now)
+            return True
+        last_value, direction, last_time = self.last[control]
+        delta = value - last_value
+        moving = (
+            delta * direction > 0 and now - last_time < self.settle_time
+        )
+        if delta and (moving or abs(delta) > self.dead_band):
+            self.last[control] = (value, 1 if delta > 0 else -1, now)
+            return True
+        self.suppressed[control] = self.suppressed.get(control, 0) + 1
+        if self.suppressed[control] % JITTER_REPORT_EVERY == 0:
+            self.logger.warning(
+                f"{control} => {self.suppressed[control]} values suppressed"
+                " => noisy?"
+            )
+        return False
+
+    def stats(self) -> dict:
+        """ Suppressed values per control, noisiest first """
+        return dict(sorted(
+            self.suppressed.items(), key=lambda item: item[1], reverse=True
+        ))
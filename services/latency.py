@@ -0,0 +1,21 @@
+class Latency:
+    """ Count, average and maximum of delays in seconds """
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, delay: float) -> None:
+        self.count += 1
+        self.total += delay
+        if delay > self.max:
+            self.max = delay
+
+    def stats(self, digits: int = 2) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(
+                1000 * self.total / self.count if self.count else 0, digits
+            ),
+            "max_ms": round(1000 * self.max, digits)
+        }
@@ -0,0 +1,261 @@
+from threading import Lock
+from mido import Message
+
+GRID_OFF = ("off", 0)
+
+# RGB values (0 - 255) of the palette colours used on the grid.
+# Needed for SysEx uploads which do not use the velocity palette
+APC_COLOURS_RGB = {
+    "off": (0, 0, 0),
+    "red": (255, 0, 0),
+    "orange": (255, 84, 0),
+    "green": (0, 255, 0),
+    "blue": (0, 0, 255),
+    "magenta": (255, 0, 255),
+    "white": (255, 255, 255)
+}
+APC_BRIGHTNESS = {
+    0: 0,
+    "dim": .25,
+    "bright": 1
+}
+# Velocity palette index and brightness channel of pad note messages
+APC_COLOURS_VELOCITY = {
+    "off": 0,
+    "white": 3,
+    "red": 5,
+    "orange": 9,
+    "green": 21,
+    "blue": 45,
+    "magenta": 53
+}
+APC_BRIGHTNESS_CHANNEL = {
+    0: 0,
+    "dim": 1,
+    "bright": 6
+}
+# Notes of the lower (track) and side (scene) buttons. Velocity is the state
+APC_LOWER_NOTE = 0x64
+APC_SIDE_NOTE = 0x70
+BUTTON_STATES = [0, 1, 2]
+# MIDIMix LED notes. LEDs are either off (velocity 0) or on (velocity 127)
+MIDIMIX_NOTES = {
+    "mute": [1, 4, 7, 10, 13, 16, 19, 22],
+    "recarm": [3, 6, 9, 12, 15, 18, 21, 24]
+}
+# Manufacturer (Akai), device (all), model (APC mini mk2), RGB command
+APC_SYSEX_RGB = [0x47, 0x7F, 0x4F, 0x24]
+# Bytes of a single note message and of a SysEx frame without blocks
+# (F0, header, length MSB + LSB, F7) and of each colour block
+NOTE_SIZE = 3
+SYSEX_SIZE = 1 + len(APC_SYSEX_RGB) + 2 + 1
+SYSEX_BLOCK_SIZE = 8
+
+
+class LedFrame:
+    """ In memory copy of every LED on the APC mini mk2.
+        Grid LEDs hold (colour, brightness), lower and side buttons
+        hold their state (0 off, 1 on, 2 blink).
+        Every change is remembered until pop_dirty() is called.
+        Writes which do not change a LED are only counted.
+    """
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.leds = {}
+        self.dirty = set()
+        self.unchanged = 0
+        for x in range(8):
+            for y in range(8):
+                self.leds[("grid", x, y)] = GRID_OFF
+            self.leds[("lower", x)] = 0
+            self.leds[("side", x)] = 0
+
+    def set_grid(self, x: int, y: int, colour: str, brightness) -> None:
+        self._set(("grid", x, y), (colour, brightness))
+
+    def set_lower(self, button_id: int, state: int) -> None:
+        self._set(("lower", button_id), state)
+
+    def set_side(self, button_id: int, state: int) -> None:
+        self._set(("side", button_id), state)
+
+    def copy_from(self, other: "LedFrame") -> None:
+        """ Take over all LEDs of other """
+        for key, state in other.leds.items():
+            self._set(key, state)
+
+    def draw_channel(
+        self, channel: int, mix_value: int, value: float, colour: str,
+        is_mute: int, set_lower_as_zero: bool = False
+    ) -> None:
+        """ Draw a level column and its lower button.
+            mix_value is the number of pads (0 - 8) the value fills
+        """
+        if mix_value == 0 and value > 0:
+            mix_value += 1
+        elif mix_value == 8 and round(value, 1) < 1:
+            mix_value -= 1
+        for y in range(0, mix_value):
+            self.set_grid(channel, y, colour, "bright")
+        for y in range(mix_value, 8):
+            self.set_grid(channel, y, "off", 0)
+        if value == 0 and set_lower_as_zero:
+            self.set_lower(channel, 2)
+        if is_mute:
+            self.set_lower(channel, 1)
+        if (
+            not is_mute
+            and (
+                value > 0
+                or (
+                    value == 0
+                    and not set_lower_as_zero
+                )
+            )
+        ):
+            self.set_lower(channel, 0)
+
+    def pop_dirty(self) -> set:
+        """ Return all LEDs written since the last call """
+        with self.lock:
+            dirty = self.dirty
+            self.dirty = set()
+        return dirty
+
+    def _set(self, key: tuple, state) -> None:
+        with self.lock:
+            if self.leds[key] == state:
+                self.unchanged += 1
+                return None
+            self.leds[key] = state
+            self.dirty.add(key)
+
+
+def pad_note(x: int, y: int) -> int:
+    """ Bottom left pad is 0, top right pad is 63 """
+    return y * 8 + x
+
+
+def pad_rgb(colour: str, brightness) -> tuple:
+    scale = APC_BRIGHTNESS.get(brightness, 1)
+    rgb = APC_COLOURS_RGB.get(colour, APC_COLOURS_RGB["off"])
+    return tuple(int(c * scale) for c in rgb)
+
+
+def sysex_runs(frame: LedFrame, changed: set) -> list:
+    """ Group the changed pads (x, y) into runs of consecutive pads with the
+        same colour. Unchanged pads are included if they join two changed
+        pads of the same colour since resending them costs nothing visible.
+        Returns a list of [start pad, end pad, rgb]
+    """
+    runs = []
+    last_changed = None
+    for pad in range(64):
+        x, y = pad % 8, pad // 8
+        rgb = pad_rgb(*frame.leds[("grid", x, y)])
+        is_changed = (x, y) in changed
+        if runs and runs[-1][1] == pad - 1 and runs[-1][2] == rgb:
+            runs[-1][1] = pad
+        elif is_changed:
+            if runs:
+                runs[-1][1] = last_changed
+            runs.append([pad, pad, rgb])
+        if is_changed:
+            last_changed = pad
+    if runs:
+        runs[-1][1] = last_changed
+    return runs
+
+
+def sysex_size(runs: list) -> int:
+    return SYSEX_SIZE + SYSEX_BLOCK_SIZE * len(runs)
+
+
+def sysex_message(runs: list) -> Message:
+    """ Build a single APC mini mk2 RGB SysEx message for all runs """
+    data = []
+    for start, end, rgb in runs:
+        data += [start, end]
+        for colour in rgb:
+            # 8 bit colour is split into MSB (bit 7) and LSB (bits 0 - 6)
+            data += [colour >> 7, colour & 0x7F]
+    length = len(data)
+    return Message(
+        "sysex",
+        data=APC_SYSEX_RGB + [length >> 7, length & 0x7F] + data
+    )
+
+
+class LedOutput:
+    """ Writes prebuilt LED messages to a mido output.
+        With the rtmidi backend the encoded bytes go straight to the port,
+        skipping the copy and encoding mido does on every send. Any other
+        backend gets the mido message. Nothing is sent once closed.
+    """
+    def __init__(self, port) -> None:
+        self.port = port
+        # mido keeps the rtmidi port private
+        rtmidi = getattr(port, "_rt", None)
+        self.send_raw = getattr(rtmidi, "send_message", None)
+        self.closed = False
+
+    def send(self, entry: tuple) -> None:
+        """ Send an entry (message, encoded bytes) of a message table """
+        if self.closed:
+            return None
+        if self.send_raw:
+            self.send_raw(entry[1])
+        else:
+            self.port.send(entry[0])
+
+    def send_message(self, message: Message) -> None:
+        if self.closed:
+            return None
+        self.port.send(message)
+
+    def close(self) -> None:
+        self.closed = True
+        self.port.close()
+
+
+def _entry(channel: int, note: int, velocity: int) -> tuple:
+    message = Message(
+        "note_on", channel=channel, note=note, velocity=velocity
+    )
+    return message, bytes(message.bytes())
+
+
+def apc_messages() -> dict:
+    """ Prebuilt messages for every LED state of the APC mini mk2.
+        Keys are (LedFrame key, state)
+    """
+    table = {}
+    for x in range(8):
+        for y in range(8):
+            for colour, velocity in APC_COLOURS_VELOCITY.items():
+                for brightness, channel in APC_BRIGHTNESS_CHANNEL.items():
+                    table[(("grid", x, y), (colour, brightness))] = _entry(
+                        channel, pad_note(x, y), velocity
+                    )
+        for state in BUTTON_STATES:
+            table[(("lower", x), state)] = _entry(
+                0, APC_LOWER_NOTE + x, state
+            )
+            table[(("side", x), state)] = _entry(0, APC_SIDE_NOTE + x, state)
+    return table
+
+
+def midimix_messages() -> dict:
+    """ Prebuilt messages for every LED state of the MIDIMix.
+        Keys are ((button group, button id), state)
+    """
+    table = {}
+    for group, notes in MIDIMIX_NOTES.items():
+        for button_id, note in enumerate(notes):
+            table[((group, button_id), 0)] = _entry(0, note, 0)
+            table[((group, button_id), 1)] = _entry(0, note, 127)
+    return table
+
+
+APC_MESSAGES = apc_messages()
+MIDIMIX_MESSAGES = midimix_messages()
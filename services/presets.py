@@ -0,0 +1,295 @@
+from logging import getLogger
+from collections import OrderedDict
+from os import path
+from json import dumps, loads
+from sqlite3 import connect, Connection, Error as DatabaseError
+from .config import (
+    PRESET_FILE, PRESET_DB_FILE, PRESET_DB_TIMEOUT, PRESET_WRITE_DELAY,
+    PRESET_WRITE_RETRIES, PRESET_CACHE_SIZE
+)
+from .write_behind import WriteBehind
+
+PRESET_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS {table}"
+    " (slot INTEGER PRIMARY KEY, preset TEXT NOT NULL)"
+)
+# PRAGMA user_version once the JSON preset file was imported
+PRESET_DB_VERSION = 1
+
+
+def compile_preset(preset: dict) -> list:
+    """ Preset => list of (fx, par, value) ready for fx_setting """
+    commands = []
+    for fx, options in preset.get("fx", {}).items():
+        for option, value in options.items():
+            if not option.startswith("par"):
+                continue
+            commands.append((int(fx), int(option[3:]), float(value)))
+    return commands
+
+
+def compile_scene(scene: dict) -> list:
+    """ Scene => list of (address, value, MixerSender call, args).
+        The address is the split Ui16 path Config.scene_value() reads
+    """
+    commands = []
+    for address, value in scene.items():
+        target = tuple(address.split("."))
+        kind, function = target[0], target[-1]
+        if kind == "m":
+            call = ("master", (value,))
+        elif function == "bpm":
+            call = ("tempo", (int(value) if value.is_integer() else value,))
+        elif function.startswith("par"):
+            call = ("fx_setting", (int(target[1]), int(function[3:]), value))
+        elif function == "mix":
+            call = ("mix", (int(target[1]), value, kind))
+        elif function == "mute":
+            call = ("mute", (int(target[1]), int(value), kind))
+        elif len(target) == 4:
+            call = ("fx", (int(target[1]), value, kind, int(function)))
+        else:
+            # Solo and gain are kept, MixerSender has no command for them
+            continue
+        commands.append((target, value) + call)
+    return commands
+
+
+class PresetStore(WriteBehind):
+    """ Preset library in a SQLite file, one row per slot.
+        The last cache_size presets are kept with their compiled commands.
+        save() and remove() only change memory, the writer thread commits
+        them in batches and drops them after retries failed writes.
+        Scenes use their own table with compiler=compile_scene.
+    """
+    def __init__(
+        self,
+        db_file: str = PRESET_DB_FILE,
+        delay: float = PRESET_WRITE_DELAY,
+        retries: int = PRESET_WRITE_RETRIES,
+        cache_size: int = PRESET_CACHE_SIZE,
+        logger_name: str = "PresetStore",
+        import_file: str = PRESET_FILE,
+        table: str = "presets",
+        compiler=compile_preset
+    ) -> None:
+        super().__init__(delay)
+        self.logger = getLogger(logger_name)
+        self.db_file = db_file
+        self.table = table
+        self.compiler = compiler
+        self.retries = retries
+        self.cache_size = cache_size
+        # slot => (preset, commands) or None if removed, not yet committed
+        self.unsaved = {}
+        # slot => (preset, commands) or None for an empty slot
+        self.cache = OrderedDict()
+        self.reads = 0
+        self.hits = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.db = self._connect()
+        self.writer = None
+        if (
+            import_file
+            and self.db.execute("PRAGMA user_version").fetchone()[0] == 0
+        ):
+            self._import(import_file)
+
+    def __contains__(self, preset_id: str) -> bool:
+        return self._entry(preset_id) is not None
+
+    def get(self, preset_id: str) -> dict:
+        entry = self._entry(preset_id)
+        return entry[0] if entry else None
+
+    def commands(self, preset_id: str) -> list:
+        entry = self._entry(preset_id)
+        return entry[1] if entry else []
+
+    def bank(self, first: int, count: int) -> list:
+        """ Slots from first to first + count - 1 holding a preset.
+            A bank which fits the cache is read into it
+        """
+        warm = count <= self.cache_size
+        with self.condition:
+            slots = set()
+            for slot, preset in self.db.execute(
+                f"SELECT slot, {'preset' if warm else 'NULL'}"
+                f" FROM {self.table} WHERE slot >= ? AND slot < ?",
+                (first, first + count)
+            ):
+                slots.add(slot)
+                if warm and slot not in self.cache:
+                    preset = loads(preset)
+                    self._cache(slot, (preset, self.compiler(preset)))
+            for slot in range(first, first + count):
+                if warm and slot not in slots and slot not in self.cache:
+                    self._cache(slot, None)
+            for slot, entry in self.unsaved.items():
+                if first <= slot < first + count:
+                    if entry is None:
+                        slots.discard(slot)
+                    else:
+                        slots.add(slot)
+        return sorted(slots)
+
+    def save(self, preset_id: str, preset: dict) -> None:
+        # Copy through JSON, the preset holds live Config dicts
+        preset = loads(dumps(preset))
+        self._change(int(preset_id), (preset, self.compiler(preset)))
+
+    def remove(self, preset_id: str) -> None:
+        if preset_id in self:
+            self._change(int(preset_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self.cache),
+            "unsaved": len(self.unsaved),
+            "reads": self.reads,
+            "hits": self.hits,
+            "batches": self.batches,
+            "dropped": self.dropped
+        }
+
+    def _connect(self) -> Connection:
+        db = connect(
+            self.db_file, timeout=PRESET_DB_TIMEOUT, check_same_thread=False
+        )
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = FULL")
+        db.execute(PRESET_SCHEMA.format(table=self.table))
+        db.commit()
+        return db
+
+    def _import(self, import_file: str) -> None:
+        """ Presets of the JSON preset file """
+        presets = {}
+        if path.exists(import_file):
+            with open(import_file, "r") as fp:
+                data = fp.read()
+            try:
+                presets = loads(data) if data.strip() else {}
+            except ValueError as error:
+                self.logger.critical(
+                    f"{import_file} => unreadable => {error}"
+                )
+        with self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?)",
+                [
+                    (int(slot), dumps(preset, separators=(",", ":")))
+                    for slot, preset in presets.items()
+                ]
+            )
+            self.db.execute(f"PRAGMA user_version = {PRESET_DB_VERSION}")
+        if presets:
+            self.logger.warning(
+                f"{import_file} => {len(presets)} presets imported"
+            )
+
+    def _entry(self, preset_id: str) -> tuple:
+        slot = int(preset_id)
+        with self.condition:
+            if slot in self.unsaved:
+                return self.unsaved[slot]
+            if slot in self.cache:
+                self.cache.move_to_end(slot)
+                self.hits += 1
+                return self.cache[slot]
+            row = self.db.execute(
+                f"SELECT preset FROM {self.table} WHERE slot = ?", (slot,)
+            ).fetchone()
+            self.reads += 1
+            entry = None
+            if row:
+                preset = loads(row[0])
+                entry = (preset, self.compiler(preset))
+            self._cache(slot, entry)
+            return entry
+
+    def _cache(self, slot: int, entry: tuple) -> None:
+        """ Has to be called with self.condition acquired """
+        self.cache[slot] = entry
+        self.cache.move_to_end(slot)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _change(self, slot: int, entry: tuple) -> None:
+        with self.condition:
+            self.unsaved[slot] = entry
+            self.cache.pop(slot, None)
+            self.condition.notify()
+
+    def _write(self) -> None:
+        """ Commit all unsaved changes in one transaction """
+        with self.condition:
+            batch = dict(self.unsaved)
+        if not batch:
+            return None
+        try:
+            if self.writer is None:
+                self.writer = self._connect()
+            with self.writer:
+                for slot, entry in batch.items():
+                    if entry is None:
+                        self.writer.execute(
+                            f"DELETE FROM {self.table} WHERE slot = ?",
+                            (slot,)
+                        )
+                    else:
+                        self.writer.execute(
+                            f"INSERT OR REPLACE INTO {self.table}"
+                            " VALUES (?, ?)",
+                            (slot, dumps(entry[0], separators=(",", ":")))
+                        )
+        except DatabaseError as error:
+            self.failures += 1
+            if self.failures < self.retries:
+                self.logger.warning(
+                    f"{self.db_file} => {self.table} not written"
+                    f" ({self.failures}/{self.retries}) => {error}"
+                )
+                return None
+            self._drop(batch, error)
+            return None
+        self.failures = 0
+        self.batches += 1
+        with self.condition:
+            for slot, entry in batch.items():
+                # Changed again while writing, stays for the next batch
+                if slot in self.unsaved and self.unsaved[slot] is entry:
+                    del self.unsaved[slot]
+                    self._cache(slot, entry)
+
+    def _drop(self, batch: dict, error: DatabaseError) -> None:
+        """ Give up on a batch which could not be written retries times """
+        self.failures = 0
+        dropped = 0
+        with self.condition:
+            for slot, entry in batch.items():
+                # Changed again while writing, stays for the next batch
+                if slot in self.unsaved and self.unsaved[slot] is entry:
+                    del self.unsaved[slot]
+                    dropped += 1
+        self.dropped += dropped
+        self.logger.error(
+            f"{self.db_file} => {self.table} => {dropped} changes dropped"
+            f" => {error}"
+        )
+
+    def _pending(self) -> bool:
+        return bool(self.unsaved)
+
+    def _wait(self) -> float:
+        # Back off after failed writes
+        return self.delay * 2 ** self.failures
+
+    def terminate(self) -> None:
+        super().terminate()
+        self.logger.info(f"{self.table.capitalize()} => {self.stats()}")
+        for db in [self.db, self.writer]:
+            if db:
+                db.close()
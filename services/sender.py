@@ -0,0 +1,237 @@
+from soundcraft_ui16 import MixerSender
+from queue import Queue
+from threading import Thread, Event, Condition
+from logging import getLogger
+from time import monotonic
+from collections import deque
+from .config import SEND_RATES, SEND_PRIORITY
+from .echo import EchoFilter, sent_message
+from .latency import Latency
+
+
+def command_key(call: str, args: tuple) -> tuple:
+    """ Parameter a MixerSender call sets. Pending values are kept per key
+    """
+    if call in ["master", "tempo"]:
+        return (call,)
+    if call == "fx_setting":
+        return (call,) + args[:2]
+    # mix, mute and fx, channel and everything after the value
+    return (call,) + args[:1] + args[2:]
+
+
+class SendScheduler:
+    """ Sits between the MIDI controllers and the MixerSender.
+        Commands are queued and sent by the writer thread, fader and knob
+        values are coalesced and sent at most SEND_RATES times per second,
+        SEND_PRIORITY class 0 first. Mute toggles are kept in order.
+        With an update_queue every value is shown before the mixer answers.
+    """
+    def __init__(
+        self,
+        sender: MixerSender,
+        rates: dict = SEND_RATES,
+        priorities: dict = SEND_PRIORITY,
+        logger_name: str = "SendScheduler",
+        echo_filter: EchoFilter = None,
+        update_queue: Queue = None
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.sender = sender
+        self.echo_filter = echo_filter
+        self.update_queue = update_queue
+        # touch(keys) is called with the parameters every call changes
+        # which was not automated, e.g. to stop a running fade
+        self.touch = None
+        # record(commands, now) gets the same calls with their (key, args)
+        # and the time they were submitted at, e.g. to record automation
+        self.record = None
+        self.intervals = {key: 1 / rate for key, rate in rates.items()}
+        self.priorities = priorities
+        self.pending = {}
+        self.queue = deque()
+        self.last_sent = {}
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.latency = {
+            priority: Latency() for priority in set(priorities.values())
+        }
+        self.condition = Condition()
+        self.exit_flag = Event()
+        self.thread = Thread(target=self._thread, args=())
+
+    # Same interface as MixerSender for the controllers
+    def mix(self, channel, value, *args) -> None:
+        self._submit(("mix", channel) + args, (channel, value) + args)
+
+    def master(self, value) -> None:
+        self._submit(("master",), (value,))
+
+    def fx(self, channel, value, *args) -> None:
+        self._submit(("fx", channel) + args, (channel, value) + args)
+
+    def fx_setting(self, fx, par, value) -> None:
+        self._submit(("fx_setting", fx, par), (fx, par, value))
+
+    def tempo(self, bpm) -> None:
+        self._submit(("tempo",), (bpm,))
+
+    def fx_settings(self, settings: list) -> None:
+        """ Queue many (fx, par, value) at once, e.g. a preset recall """
+        self._submit_all([
+            (("fx_setting", fx, par), (fx, par, value))
+            for fx, par, value in settings
+        ])
+
+    def send_all(self, calls: list, automated: bool = False) -> None:
+        """ Queue many (MixerSender call, args) at once, e.g. a scene.
+            automated calls do not count as touched by a person
+        """
+        self._submit_all(
+            [(command_key(call, args), args) for call, args in calls],
+            automated
+        )
+
+    def mute(self, *args) -> None:
+        self._submit(command_key("mute", args), args)
+
+    def depth(self) -> int:
+        return len(self.pending) + len(self.queue)
+
+    def stats(self) -> dict:
+        """ Counters, queue depth and enqueue to wire latency per class """
+        latency = {
+            priority: values.stats()
+            for priority, values in self.latency.items()
+        }
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "latency": latency
+        }
+
+    def _submit(self, key: tuple, args: tuple) -> None:
+        self._submit_all([(key, args)])
+
+    def _submit_all(self, commands: list, automated: bool = False) -> None:
+        """ Queue (key, args) pairs with a single wakeup of the writer.
+            Mutes are toggles and kept in order, never coalesced
+        """
+        if not commands:
+            return None
+        with self.condition:
+            now = monotonic()
+            for key, args in commands:
+                if key[0] == "mute":
+                    self.queue.append(
+                        (self.priorities["mute"], now, "mute", args)
+                    )
+                    continue
+                queued = now
+                if key in self.pending:
+                    # Latency counts from the oldest value it replaces
+                    self.coalesced += 1
+                    queued = self.pending[key][1]
+                self.pending[key] = (
+                    self.priorities[key[0]], queued, key[0], args
+                )
+            self._update_depth()
+            self.condition.notify()
+        for key, args in commands:
+            self._local(key[0], args)
+        if automated:
+            return None
+        if self.touch:
+            self.touch([key for key, _ in commands])
+        if self.record:
+            self.record(commands, now)
+
+    def _local(self, name: str, args: tuple) -> None:
+        """ Provisional value until the mixer echoes it """
+        if self.update_queue is None:
+            return None
+        msg = sent_message(name, args)
+        msg["local"] = monotonic()
+        self.update_queue.put(msg)
+
+    def _update_depth(self) -> None:
+        if self.depth() > self.max_depth:
+            self.max_depth = self.depth()
+
+    def _next(self) -> tuple:
+        """ Pop the most urgent command which may be sent now.
+            Returns (command, None) or (None, seconds until one is due).
+            Has to be called with self.condition acquired
+        """
+        now = monotonic()
+        best_key = None
+        timeout = None
+        for key, entry in self.pending.items():
+            ready = self.last_sent.get(key, 0) + self.intervals[key[0]]
+            if ready > now:
+                if timeout is None or ready - now < timeout:
+                    timeout = ready - now
+            elif best_key is None or entry[:2] < self.pending[best_key][:2]:
+                best_key = key
+        if self.queue and (
+            best_key is None or self.queue[0][:2] < self.pending[best_key][:2]
+        ):
+            return self.queue.popleft(), None
+        if best_key is None:
+            return None, timeout
+        self.last_sent[best_key] = now
+        return self.pending.pop(best_key), None
+
+    def _send(
+        self, priority: int, queued: float, name: str, args: tuple
+    ) -> None:
+        if self.echo_filter:
+            # Before sending, the echo may be faster than this thread
+            self.echo_filter.expect(name, args)
+        try:
+            getattr(self.sender, name)(*args)
+        except Exception as error:
+            # A lost connection must not stop the writer
+            self.failed += 1
+            self.logger.exception(f"Send of {name} failed => {error}")
+            return None
+        self.sent += 1
+        self.latency[priority].add(monotonic() - queued)
+
+    def _thread(self) -> None:
+        while not self.exit_flag.is_set():
+            with self.condition:
+                command, timeout = self._next()
+                if not command:
+                    self.condition.wait(timeout)
+                    continue
+            self._send(*command)
+        # Never drop the last values
+        with self.condition:
+            due = sorted(
+                list(self.queue) + list(self.pending.values()),
+                key=lambda command: command[:2]
+            )
+            self.queue.clear()
+            self.pending = {}
+        for command in due:
+            self._send(*command)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def terminate(self) -> None:
+        self.exit_flag.set()
+        with self.condition:
+            self.condition.notify()
+        self.join()
+        self.logger.info(f"Sender => {self.stats()}")
@@ -10,6 +10,11 @@ from .threads import (
 )
 from .gui import BaseFrame
 from .wifi import wait_connect
+from .sender import SendScheduler
+from .echo import EchoFilter
+from .tween import TweenThread
+from .automation import AutomationRecorder, AutomationPlayer
+from .clock import MidiClockInput, MidiClockOutput
 from .gui_controller import GuiController
 
 
@@ -37,26 +42,81 @@ class ThreadController:
             MIXER_ADDRESS, MIXER_PORT,
             queue=update_queue, logger_name=self.logger.name
         )
+        self.echo_filter = EchoFilter()
+        self.scheduler = SendScheduler(
+            self.sender, logger_name=self.logger.name,
+            echo_filter=self.echo_filter,
+            update_queue=None if args.no_optimistic else update_queue
+        )
+        self.tweens = TweenThread(
+            self.scheduler, config, logger_name=self.logger.name
+        )
+        # Moving a control by hand stops its fade
+        self.scheduler.touch = self.tweens.cancel
+        self.recorder = None
+        if args.record:
+            try:
+                self.recorder = AutomationRecorder(
+                    args.record, logger_name=self.logger.name
+                )
+                self.scheduler.record = self.recorder.record
+            except (OSError, ValueError) as error:
+                self.logger.critical(f"Automation => not recording => {error}")
+        self.player = None
+        if args.play:
+            try:
+                self.player = AutomationPlayer(
+                    self.scheduler, args.play, args.play_speed,
+                    args.play_loop, logger_name=self.logger.name
+                )
+            except (OSError, ValueError) as error:
+                self.logger.critical(f"Automation => not playing => {error}")
+        self.clock_input = None
+        if args.clock_in:
+            self.clock_input = MidiClockInput(
+                self.scheduler, args.clock_in, logger_name=self.logger.name
+            )
+        self.clock_output = None
+        if args.clock_out:
+            self.clock_output = MidiClockOutput(
+                config, args.clock_out, logger_name=self.logger.name
+            )
         self.update_thread = UpdateConfigThread(
-            update_queue, config, self.logger.name, self
+            update_queue, config, self.logger.name, self, self.echo_filter
         )
         self.midi_keepalive_thread = MidiControllerThread(
-            self.sender, config, args, self, self.logger.name
+            self.scheduler, config, args, self, self.logger.name
         )
         self.gui_controller = GuiController(
             gui, config, self.logger.name, self
         )
 
     def terminate(self) -> None:
+        self.midi_keepalive_thread.terminate()
+        if self.player:
+            self.player.terminate()
+        if self.clock_input:
+            self.clock_input.terminate()
+        if self.clock_output:
+            self.clock_output.terminate()
+        self.tweens.terminate()
+        self.scheduler.terminate()
+        if self.recorder:
+            self.recorder.terminate()
         self.sender.terminate()
         self.listener.terminate()
         self.update_thread.terminate()
-        self.midi_keepalive_thread.terminate()
+        for store in [self.config.presets, self.config.scenes]:
+            if store:
+                store.terminate()
 
     def test(self) -> None:
         self.logger.info("No Test set")
 
     def start(self) -> None:
+        for store in [self.config.presets, self.config.scenes]:
+            if store:
+                store.start()
         self._check_network_connection()
         setup_listener = True
         self.logger.info("Starting listener...")
@@ -80,6 +140,10 @@ class ThreadController:
         self.logger.info("Sender => starting")
         self.sender.start()
         self._check_mixer_connection(self.sender)
+        self.scheduler.start()
+        self.tweens.start()
+        if self.recorder:
+            self.recorder.start()
         self.logger.info("Sender => ready")
         self.logger.info("Update Thread => starting")
         self.update_thread.start()
@@ -89,6 +153,15 @@ class ThreadController:
         self.gui_controller.update_settings({"key": "init"})
         self.logger.info("Midi Controllers => Starting")
         self.midi_keepalive_thread.start()
+        if self.clock_input:
+            self.logger.info("MIDI clock => starting")
+            self.clock_input.start()
+        if self.clock_output:
+            self.logger.info("MIDI clock out => starting")
+            self.clock_output.start()
+        if self.player:
+            self.logger.info("Automation => playing")
+            self.player.start()
         self.logger.info("Gui => Starting")
         self.gui_controller = GuiController(
             self.gui, self.config, self.logger.name, self
@@ -1,5 +1,7 @@
 # flake8: noqa: F401
 from .update_config import UpdateConfigThread
+from .led_render import LedRenderThread
+from .midi_input import MidiInputThread
 from .apc import APC
 from .midimix import Midimix
 from .controller_base import MidiControllerThread
@@ -1,30 +1,56 @@
 from akai_pro_py import controllers
-from soundcraft_ui16 import MixerSender
+from mido import open_output
+from services.sender import SendScheduler
 from logging import getLogger
 from argparse import Namespace
 from services.config import Config, MASTER_LOCK
 from services.formatter import ConfigVars
+from services.led import (
+    LedFrame, LedOutput, NOTE_SIZE, APC_MESSAGES,
+    sysex_runs, sysex_size, sysex_message
+)
+from .led_render import LedRenderThread
+from services.jitter import JitterFilter
+from services.control_map import (
+    DEFAULT_TABLES, APC_PAGES, bind_controls, dispatch_control
+)
+from .midi_input import MidiInputThread
 
 
 class APC(controllers.APCMinimkii):
+    # Pages of every view. The side button with the same id shows the view.
+    # The mix view pages through the channels with channels_index
+    VIEW_PAGES = {0: APC_PAGES, 7: 1}
+    # Side buttons between the view buttons save and recall scenes
+    SCENE_BUTTONS = range(1, 7)
+
     def __init__(
         self,
         midi_string: str,
-        sender: MixerSender,
+        sender: SendScheduler,
         config: Config,
         args: Namespace,
         parent: None,
-        logger_name: str = "APC"
+        logger_name: str = "APC",
+        renderer: LedRenderThread = None,
+        mapping: dict = DEFAULT_TABLES
     ) -> None:
         super().__init__(midi_string, midi_string)
         self.logger = getLogger(logger_name)
         self.args = args
         self.sender = sender
         self.config = config
+        self.scene_store = config.scenes
         self.vars = ConfigVars()
         self.parent = parent
         self.ready_dispatch = self.on_ready
-        self.event_dispatch = self.on_event
+        self.input = MidiInputThread(
+            self.on_event, self.control_key, logger_name,
+            JitterFilter(
+                args.jitter_dead_band, args.jitter_settle, logger_name
+            )
+        )
+        self.event_dispatch = self.input.put
         self.ready = False
         self.shift = False
         self.midimix_shift = False
@@ -34,20 +60,45 @@ class APC(controllers.APCMinimkii):
         self.last_used_channel = None
         self.master_lock = MASTER_LOCK
         self.master_lock_entry = []
+        self.master_lock_led = None
+        self.renderer = renderer
+        self.set_mapping(mapping)
+        self.needs_reset = False
+        # frame is rendered into, shown is what the device displays.
+        # Only the difference between both is sent on flush()
+        self.frame = LedFrame()
+        self.shown = LedFrame()
+        # Offscreen frame of every (view, page) kept up to date with Config
+        self.views = {}
+        self.prerender()
+        self.led_sent = 0
+        self.led_suppressed = 0
+        self.led_sysex = 0
+        # Second connection to the output port for prebuilt LED messages
+        # and SysEx frames. akai_pro_py builds a new message for every LED
+        try:
+            self.output = LedOutput(open_output(midi_string))
+        except OSError:
+            self.logger.error(f"{midi_string} => no direct LED output")
+            self.output = None
 
     def update_settings(self, msg) -> None:
-        if msg["key"] == "channel" and self.display_view == 0:
+        if msg["key"] == "channel":
             self.update_mix_channel(msg["data"]["channel"])
-        elif msg["key"] == "master" and self.display_view == 7:
+            if self.display_view == 0:
+                self.request_render()
+        elif msg["key"] == "master":
             self.update_master_channel()
-        elif msg["key"] == "fxmix" and self.display_view == 7:
+            if self.display_view == 7:
+                self.request_render()
+        elif msg["key"] == "fxmix":
             self.update_fxreturn_channel(msg["data"]["channel"])
+            if self.display_view == 7:
+                self.request_render()
         elif msg["key"] == "init":
-            self.reset(fast=True)
-            if self.display_view == 0:
-                self.display_mix_channels()
-            elif self.display_view == 7:
-                self.display_master_fxreturn()
+            self.prerender()
+            self.needs_reset = True
+            self.request_render()
         elif msg["key"] == "midimix_shift":
             self.midimix_shift = msg["data"]["state"]
         else:
@@ -58,15 +109,29 @@ class APC(controllers.APCMinimkii):
         self.ready = True
         self.logger.warning("{self.name} is ready")
 
+    def set_mapping(self, mapping: dict) -> None:
+        """ Use the dispatch tables of a compiled control mapping """
+        self.controls = bind_controls(
+            mapping["apc"]["controls"], self.sender, self.vars
+        )
+        self.shift_actions = mapping["apc"]["shift"]
+        self.fine_step = mapping["apc"]["fine_step"]
+
+    def control_key(self, event) -> tuple:
+        """ Controls whose events may be collapsed to the newest value """
+        if isinstance(event, self.Fader):
+            return ("fader", event.fader_id)
+        return None
+
     def on_event(self, event) -> None:
         if isinstance(event, self.GridButton):
             if self.display_view not in [0, 7]:
                 return None
             elif self.display_view == 0 and event.state:
-                self.sender.mix(
-                    event.x + self.channels_index,
-                    self.vars.midi_grid_to_soundcraft(event.y),
-                    "i"
+                dispatch_control(
+                    self.controls,
+                    ("grid", 0, event.x, event.y, self.channels_index),
+                    event.y
                 )
                 self.last_used_channel = int(event.x)
             elif (
@@ -77,7 +142,9 @@ class APC(controllers.APCMinimkii):
             ):
                 if event.x == 4 and event.y == 7:
                     self.master_lock_entry = []
-                    self.gridbuttons.set_led(4, 7, "red", "bright")
+                    self.master_lock_led = "red"
+                    self.update_master_lock()
+                    self.request_render()
                     self.logger.warning("Master => lock => reset")
                     return None
                 if self.master_lock_entry == self.master_lock:
@@ -86,7 +153,9 @@ class APC(controllers.APCMinimkii):
                         == self.master_lock[len(self.master_lock_entry)]:
                     self.master_lock_entry.append((event.x, event.y))
                     if self.master_lock == self.master_lock_entry:
-                        self.gridbuttons.set_led(4, 7, "green", "bright")
+                        self.master_lock_led = "green"
+                        self.update_master_lock()
+                        self.request_render()
                         self.logger.warning("Master => lock => unlock")
                     return None
             elif (
@@ -101,10 +170,8 @@ class APC(controllers.APCMinimkii):
                 and event.state
                 and event.x in range(4)
             ):
-                self.sender.mix(
-                    event.x,
-                    self.vars.midi_grid_to_soundcraft(event.y),
-                    "f"
+                dispatch_control(
+                    self.controls, ("grid", 7, event.x, event.y, 0), event.y
                 )
                 self.last_used_channel = int(event.x)
             elif (
@@ -112,31 +179,40 @@ class APC(controllers.APCMinimkii):
                 and event.state
                 and event.x == 7
             ):
-                self.sender.master(self.vars.midi_grid_to_soundcraft(event.y))
+                dispatch_control(
+                    self.controls, ("grid", 7, 7, event.y, 0), event.y
+                )
                 self.last_used_channel == int(event.x)
         elif isinstance(event, self.SideButton):
+            if event.button_id in self.SCENE_BUTTONS:
+                if event.state:
+                    self.scene_button(event.button_id)
+                return None
             if event.button_id == 0 and self.display_view != 0:
                 self.display_view = 0
                 self.last_used_channel = None
-                self.display_mix_channels()
+                self.request_render()
                 self.parent.notify_update(
                     "matrix_view", {"view": self.display_view}
                 )
             elif event.button_id == 7 and self.display_view != 7:
                 self.master_lock_entry = []
+                self.master_lock_led = None
+                self.update_master_lock()
                 self.display_view = 7
                 self.last_used_channel = None
-                self.display_master_fxreturn()
+                self.request_render()
                 self.parent.notify_update(
                     "matrix_view", {"view": self.display_view}
                 )
         elif isinstance(event, self.LowerButton):
             if not event.state:
                 return None
+            action = self.shift_actions.get(event.button_id)
             if (
                 (self.shift or self.midimix_shift)
                 and self.display_view == 0
-                and event.button_id in [4, 5]
+                and action in ["fine_up", "fine_down"]
                 and self.last_used_channel is not None
             ):
                 value = float(
@@ -144,10 +220,13 @@ class APC(controllers.APCMinimkii):
                         str(self.last_used_channel), "mix"
                     )
                 )
-                value += 0.002 if event.button_id == 4 else -0.002
-                if event.button_id == 4 and value >= 1:
+                value += (
+                    self.fine_step if action == "fine_up"
+                    else -self.fine_step
+                )
+                if action == "fine_up" and value >= 1:
                     value = 1
-                if event.button_id == 5 and value <= 0:
+                if action == "fine_down" and value <= 0:
                     value = 0
                 self.sender.mix(
                     self.last_used_channel,
@@ -158,11 +237,13 @@ class APC(controllers.APCMinimkii):
             elif (
                 (self.shift or self.midimix_shift)
                 and self.display_view == 0
-                and event.button_id == 6
-                and self.check_index(self.channels_index - 1, 0, 4)
+                and action == "page_down"
+                and self.check_index(
+                    self.channels_index - 1, 0, self.VIEW_PAGES[0] - 1
+                )
             ):
                 self.channels_index -= 1
-                self.display_mix_channels()
+                self.request_render()
                 self.parent.notify_update(
                     "channel_move",
                     {"inc": False, "index": self.channels_index}
@@ -171,11 +252,13 @@ class APC(controllers.APCMinimkii):
             elif (
                 (self.shift or self.midimix_shift)
                 and self.display_view == 0
-                and event.button_id == 7
-                and self.check_index(self.channels_index + 1, 0, 4)
+                and action == "page_up"
+                and self.check_index(
+                    self.channels_index + 1, 0, self.VIEW_PAGES[0] - 1
+                )
             ):
                 self.channels_index += 1
-                self.display_mix_channels()
+                self.request_render()
                 self.parent.notify_update(
                     "channel_move",
                     {"inc": True, "index": self.channels_index}
@@ -185,10 +268,11 @@ class APC(controllers.APCMinimkii):
                 (self.shift or self.midimix_shift)
                 and self.display_view == 7
                 and self.last_used_channel is not None
-                and event.button_id == 4
+                and action == "fine_up"
             ):
                 if self.last_used_channel == 7:
-                    next_value = float(self.config.get_master()) + 0.002
+                    next_value = float(self.config.get_master()) + \
+                        self.fine_step
                     self.sender.master(
                         next_value if next_value <= 1 else 1
                     )
@@ -197,7 +281,7 @@ class APC(controllers.APCMinimkii):
                         self.config.get_fx_value(
                             str(self.last_used_channel), "mix"
                         )
-                    ) + 0.002
+                    ) + self.fine_step
                     self.sender.mix(
                         self.last_used_channel,
                         next_value if next_value <= 1 else 1
@@ -207,10 +291,11 @@ class APC(controllers.APCMinimkii):
                 (self.shift or self.midimix_shift)
                 and self.display_view == 7
                 and self.last_used_channel is not None
-                and event.button_id == 5
+                and action == "fine_down"
             ):
                 if self.last_used_channel == 7:
-                    next_value = float(self.config.get_master()) - 0.002
+                    next_value = float(self.config.get_master()) - \
+                        self.fine_step
                     self.sender.master(
                         next_value if next_value >= 0 else 0
                     )
@@ -219,7 +304,7 @@ class APC(controllers.APCMinimkii):
                         self.config.get_fx_value(
                             str(self.last_used_channel), "mix"
                         )
-                    ) - 0.002
+                    ) - self.fine_step
                     self.sender.mix(
                         self.last_used_channel,
                         next_value if next_value >= 0 else 0
@@ -254,109 +339,204 @@ class APC(controllers.APCMinimkii):
                 # if event.button_id == 7:
                 #     self.sender.master(0)
         elif isinstance(event, self.Fader):
-            if event.fader_id in list(range(5)):
-                self.sender.fx_setting(
-                    0,
-                    event.fader_id + 1,
-                    self.vars.midi_to_soundcraft(event.value)
-                )
-            elif event.fader_id in list(range(5, 9)):
-                self.sender.fx_setting(
-                    1,
-                    (event.fader_id + 1) - 5,
-                    self.vars.midi_to_soundcraft(event.value)
-                )
+            dispatch_control(
+                self.controls, ("fader", event.fader_id), event.value
+            )
         elif isinstance(event, self.ShiftButton):
             self.shift = True if event.state else False
             self.parent.notify_update("apc_shift", {"state": event.state})
 
+    def scene_button(self, button_id: int) -> None:
+        """ Save an empty scene, recall a saved one, delete with shift """
+        scene = str(button_id)
+        shift = self.shift or self.midimix_shift
+        if scene in self.scene_store and shift:
+            self.scene_store.remove(scene)
+            self.set_scene_led(button_id, 0)
+        elif scene in self.scene_store:
+            self.recall_scene(scene)
+        elif not shift:
+            self.config.create_scene(scene)
+            self.set_scene_led(button_id, 1)
+
+    def recall_scene(self, scene: str) -> None:
+        """ Send every value of a scene which differs from the mixer """
+        commands = self.scene_store.commands(scene)
+        if self.args.morph_time:
+            moving = self.parent.tweens.morph(
+                commands, self.args.morph_time, self.args.morph_curve
+            )
+            self.logger.info(
+                f"Scene {scene} => {moving}/{len(commands)} morphing"
+            )
+            return None
+        changed = self.config.scene_diff(commands)
+        self.sender.send_all(changed)
+        self.logger.info(
+            f"Scene {scene} => {len(changed)}/{len(commands)} sent"
+        )
+
+    def set_scene_led(self, button_id: int, state: int) -> None:
+        for frame in self.views.values():
+            frame.set_side(button_id, state)
+        self.request_render()
+
+    def request_render(self) -> None:
+        """ Let the render thread draw the next frame.
+            Renders right away if there is no render thread
+        """
+        if self.renderer:
+            self.renderer.request(self)
+        else:
+            self.render()
+
+    def render(self) -> None:
+        """ Send the difference between the prerendered frame of the
+            current view and what the device shows
+        """
+        if self.needs_reset:
+            self.needs_reset = False
+            self.reset(fast=True)
+            self.frame = LedFrame()
+            self.shown = LedFrame()
+        self.frame.copy_from(
+            self.views[(self.display_view, self.current_page())]
+        )
+        self.flush()
+
+    def current_page(self) -> int:
+        return self.channels_index if self.display_view == 0 else 0
+
+    def prerender(self) -> None:
+        """ Draw every page of every view from Config """
+        for view in self.VIEW_PAGES:
+            for page in range(self.VIEW_PAGES[view]):
+                self.views[(view, page)] = LedFrame()
+                self.views[(view, page)].set_side(view, 1)
+        self.display_mix_channels()
+        self.display_master_fxreturn()
+        self.display_scenes()
+
+    def display_scenes(self) -> None:
+        saved = self.scene_store.bank(
+            self.SCENE_BUTTONS[0], len(self.SCENE_BUTTONS)
+        )
+        for frame in self.views.values():
+            for button_id in saved:
+                frame.set_side(button_id, 1)
+
     def display_mix_channels(self) -> None:
-        """ render full channel mix overview """
-        self.reset(fast=True)
-        self.set_view_button()
-        for channel in range(
-            self.channels_index,
-            self.channels_index + 8
-        ):
+        """ render full channel mix overview of all pages """
+        for channel in range(self.VIEW_PAGES[0] + 7):
             self.update_mix_channel(channel)
 
     def update_mix_channel(self, channel: str | int) -> None:
         # Make sure channel value is type string
         channel = str(channel)
-        # Set values and request missing values from config
-        if 0 > int(channel) - self.channels_index > 7:
-            return None
-        self.display_channel(
-            int(channel) - self.channels_index,
-            self.config.get_channel_value(channel, "mix"),
-            "orange",
-            self.config.get_channel_value(channel, "mute"),
-            set_lower_as_zero=True
-        )
+        for page in range(self.VIEW_PAGES[0]):
+            # Only pages showing the channel
+            if not 0 <= int(channel) - page <= 7:
+                continue
+            self.display_channel(
+                self.views[(0, page)],
+                int(channel) - page,
+                self.config.get_channel_value(channel, "mix"),
+                "orange",
+                self.config.get_channel_value(channel, "mute"),
+                set_lower_as_zero=True
+            )
 
     def display_master_fxreturn(self) -> None:
-        self.reset(fast=True)
-        self.set_view_button()
         self.update_master_channel()
         for fx in range(4):
             self.update_fxreturn_channel(fx)
+        self.update_master_lock()
 
     def update_master_channel(self) -> None:
         self.display_channel(
+            self.views[(7, 0)],
             7, self.config.get_master(),
             "red", 0, set_lower_as_zero=True
         )
 
     def update_fxreturn_channel(self, fx: int | str) -> None:
         self.display_channel(
+            self.views[(7, 0)],
             int(fx),
             self.config.get_fx_value(str(fx), "mix"),
             self.vars.map_color[int(fx)],
             self.config.get_fx_value(str(fx), "mute")
         )
 
-    def set_view_button(self) -> None:
-        """
-            Set Sidebutton on if its the current view, else turn it off
-        """
-        for y in range(0, 8):
-            self.sidebuttons.set_led(
-                y,
-                0 if y != self.display_view else 1
-            )
+    def update_master_lock(self) -> None:
+        if self.master_lock_led:
+            self.views[(7, 0)].set_grid(4, 7, self.master_lock_led, "bright")
+        else:
+            self.views[(7, 0)].set_grid(4, 7, "off", 0)
 
     def display_channel(
-            self, channel: int, value: str, colour: str,
+            self, frame: LedFrame, channel: int, value: str, colour: str,
             is_mute: str, set_lower_as_zero: bool = False
     ) -> None:
-        mix_value = self.vars.soundcraft_to_midi(value)
         if 0 > int(channel):
             return None
         if int(channel) > 7:
             return None
-        if mix_value == 0 and float(value) > 0:
-            mix_value += 1
-        elif mix_value == 8 and round(float(value), 1) < 1:
-            mix_value -= 1
-        for y in range(0, mix_value):
-            self.gridbuttons.set_led(int(channel), y, colour, "bright")
-        for y in range(mix_value, 8):
-            self.gridbuttons.set_led(int(channel), y, "off", 0)
-        if float(value) == 0 and set_lower_as_zero:
-            self.lowerbuttons.set_led(int(channel), 2)
-        if int(is_mute):
-            self.lowerbuttons.set_led(int(channel), 1)
-        if (
-            not int(is_mute)
-            and (
-                float(value) > 0
-                or (
-                    float(value) == 0
-                    and not set_lower_as_zero
-                )
-            )
-        ):
-            self.lowerbuttons.set_led(int(channel), 0)
+        frame.draw_channel(
+            int(channel), self.vars.soundcraft_to_midi(value),
+            float(value), colour, int(is_mute), set_lower_as_zero
+        )
+
+    def flush(self) -> None:
+        """ Send every LED which differs from what the device shows """
+        grid = set()
+        for key in self.frame.pop_dirty():
+            state = self.frame.leds[key]
+            if self.shown.leds[key] == state:
+                self.led_suppressed += 1
+                continue
+            self.shown.leds[key] = state
+            self.led_sent += 1
+            if key[0] == "grid":
+                grid.add(key[1:])
+            else:
+                self.send_led(key, state)
+        if grid:
+            self.send_grid(grid)
+
+    def send_led(self, key: tuple, state) -> None:
+        if self.output:
+            self.output.send(APC_MESSAGES[(key, state)])
+        elif key[0] == "grid":
+            self.gridbuttons.set_led(key[1], key[2], *state)
+        elif key[0] == "lower":
+            self.lowerbuttons.set_led(key[1], state)
+        else:
+            self.sidebuttons.set_led(key[1], state)
+
+    def send_grid(self, changed: set) -> None:
+        """ Send changed pads as one SysEx frame if it is smaller than
+            single note messages. Falls back to note messages otherwise.
+        """
+        if self.output and not self.args.no_sysex:
+            runs = sysex_runs(self.shown, changed)
+            if sysex_size(runs) < NOTE_SIZE * len(changed):
+                self.output.send_message(sysex_message(runs))
+                self.led_sysex += 1
+                return None
+        for x, y in changed:
+            self.send_led(("grid", x, y), self.shown.leds[("grid", x, y)])
+
+    def led_stats(self) -> dict:
+        """ LEDs sent, LED writes which needed no message and SysEx frames """
+        suppressed = self.led_suppressed
+        for frame in list(self.views.values()):
+            suppressed += frame.unchanged
+        return {
+            "sent": self.led_sent,
+            "suppressed": suppressed,
+            "sysex": self.led_sysex
+        }
 
     def check_index(self, index, min, max) -> bool:
         """ Make sure the index vars do not reach out of bounce """
@@ -1,4 +1,4 @@
-from soundcraft_ui16 import MixerSender
+from services.sender import SendScheduler
 from mido import get_output_names
 from time import sleep
 from re import match
@@ -8,13 +8,14 @@ from argparse import Namespace
 from services.config import (
     Config, MIDI_CONTROLLER
 )
-from services.threads import APC, Midimix
+from services.control_map import ControlMapping
+from services.threads import APC, Midimix, LedRenderThread
 
 
 class MidiControllerThread:
     def __init__(
         self,
-        sender: MixerSender,
+        sender: SendScheduler,
         config: Config,
         args: Namespace,
         parent: None,
@@ -26,6 +27,8 @@ class MidiControllerThread:
         self.parent = parent
         self.logger = getLogger(logger_name)
         self.controller = {}
+        self.renderer = LedRenderThread(args.led_fps, logger_name)
+        self.mapping = ControlMapping(args.mapping_file, logger_name)
         self.keepalive_thread = Thread(
             target=self._thread,
             args=()
@@ -35,6 +38,8 @@ class MidiControllerThread:
     def _thread(self) -> None:
         self._create_controller()
         while not self.exit_flag.is_set():
+            if self.mapping.reload():
+                self._apply_mapping()
             for controller in self.controller:
                 if not self.controller[controller]["controller"]:
                     midi_identifier = self._get_midi_string(
@@ -51,10 +56,35 @@ class MidiControllerThread:
                 elif not self._is_controller_alive(
                     self.controller[controller]["identifier"]
                 ):
-                    self.controller[controller]["controller"].loop.stop()
+                    self._stop_controller(
+                        self.controller[controller]["controller"]
+                    )
                     self._setup_controller(controller)
                 sleep(.5)
 
+    def _apply_mapping(self) -> None:
+        """ Hand a reloaded mapping to the connected controllers. Only the
+            tables and the LEDs they decide change, a controller is not
+            reset while it is played
+        """
+        for controller in self.controller.values():
+            controller = controller["controller"]
+            if not controller:
+                continue
+            controller.set_mapping(self.mapping.compiled)
+            if isinstance(controller, APC):
+                controller.prerender()
+                controller.request_render()
+            else:
+                controller.display_presets()
+
+    def _stop_controller(self, controller) -> None:
+        """ Stop the input of a controller and close its LED output """
+        controller.loop.stop()
+        controller.input.terminate()
+        if controller.output:
+            controller.output.close()
+
     def _is_controller_alive(self, identifier) -> bool:
         if identifier in get_output_names():
             return True
@@ -72,13 +102,16 @@ class MidiControllerThread:
         if name == "APC":
             self.controller[name]["controller"] = APC(
                 self.controller[name]["identifier"], self.sender, self.config,
-                self.args, self.parent, self.logger.name
+                self.args, self.parent, self.logger.name,
+                renderer=self.renderer, mapping=self.mapping.compiled
             )
         elif name == "MidiMix":
             self.controller[name]["controller"] = Midimix(
                 self.controller[name]["identifier"], self.sender, self.config,
-                self.args, self.parent, self.logger.name
+                self.args, self.parent, self.logger.name,
+                mapping=self.mapping.compiled
             )
+        self.controller[name]["controller"].input.start()
         self.controller[name]["controller"].update_settings({"key": "init"})
 
     def _create_controller(self) -> None:
@@ -92,6 +125,7 @@ class MidiControllerThread:
             }
 
     def start(self) -> None:
+        self.renderer.start()
         self.keepalive_thread.start()
 
     def join(self) -> None:
@@ -100,9 +134,19 @@ class MidiControllerThread:
 
     def terminate(self) -> None:
         self.logger.warning("Controllers will be stopped!")
+        self.renderer.terminate()
         for controller in self.controller:
+            if isinstance(self.controller[controller]["controller"], APC):
+                self.logger.info(
+                    f"{controller} => LED messages => "
+                    f"{self.controller[controller]['controller'].led_stats()}"
+                )
+            self.logger.info(
+                f"{controller} => MIDI input => "
+                f"{self.controller[controller]['controller'].input.stats()}"
+            )
             self.controller[controller]["controller"].reset()
-            self.controller[controller]["controller"].loop.stop()
+            self._stop_controller(self.controller[controller]["controller"])
         self.exit_flag.set()
         self.join()
 
@@ -0,0 +1,63 @@
+from threading import Thread, Event, Lock
+from logging import getLogger
+from time import monotonic, sleep
+
+
+class LedRenderThread:
+    """ Renders LED frames of all requesting controllers on one thread.
+        Frames are rendered at most fps times per second, no matter how
+        many requests arrive in between.
+    """
+    def __init__(
+        self,
+        fps: int = 60,
+        logger_name: str = "LedRenderThread"
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.interval = 1 / fps
+        self.frames = 0
+        self.pending = set()
+        self.lock = Lock()
+        self.wakeup = Event()
+        self.exit_flag = Event()
+        self.thread = Thread(target=self._thread, args=())
+
+    def request(self, target) -> None:
+        """ Mark target as dirty. target.render() will be called on the
+            next frame
+        """
+        with self.lock:
+            self.pending.add(target)
+        self.wakeup.set()
+
+    def _thread(self) -> None:
+        next_frame = monotonic()
+        while not self.exit_flag.is_set():
+            self.wakeup.wait()
+            delay = next_frame - monotonic()
+            if delay > 0:
+                sleep(delay)
+            self.wakeup.clear()
+            with self.lock:
+                targets = self.pending
+                self.pending = set()
+            for target in targets:
+                try:
+                    target.render()
+                except Exception as error:
+                    # A disconnected device must not stop the other ones
+                    self.logger.error(f"LED render failed => {error}")
+            next_frame = monotonic() + self.interval
+            self.frames += 1
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def terminate(self) -> None:
+        self.exit_flag.set()
+        self.wakeup.set()
+        self.join()
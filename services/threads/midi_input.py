@@ -0,0 +1,109 @@
+from threading import Thread, Event, Condition
+from logging import getLogger
+from collections import deque
+from services.jitter import JitterFilter
+
+
+class MidiInputThread:
+    """ Input stage between akai_pro_py and the on_event of a controller.
+        The library hands over every MIDI message on its own. Events are
+        queued and all pending ones are drained on every wakeup.
+        Consecutive control changes of the same control are collapsed to
+        the newest value. Every other event is dispatched in order and ends
+        the run, so no control change is moved across a button press or
+        release.
+        With a jitter_filter, noise of faders and knobs is dropped before
+        it is queued.
+    """
+    def __init__(
+        self,
+        dispatch,
+        control_key,
+        logger_name: str = "MidiInputThread",
+        jitter_filter: JitterFilter = None
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.dispatch = dispatch
+        # control_key(event) returns the control of a control change or
+        # None for events which are never collapsed
+        self.control_key = control_key
+        self.jitter_filter = jitter_filter
+        self.pending = deque()
+        self.received = 0
+        self.dispatched = 0
+        self.wakeups = 0
+        self.condition = Condition()
+        self.exit_flag = Event()
+        self.thread = Thread(target=self._thread, args=())
+
+    def put(self, event) -> None:
+        """ Used as event_dispatch of the controller """
+        if self.jitter_filter:
+            key = self.control_key(event)
+            if key is not None and not self.jitter_filter.accept(
+                key, event.value
+            ):
+                return None
+        with self.condition:
+            self.pending.append(event)
+            self.received += 1
+            self.condition.notify()
+
+    def collapse(self, events: list) -> list:
+        """ Keep the newest value of every control per run between two
+            other events. A collapsed control keeps its first position
+        """
+        run = {}
+        collapsed = []
+        for event in events:
+            key = self.control_key(event)
+            if key is None:
+                run = {}
+                collapsed.append(event)
+            elif key in run:
+                collapsed[run[key]] = event
+            else:
+                run[key] = len(collapsed)
+                collapsed.append(event)
+        return collapsed
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "dispatched": self.dispatched,
+            "wakeups": self.wakeups,
+            "collapse_ratio": round(
+                self.received / self.dispatched if self.dispatched else 1, 2
+            ),
+            "jitter": self.jitter_filter.stats() if self.jitter_filter else {}
+        }
+
+    def _thread(self) -> None:
+        while not self.exit_flag.is_set():
+            with self.condition:
+                if not self.pending:
+                    self.condition.wait()
+                    continue
+                events = list(self.pending)
+                self.pending.clear()
+            self.wakeups += 1
+            for event in self.collapse(events):
+                self.dispatched += 1
+                try:
+                    self.dispatch(event)
+                except Exception as error:
+                    # A broken event must not stop the input of the device
+                    self.logger.error(f"MIDI event failed => {error}")
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def terminate(self) -> None:
+        self.exit_flag.set()
+        with self.condition:
+            self.condition.notify()
+        self.join()
@@ -1,46 +1,57 @@
 from akai_pro_py import controllers
-from soundcraft_ui16 import MixerSender
+from mido import open_output
+from services.sender import SendScheduler
 from logging import getLogger
 from argparse import Namespace
-from services.config import (
-    Config, load_presets, remove_preset
-)
+from services.config import Config, PRESET_BANK_SIZE, PRESET_BANKS
 from services.formatter import ConfigVars
+from services.led import LedOutput, MIDIMIX_MESSAGES
+from services.jitter import JitterFilter
+from services.control_map import (
+    DEFAULT_TABLES, bind_controls, dispatch_control
+)
+from .midi_input import MidiInputThread
 
 
 class Midimix(controllers.MIDIMix):
-    KNOB_MAPPING = [
-        [(0, 2), (1, 2), (2, 2), (3, 2)],
-        [(4, 2), (5, 2), (6, 2), (7, 2)],
-        [(0, 1), (1, 1), (2, 1), (3, 1)],
-        [(4, 1), (5, 1), (6, 1), (7, 1)],
-        [(0, 0), (1, 0), (2, 0), (3, 0)],
-        [(4, 0), (5, 0), (6, 0), (7, 0)]
-    ]
-
     def __init__(
         self,
         midi_string: str,
-        sender: MixerSender,
+        sender: SendScheduler,
         config: Config,
         args: Namespace,
         logger_name: str = "Midimix",
-        parent: None = None
+        parent: None = None,
+        mapping: dict = DEFAULT_TABLES
     ) -> None:
         super().__init__(midi_string, midi_string)
         self.logger = getLogger(logger_name)
         self.args = args
         self.sender = sender
         self.config = config
-        self.config_presets = load_presets()
+        self.preset_store = config.presets
+        self.preset_bank = 0
         self.vars = ConfigVars()
         self.parent = parent
-        self.event_dispatch = self.on_event
+        self.input = MidiInputThread(
+            self.on_event, self.control_key, logger_name,
+            JitterFilter(
+                args.jitter_dead_band, args.jitter_settle, logger_name
+            )
+        )
+        self.event_dispatch = self.input.put
         self.ready_dispatch = self.on_ready
         self.ready = False
         self.shift = False
         self.apc_shift = False
         self.channelfxsend_index = 0
+        self.set_mapping(mapping)
+        # Second connection to the output port for prebuilt LED messages
+        try:
+            self.output = LedOutput(open_output(midi_string))
+        except OSError:
+            self.logger.error(f"{midi_string} => no direct LED output")
+            self.output = None
 
     def update_settings(self, msg) -> None:
         if msg["key"] == "init":
@@ -56,112 +67,94 @@ class Midimix(controllers.MIDIMix):
         self.ready = True
         self.logger.warning(f"{self.name} is ready!")
 
+    def set_mapping(self, mapping: dict) -> None:
+        """ Use the dispatch tables of a compiled control mapping """
+        self.controls = bind_controls(
+            mapping["midimix"]["controls"], self.sender, self.vars
+        )
+        self.presets = mapping["midimix"]["presets"]
+
+    def control_key(self, event) -> tuple:
+        """ Controls whose events may be collapsed to the newest value """
+        if isinstance(event, self.Knob):
+            return ("knob", event.x, event.y)
+        if isinstance(event, self.Fader):
+            return ("fader", event.fader_id)
+        return None
+
     def on_event(self, event) -> None:
         if isinstance(event, self.Knob):
-            current_knob = (event.x, event.y)
-            for check_set in self.KNOB_MAPPING:
-                if current_knob in check_set:
-                    channel = self.KNOB_MAPPING.index(check_set)
-                    break
-            channel_send = channel + self.channelfxsend_index * 6
-            self.sender.fx(
-                channel_send,
-                self.vars.midi_to_soundcraft(event.value),
-                "i", self.KNOB_MAPPING[channel].index((event.x, event.y))
+            dispatch_control(
+                self.controls,
+                ("knob", event.x, event.y, self.channelfxsend_index),
+                event.value
             )
         if isinstance(event, self.Fader):
-            if event.fader_id in list(range(3)):
-                self.sender.fx_setting(
-                    2,
-                    event.fader_id + 1,
-                    self.vars.midi_to_soundcraft(event.value)
-                )
-            elif event.fader_id in list(range(3, 8)):
-                self.sender.fx_setting(
-                    3,
-                    (event.fader_id + 1) - 3,
-                    self.vars.midi_to_soundcraft(event.value)
-                )
-            elif event.fader_id == 8:
-                # Set the BPM - Values will be 60 to 60 + range(128)  = 187
-                self.sender.tempo(
-                    60 + event.value
-                )
+            # Fader 8 sets the BPM - Values will be 60 to 187
+            dispatch_control(
+                self.controls,
+                ("fader", event.fader_id, self.channelfxsend_index),
+                event.value
+            )
         if isinstance(event, self.MuteButton):
             if not event.state:
                 return None
+            preset = self.preset_id("mute", event.button_id)
             if (
                 not self.shift and not self.apc_shift
-                and str(event.button_id) in self.config_presets
+                and preset in self.preset_store
             ):
-                # Load Config
-                effects = self.config_presets[str(event.button_id)]["fx"]
-                for fx in effects:
-                    for option in effects[fx]:
-                        if "par" not in option:
-                            continue
-                        self.sender.fx_setting(
-                            int(fx),
-                            int(option[-1:]),
-                            float(effects[fx][option])
-                        )
+                self.recall_preset(preset)
             elif (
                 not self.shift and not self.apc_shift
-                and str(event.button_id) not in self.config_presets
+                and preset not in self.preset_store
             ):
                 # Save config as preset
-                self.config.create_preset(str(event.button_id))
-                self.config_presets = load_presets()
-                self.mutebuttons.set_led(event.button_id, 1)
+                self.config.create_preset(preset)
+                self.set_led("mute", event.button_id, 1)
             elif (
                 (self.shift or self.apc_shift)
-                and str(event.button_id) in self.config_presets
+                and preset in self.preset_store
             ):
                 # Delete a preset
-                remove_preset(str(event.button_id))
-                self.config_presets = load_presets()
-                self.mutebuttons.set_led(event.button_id, 0)
+                self.preset_store.remove(preset)
+                self.set_led("mute", event.button_id, 0)
             else:
                 # Do nothing no preset is set here
                 pass
         if isinstance(event, self.RecArmButton):
             if not event.state:
                 return None
+            preset = self.preset_id("recarm", event.button_id)
             if (
                 not self.shift and not self.apc_shift
-                and str(event.button_id + 8) in self.config_presets
+                and preset in self.preset_store
             ):
-                # Load Config
-                effects = self.config_presets[str(event.button_id + 8)]["fx"]
-                for fx in effects:
-                    for option in effects[fx]:
-                        if "par" not in option:
-                            continue
-                        self.sender.fx_setting(
-                            int(fx),
-                            int(option[-1:]),
-                            float(effects[fx][option])
-                        )
+                self.recall_preset(preset)
             elif (
                 not self.shift and not self.apc_shift
-                and str(event.button_id + 8) not in self.config_presets
+                and preset not in self.preset_store
             ):
                 # Save config as preset
-                self.config.create_preset(str(event.button_id + 8))
-                self.config_presets = load_presets()
-                self.recarmbuttons.set_led(event.button_id, 1)
+                self.config.create_preset(preset)
+                self.set_led("recarm", event.button_id, 1)
             elif (
                 (self.shift or self.apc_shift)
-                and str(event.button_id + 8) in self.config_presets
+                and preset in self.preset_store
             ):
                 # Delete a preset
-                remove_preset(str(event.button_id + 8))
-                self.config_presets = load_presets()
-                self.recarmbuttons.set_led(event.button_id, 0)
+                self.preset_store.remove(preset)
+                self.set_led("recarm", event.button_id, 0)
             else:
                 # Do nothing no preset is set here
                 pass
         if isinstance(event, self.BankButton):
+            if event.state and self.shift:
+                # Solo and bank buttons page through the preset banks
+                self.set_preset_bank(
+                    self.preset_bank + (1 if event.button_id else -1)
+                )
+                return None
             if event.state and event.button_id and self.channelfxsend_index:
                 self.channelfxsend_index = 0
                 self.parent.notify_update("fx_move")
@@ -176,9 +169,51 @@ class Midimix(controllers.MIDIMix):
                 {"state": event.state}
             )
 
+    def recall_preset(self, preset: str) -> None:
+        """ Send the parameters of a preset which differ from the mixer """
+        commands = self.preset_store.commands(preset)
+        if self.args.morph_time:
+            moving = self.parent.tweens.morph_preset(
+                commands, self.args.morph_time, self.args.morph_curve
+            )
+            self.logger.debug(
+                f"Preset {preset} => {moving}/{len(commands)} morphing"
+            )
+            return None
+        changed = self.config.preset_diff(commands)
+        self.sender.fx_settings(changed)
+        self.logger.debug(
+            f"Preset {preset} => {len(changed)}/{len(commands)} sent"
+        )
+
+    def preset_id(self, group: str, button_id: int) -> str:
+        return str(
+            self.preset_bank * PRESET_BANK_SIZE
+            + self.presets[group] + button_id
+        )
+
+    def set_preset_bank(self, bank: int) -> None:
+        bank = min(max(bank, 0), PRESET_BANKS - 1)
+        if bank == self.preset_bank:
+            return None
+        self.preset_bank = bank
+        self.logger.info(f"{self.name} => preset bank {bank}")
+        self.display_presets()
+
     def display_presets(self) -> None:
-        for preset in self.config_presets:
-            if int(preset) < 8:
-                self.mutebuttons.set_led(int(preset), 1)
-            else:
-                self.recarmbuttons.set_led(int(preset) - 8, 1)
+        first = self.preset_bank * PRESET_BANK_SIZE
+        stored = set(self.preset_store.bank(first, PRESET_BANK_SIZE))
+        for group, offset in self.presets.items():
+            for button_id in range(8):
+                self.set_led(
+                    group, button_id,
+                    int((first + offset + button_id) in stored)
+                )
+
+    def set_led(self, group: str, button_id: int, state: int) -> None:
+        if self.output:
+            self.output.send(MIDIMIX_MESSAGES[((group, button_id), state)])
+        elif group == "mute":
+            self.mutebuttons.set_led(button_id, state)
+        else:
+            self.recarmbuttons.set_led(button_id, state)
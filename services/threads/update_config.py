@@ -1,25 +1,40 @@
-from queue import Queue
+from queue import Queue, Empty
 from threading import Thread, Event
 from logging import getLogger
 from re import match
-from time import sleep
+from time import monotonic
 from services.config import Config
+from services.echo import EchoFilter, message_key
+from services.latency import Latency
 
 
 class UpdateConfigThread:
     DENIED_OPTIONS = ["digitech", "deesser", "aux", "gate", "eq", "dyn"]
     ALLOWED_INPUT_FUNCTIONS = ["mix", "mute", "solo", "gain"]
     ALLOWED_FX_FUNCTIONS = ["mix", "mute", "bpm"]
+    # What to do with a message after reconciling it
+    QUIET = "quiet"  # update Config but do not notify
+    SKIP = "skip"  # Config already shows a newer local value
 
     def __init__(
         self,
         update_queue: Queue,
         config: Config,
         logger_name: str = "UpdateConfigThread",
-        parent: None = None  # cant specify because it would be circular import
+        # cant specify because it would be circular import
+        parent: None = None,
+        echo_filter: EchoFilter = None
     ) -> None:
         self.logger = getLogger(logger_name)
         self.parent = parent
+        self.echo_filter = echo_filter
+        # Last message from the mixer per parameter to roll back to
+        self.authoritative = {}
+        # Submit time and value of local values which are not confirmed yet
+        self.provisional = {}
+        self.confirmed = 0
+        self.rolled_back = 0
+        self.latency = {feedback: Latency() for feedback in ["local", "echo"]}
         self.thread = Thread(
             target=self._thread, args=(update_queue, config)
         )
@@ -29,22 +44,27 @@ class UpdateConfigThread:
         self.logger.info("Starting Update Thread")
         self_init = True
         while not self.exit_flag.is_set():
-            if update_queue.qsize() == 0:
+            self._expire(update_queue)
+            try:
+                msg = update_queue.get(timeout=.1)
+            except Empty:
                 if self_init:
                     self_init = False
                     self.logger.info(
                         "Update Thread init complete"
                         " - Notifications will be send now"
                     )
-                sleep(.1)
                 continue
 
-            msg = update_queue.get()
             if msg["kind"] not in ["m", "i", "f"]:
                 continue
             elif "option" in msg and msg["option"] in self.DENIED_OPTIONS:
                 continue
-            elif (
+            echo = self._reconcile(msg)
+            if echo == self.SKIP:
+                continue
+            quiet = self_init or echo == self.QUIET
+            if (
                 msg["kind"] == "i"
                 and "channel" in msg
                 and "option" in msg
@@ -54,7 +74,7 @@ class UpdateConfigThread:
                     msg["channel"], msg["option_channel"],
                     msg["function"], msg["value"]
                 )
-                if self_init:
+                if quiet:
                     continue
                 self.parent.notify_update(
                     "channel_fx",
@@ -73,7 +93,7 @@ class UpdateConfigThread:
                 config.update_channel(
                     msg["channel"], msg["function"], msg["value"]
                 )
-                if self_init:
+                if quiet:
                     continue
                 self.parent.notify_update(
                     "channel",
@@ -88,7 +108,7 @@ class UpdateConfigThread:
                 and msg["channel"] == "mix"
             ):
                 config.update_master(msg["value"])
-                if self_init:
+                if quiet:
                     continue
                 self.parent.notify_update("master")
             elif (
@@ -101,14 +121,14 @@ class UpdateConfigThread:
             ):
                 if msg["function"] == "bpm":
                     config.update_bpm(msg["value"])
-                    if self_init:
+                    if quiet:
                         continue
                     self.parent.notify_update("bpm")
                     continue
                 config.update_fx(
                     msg["channel"], msg["function"], msg["value"]
                 )
-                if self_init:
+                if quiet:
                     continue
                 self.parent.notify_update(
                     "fx",
@@ -120,6 +140,79 @@ class UpdateConfigThread:
             else:
                 continue
 
+    def _reconcile(self, msg: dict) -> str:
+        """ Compare a message with the values we sent.
+            Local values are shown right away and confirmed by their echo.
+            Echoes of values which are already overwritten by a newer one
+            are not rendered, they would only be redrawn again.
+            Anything else from the mixer is authoritative and wins.
+        """
+        if not self.echo_filter:
+            return None
+        key = message_key(msg)
+        now = monotonic()
+        if "local" in msg:
+            self.provisional[key] = (msg["local"], float(msg["value"]))
+            self._record("local", now - msg["local"])
+            return None
+        echo = self.echo_filter.match(msg)
+        self.authoritative[key] = msg
+        if echo == EchoFilter.SUPERSEDED:
+            self.echo_filter.saved += 1
+            return self.SKIP if key in self.provisional else self.QUIET
+        if key not in self.provisional:
+            return None
+        submitted, value = self.provisional[key]
+        if echo == EchoFilter.LATEST:
+            # Otherwise a newer local value is still queued for sending
+            if abs(float(msg["value"]) - value) <= self.echo_filter.tolerance:
+                del self.provisional[key]
+                self._record("echo", now - submitted)
+                self.confirmed += 1
+            return self.SKIP
+        if self.echo_filter.waiting(key):
+            # Keep showing our value, _expire() rolls back to this one
+            return self.SKIP
+        # The mixer has another value than the one we show
+        del self.provisional[key]
+        self.rolled_back += 1
+        return None
+
+    def _expire(self, update_queue: Queue) -> None:
+        """ Roll back local values the mixer never confirmed.
+            Without a local value the last echo may have been superseded
+            and not rendered, so the mixer's value is shown again as well.
+        """
+        if not self.echo_filter:
+            return None
+        for key in self.echo_filter.expired():
+            if key in self.provisional:
+                del self.provisional[key]
+                self.rolled_back += 1
+                self.logger.warning(f"{key} => no echo => rolled back")
+            if key in self.authoritative:
+                update_queue.put(self.authoritative[key])
+            else:
+                self.logger.error(f"{key} => no echo => nothing to show")
+
+    def _record(self, feedback: str, latency: float) -> None:
+        self.latency[feedback].add(latency)
+
+    def stats(self) -> dict:
+        """ Reconciliation counters and the time until a change is shown,
+            local for provisional values and echo for the mixer round trip
+        """
+        latency = {
+            feedback: values.stats()
+            for feedback, values in self.latency.items()
+        }
+        return {
+            "saved": self.echo_filter.saved if self.echo_filter else 0,
+            "confirmed": self.confirmed,
+            "rolled_back": self.rolled_back,
+            "latency": latency
+        }
+
     def start(self) -> None:
         self.thread.start()
 
@@ -129,3 +222,5 @@ class UpdateConfigThread:
     def terminate(self) -> None:
         self.exit_flag.set()
         self.join()
+        if self.echo_filter:
+            self.logger.info(f"Echo => {self.stats()}")
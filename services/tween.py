@@ -0,0 +1,168 @@
+from threading import Thread, Event, Condition
+from logging import getLogger
+from time import monotonic
+from math import sin, pi
+from .config import Config, TWEEN_RATE, TWEEN_CURVE, ECHO_TOLERANCE
+from .latency import Latency
+from .sender import SendScheduler, command_key
+
+# Position 0 to 1 in time => position 0 to 1 between start and target
+TWEEN_CURVES = {
+    "linear": lambda t: t,
+    "ease": lambda t: t * t * (3 - 2 * t),
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: t * (2 - t),
+    # Constant loudness while crossfading between two sources
+    "equal_power": lambda t: sin(t * pi / 2)
+}
+
+
+def with_value(call: str, args: tuple, value: float) -> tuple:
+    """ args of a MixerSender call with another value """
+    if call == "tempo":
+        return (round(value),)
+    index = 0 if call == "master" else 2 if call == "fx_setting" else 1
+    return args[:index] + (value,) + args[index + 1:]
+
+
+class TweenThread:
+    """ Moves mixer parameters from their Config value to a target.
+        All tweens share this thread, which ticks rate times per second on
+        the monotonic clock and skips missed ticks. A new tween replaces
+        the running one of its parameter, a touch by a person stops it.
+    """
+    def __init__(
+        self,
+        sender: SendScheduler,
+        config: Config,
+        rate: int = TWEEN_RATE,
+        logger_name: str = "TweenThread"
+    ) -> None:
+        self.logger = getLogger(logger_name)
+        self.sender = sender
+        self.config = config
+        self.period = 1 / rate
+        # key => (start, duration, curve, from, to, call, args)
+        self.tweens = {}
+        self.ticks = 0
+        self.skipped = 0
+        self.late = Latency()
+        self.finished = 0
+        self.cancelled = 0
+        self.condition = Condition()
+        self.exit_flag = Event()
+        self.thread = Thread(target=self._thread, args=())
+
+    def morph(
+        self, commands: list, duration: float, curve: str = TWEEN_CURVE
+    ) -> int:
+        """ Move compiled scene commands to their values in duration
+            seconds. Returns how many parameters move
+        """
+        ease = TWEEN_CURVES[curve]
+        now = monotonic()
+        tweens = {}
+        for target, value, call, args in commands:
+            current = self.config.scene_value(target)
+            start = value if current is None else float(current)
+            if abs(start - value) <= ECHO_TOLERANCE:
+                continue
+            tweens[command_key(call, args)] = (
+                # Unmute with the first tick, mute with the last
+                now, 0 if call == "mute" and not value else duration,
+                ease, start, value, call, args
+            )
+        with self.condition:
+            self.tweens.update(tweens)
+            self.condition.notify()
+        return len(tweens)
+
+    def morph_preset(
+        self, commands: list, duration: float, curve: str = TWEEN_CURVE
+    ) -> int:
+        """ morph() for the (fx, par, value) commands of a preset """
+        return self.morph(
+            [
+                (("f", str(fx), f"par{par}"), value,
+                 "fx_setting", (fx, par, value))
+                for fx, par, value in commands
+            ],
+            duration, curve
+        )
+
+    def cancel(self, keys: list) -> None:
+        """ touch of the SendScheduler, a person changed these parameters """
+        if not self.tweens:
+            return None
+        with self.condition:
+            for key in keys:
+                if self.tweens.pop(key, None):
+                    self.cancelled += 1
+
+    def stats(self) -> dict:
+        late = self.late.stats(3)
+        return {
+            "running": len(self.tweens),
+            "finished": self.finished,
+            "cancelled": self.cancelled,
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "late_avg_ms": late["avg_ms"],
+            "late_max_ms": late["max_ms"]
+        }
+
+    def _tick(self, now: float) -> None:
+        calls = []
+        with self.condition:
+            for key, tween in list(self.tweens.items()):
+                start, duration, ease, begin, end, call, args = tween
+                position = (now - start) / duration if duration > 0 else 1
+                if position >= 1:
+                    del self.tweens[key]
+                    self.finished += 1
+                    calls.append((call, args))
+                elif call != "mute":
+                    calls.append((
+                        call,
+                        with_value(
+                            call, args, begin + (end - begin) * ease(position)
+                        )
+                    ))
+        self.sender.send_all(calls, automated=True)
+
+    def _thread(self) -> None:
+        due = None
+        while not self.exit_flag.is_set():
+            with self.condition:
+                if not self.tweens:
+                    # Idle, the next tween starts a new tick grid
+                    due = None
+                    self.condition.wait()
+                    continue
+            now = monotonic()
+            if due is None:
+                due = now
+            elif now < due:
+                self.exit_flag.wait(due - now)
+                continue
+            late = now - due
+            self.ticks += 1
+            self.late.add(late)
+            missed = int(late / self.period)
+            self.skipped += missed
+            due += (missed + 1) * self.period
+            self._tick(now)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def terminate(self) -> None:
+        self.exit_flag.set()
+        with self.condition:
+            self.condition.notify()
+        self.join()
+        self.logger.info(f"Tweens => {self.stats()}")
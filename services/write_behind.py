@@ -0,0 +1,47 @@
+from threading import Thread, Event, Condition
+
+
+class WriteBehind:
+    """ Writer thread for changes collected in memory. Subclasses keep
+        them under self.condition, notify it and implement _pending() and
+        _write(). Changes arriving within delay seconds share a write
+    """
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.condition = Condition()
+        self.exit_flag = Event()
+        self.thread = Thread(target=self._thread, args=())
+
+    def _pending(self) -> bool:
+        """ Has to be called with self.condition acquired """
+        raise NotImplementedError
+
+    def _write(self) -> None:
+        raise NotImplementedError
+
+    def _wait(self) -> float:
+        return self.delay
+
+    def _thread(self) -> None:
+        while not self.exit_flag.is_set():
+            with self.condition:
+                if not self._pending():
+                    self.condition.wait()
+                    continue
+            # Let changes arriving shortly after join the write
+            self.exit_flag.wait(self._wait())
+            self._write()
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def terminate(self) -> None:
+        self.exit_flag.set()
+        with self.condition:
+            self.condition.notify()
+        self.join()
+        self._write()